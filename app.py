@@ -1,18 +1,38 @@
 import os
-# Fix for Protobuf 3.x vs 4.x compatibility with TensorFlow
-os.environ["PROTOCOL_BUFFERS_PYTHON_IMPLEMENTATION"] = "python"
+from src.pipeline.inference import slim_backend_available
+# Fix for Protobuf 3.x vs 4.x compatibility with TensorFlow. Only needed
+# when TensorFlow itself is loaded; the pure Python protobuf is slow, so
+# leave it alone when a TFLite-only runtime is installed.
+if not slim_backend_available():
+    os.environ["PROTOCOL_BUFFERS_PYTHON_IMPLEMENTATION"] = "python"
 
 from flask import Flask, render_template, Response, jsonify, request, send_from_directory
 from flask_cors import CORS
 import threading
 import json
+from frame_stream import FrameStream
+from event_store import DEFAULT_EVENTS_FILE, LEGACY_EVENTS_FILE, EventStore
+from log_ring import LogRing
+from result_codec import MIMETYPES, negotiate_format
+from src.pipeline.metrics import metrics
+import time
+from datetime import datetime, timezone
+try:
+    from flask_sock import Sock
+except ImportError:
+    print("WARNING: flask-sock not found. WebSocket frame streaming disabled. Run 'pip install flask-sock'", flush=True)
+    Sock = None
 
 app = Flask(__name__)
 CORS(app) # Allow frontend to call API
 
 
-# In-memory system logs
-system_logs = []
+# In-memory system logs, the newest 100
+system_logs = LogRing(maxlen=100)
+# Longest a /api/system_logs?wait= request is held open. Each waiting
+# request occupies one of the few gthread worker threads that also
+# serve the frames, so keep it short.
+LOG_WAIT_MAX = 5
 
 def add_system_log(message, level='info'):
     """Adds a log entry to the in-memory buffer."""
@@ -24,9 +44,6 @@ def add_system_log(message, level='info'):
         'type': level # 'info', 'alert', 'error', 'success'
     }
     system_logs.append(log_entry)
-    # Keep only last 100 logs
-    if len(system_logs) > 100:
-        system_logs.pop(0)
     print(f"[{level.upper()}] {message}", flush=True)
 
 # Pass logger to services
@@ -34,6 +51,13 @@ camera_service = None
 try:
     from camera_service import CameraService 
     camera_service = CameraService(logger=add_system_log)
+    # Load and warm up the model in the background so the first frame
+    # does not pay for it. Under gunicorn --preload the forked worker
+    # restarts the warm-up if the master had not finished it.
+    if os.environ.get('WARMUP_ON_BOOT', '1') != '0':
+        camera_service.start_warmup()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=camera_service.after_fork)
 except Exception as e:
     add_system_log(f"CRITICAL STARTUP ERROR: {str(e)}", "error")    
     import traceback
@@ -42,10 +66,16 @@ except Exception as e:
     class DummyService:
         def __init__(self): self.notifier = None
         def generate_frames(self): yield b''
+        def stream_frames(self, source=None): yield b''
         def update_fcm_token(self, t): pass
-        def update_location(self, l, lg): pass
-        def reset_alert(self): pass
-        def process_frame(self, i): return {"error": "Backend Startup Failed"}
+        def update_location(self, l, lg, stream_id=None): pass
+        def reset_alert(self, stream_id=None): pass
+        def process_frame(self, i, stream_id=None, result_format=None): return {"error": "Backend Startup Failed"}
+        def process_frame_with_interval(self, i, stream_id=None, result_format=None): return self.process_frame(i), None
+        warmup_status = {"state": "failed", "error": "Backend Startup Failed"}
+        class ready:
+            @staticmethod
+            def is_set(): return False
         
         # Mock notifier for settings route
         class MockNotifier:
@@ -60,9 +90,15 @@ except Exception as e:
         
     camera_service = DummyService()
 
+def _stream_id():
+    """Client/stream id of the request, used to pick the detector session."""
+    return (request.args.get('stream_id')
+            or request.form.get('stream_id')
+            or request.headers.get('X-Stream-Id'))
+
 @app.route('/video_feed')
 def video_feed():
-    return Response(camera_service.generate_frames(),
+    return Response(camera_service.stream_frames(),
                     mimetype='multipart/x-mixed-replace; boundary=frame')
 
 
@@ -70,9 +106,33 @@ def video_feed():
 def status():
     return jsonify({"status": "running"}), 200
 
+@app.route('/api/ready', methods=['GET'])
+def ready():
+    """Readiness probe: 200 once the model is loaded and warmed up, 503 before."""
+    is_ready = camera_service.ready.is_set()
+    body = dict(camera_service.warmup_status, ready=is_ready)
+    return jsonify(body), 200 if is_ready else 503
+
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Per-stage latency histograms and counters in Prometheus text format."""
+    return Response(metrics.render_prometheus(),
+                    mimetype='text/plain; version=0.0.4; charset=utf-8')
+
 @app.route('/api/system_logs', methods=['GET'])
 def get_system_logs():
-    return jsonify(system_logs), 200
+    """Log entries, only those after ``?since=<seq>`` when given.
+
+    With ``?wait=<seconds>`` the request is held open until a new entry
+    arrives (long polling), for at most LOG_WAIT_MAX seconds.
+    """
+    since = request.args.get('since', 0, type=int)
+    wait = min(request.args.get('wait', 0, type=float), LOG_WAIT_MAX)
+    if wait > 0:
+        entries = system_logs.wait(since, wait)
+    else:
+        entries = system_logs.since(since)
+    return jsonify(entries), 200
 
 @app.route('/api/register_client', methods=['POST'])
 def register_client():
@@ -90,22 +150,50 @@ def update_location():
     lat = data.get('latitude')
     lng = data.get('longitude')
     if lat is not None and lng is not None:
-        camera_service.update_location(lat, lng)
+        camera_service.update_location(lat, lng,
+                                       stream_id=data.get('stream_id') or _stream_id())
         return jsonify({"status": "Location updated"}), 200
     return jsonify({"error": "Invalid location"}), 400
 
 @app.route('/api/reset_alert', methods=['POST'])
 def reset_alert():
     try:
-        camera_service.reset_alert()
+        camera_service.reset_alert(stream_id=_stream_id())
         return jsonify({"status": "Alert reset"}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+# Part of every ETag, so versions of an earlier run never match
+_BOOT_ID = os.urandom(4).hex()
+
+def _conditional(name, version, modified, build):
+    """304 Not Modified when the client already has ``version`` of the
+    resource, otherwise the response of ``build()``. Both carry an ETag
+    and Last-Modified, the body is only serialized when it changed.
+
+    Versions are counted per worker process, so the ETag names the process
+    as well: the preloaded master shares _BOOT_ID with all its workers.
+    Only the ETag decides, Last-Modified has a resolution of one second
+    and would hide a second change within the same second."""
+    etag = f'{name}-{_BOOT_ID}-{os.getpid()}-{version}'
+    not_modified = request.if_none_match.contains(etag)
+    response = Response(status=304) if not_modified else build()
+    response.set_etag(etag)
+    response.last_modified = datetime.fromtimestamp(int(modified),
+                                                    timezone.utc)
+    # Revalidate on every poll instead of guessing a freshness
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
 @app.route('/api/get_settings', methods=['GET'])
 def get_settings():
-    # Only return safe data, mask passwords
     n = camera_service.notifier
+    return _conditional('settings', getattr(n, 'settings_version', 0),
+                        getattr(n, 'settings_modified', 0),
+                        lambda: _settings_response(n))
+
+def _settings_response(n):
+    # Only return safe data, mask passwords
     return jsonify({
         'email_config': {
             'enabled': n.email_enabled,
@@ -119,7 +207,7 @@ def get_settings():
             'telegram_token': n.telegram_token,
             'telegram_chat_id': n.telegram_chat_id
         }
-    }), 200
+    })
 
 @app.route('/api/save_settings', methods=['POST'])
 def save_settings():
@@ -132,23 +220,41 @@ def save_settings():
         add_system_log(f"Settings save failed: {str(e)}", "error")
         return jsonify({"error": str(e)}), 500
 
+# Page size of /api/history
+HISTORY_LIMIT = 50
+
+_fallback_events = None
+
+def _event_store():
+    """Event history of the notifier, or of the events file on its own
+    when the camera service failed to start."""
+    global _fallback_events
+    events = getattr(camera_service.notifier, 'events', None)
+    if events is not None:
+        return events
+    if _fallback_events is None:
+        _fallback_events = EventStore(DEFAULT_EVENTS_FILE,
+                                      legacy_path=LEGACY_EVENTS_FILE)
+    return _fallback_events
+
 @app.route('/api/history', methods=['GET', 'DELETE'])
 def get_history():
+    """Fall events newest first. ?since=<id> returns only newer events,
+    ?limit= and ?offset= page through older ones."""
     try:
-        _dir = os.path.dirname(os.path.abspath(__file__))
-        file_path = os.path.join(_dir, 'events.json')
-        
+        events = _event_store()
         if request.method == 'DELETE':
-            with open(file_path, 'w') as f:
-                json.dump([], f)
+            events.clear()
             add_system_log("Fall History cleared", "info")
             return jsonify({"status": "History cleared"}), 200
-        
-        if os.path.exists(file_path):
-            with open(file_path, 'r') as f:
-                data = json.load(f)
-            return jsonify(data), 200
-        return jsonify([]), 200
+
+        since = request.args.get('since', type=int)
+        limit = request.args.get('limit', HISTORY_LIMIT, type=int)
+        offset = request.args.get('offset', 0, type=int)
+        version, modified, page = events.snapshot(
+            since=since, limit=max(limit, 0), offset=max(offset, 0))
+        return _conditional('history', version, modified,
+                            lambda: jsonify(page))
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -164,15 +270,73 @@ def process_frame():
         # Read bytes
         image_bytes = file.read()
         
-        # Process
-        result = camera_service.process_frame(image_bytes)
-        return jsonify(result), 200
+        # Process. Clients can opt into a compact response format.
+        result_format = negotiate_format(request.args.get('format'),
+                                         request.headers.get('Accept'))
+        stream_id = _stream_id()
+        result, interval = camera_service.process_frame_with_interval(
+            image_bytes, stream_id=stream_id, result_format=result_format)
+        # 'respond' covers the HTTP serialization, see also stage 'encode'
+        respond_start = time.perf_counter()
+        if isinstance(result, bytes):
+            response = Response(result, mimetype=MIMETYPES[result_format])
+        else:
+            response = jsonify(result)
+        metrics.observe('respond', time.perf_counter() - respond_start)
+        # Pace the client: frames sent faster than this are skipped anyway
+        if interval is not None:
+            response.headers['X-Next-Frame-Ms'] = str(round(1000 * interval))
+        return response, 200
     except Exception as e:
         add_system_log(f"API Processing Error: {e}", "error")
         return jsonify({"error": str(e)}), 500
 
 
 
+if Sock is not None:
+    sock = Sock(app)
+
+    @sock.route('/api/frame_stream')
+    def frame_stream(ws):
+        """Persistent binary frame ingestion, see frame_stream.py for the format.
+
+        Frames are processed on a worker thread while this one keeps
+        receiving. Results are pushed back as JSON text messages, or as
+        binary messages in the format negotiated like /api/process_frame.
+        """
+        stream_id = request.args.get('stream_id')
+        result_format = negotiate_format(request.args.get('format'),
+                                         request.headers.get('Accept'))
+        # results come from the worker thread, errors from this one
+        send_lock = threading.Lock()
+
+        def send(message):
+            if not isinstance(message, bytes):
+                message = json.dumps(message)
+            with send_lock:
+                ws.send(message)
+
+        stream = FrameStream(
+            lambda image_bytes: camera_service.process_frame(
+                image_bytes, stream_id=stream_id, result_format=result_format),
+            send)
+        try:
+            while not stream.closed:
+                message = ws.receive()
+                if message is None:
+                    break
+                if isinstance(message, str):
+                    # text messages are keep-alives
+                    continue
+                try:
+                    stream.feed(message)
+                except ValueError as e:
+                    send({"error": str(e)})
+        except Exception as e:
+            print(f"Frame stream closed: {e}", flush=True)
+        finally:
+            stream.close()
+
 
 @app.route('/api/debug_server', methods=['GET'])
 def debug_server():
@@ -0,0 +1,307 @@
+"""Throughput and accuracy benchmark over the bundled image sets.
+
+Two passes are run:
+
+pose
+    PoseEngine.detect_poses on every image of fall_dataset/fall,
+    fall_dataset/not-fall and Images/.
+fall
+    FallDetector.process_sample on the labelled fall_dataset images. A
+    fall is a change between two frames, so every image is preceded by
+    a reference frame of a standing person (``--reference``) on a fresh
+    detector, and an image counts as a detected fall when the second
+    frame is labelled FALL.
+
+Reported per pass: frames/sec, p50/p95/p99 latency, and for the fall
+pass the rotation retry rate and the fall/not-fall confusion metrics.
+Results go to stdout and, with ``--output``, to a JSON file that can be
+passed back as ``--baseline`` to compare a change against it.
+
+Usage:
+    python benchmarks/bench_dataset.py [--output results.json]
+        [--baseline baseline.json] [--limit N] [--rotation-mode tensor]
+        [--keypoint-cache DIR]
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+sys.path.append(os.path.abspath('.'))
+
+import numpy as np
+from PIL import Image
+from src.pipeline.fall_detect import FallDetector
+from src.pipeline.keypoint_cache import KeypointCache
+from src.pipeline.metrics import metrics
+
+DATASETS = {
+    'fall': os.path.join('fall_dataset', 'fall'),
+    'not-fall': os.path.join('fall_dataset', 'not-fall'),
+    'images': 'Images',
+}
+# ground truth of the labelled sets, Images/ is unlabelled
+LABELS = {'fall': True, 'not-fall': False}
+
+_IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+_DEFAULT_MODEL = {
+    'tflite': 'ai_models/posenet_mobilenet_v1_100_257x257_multi_kpt_stripped.tflite',
+    'edgetpu': 'ai_models/posenet_mobilenet_v1_075_721_1281_quant_decoder_edgetpu.tflite',
+}
+_DEFAULT_LABELS = 'ai_models/pose_labels.txt'
+
+
+def list_images(directory, limit=None):
+    """Sorted image paths of a directory, the first ``limit`` of them."""
+    names = sorted(n for n in os.listdir(directory)
+                   if n.lower().endswith(_IMAGE_EXTENSIONS))
+    if limit is not None:
+        names = names[:limit]
+    return [os.path.join(directory, n) for n in names]
+
+
+def load_frame(path, as_pil=False):
+    """An RGB frame the way CameraService hands it to the detector."""
+    img = Image.open(path).convert('RGB')
+    return img if as_pil else np.asarray(img)
+
+
+def latency_stats(latencies):
+    """fps and latency percentiles in milliseconds of a list of seconds."""
+    if not latencies:
+        return {'frames': 0}
+    ms = np.asarray(latencies) * 1000
+    return {
+        'frames': len(latencies),
+        'fps': round(len(latencies) / float(np.sum(latencies)), 2),
+        'mean_ms': round(float(ms.mean()), 3),
+        'p50_ms': round(float(np.percentile(ms, 50)), 3),
+        'p95_ms': round(float(np.percentile(ms, 95)), 3),
+        'p99_ms': round(float(np.percentile(ms, 99)), 3),
+    }
+
+
+def confusion_metrics(predictions):
+    """Confusion matrix and derived scores of (expected, predicted) pairs."""
+    tp = sum(1 for e, p in predictions if e and p)
+    fp = sum(1 for e, p in predictions if not e and p)
+    fn = sum(1 for e, p in predictions if e and not p)
+    tn = sum(1 for e, p in predictions if not e and not p)
+    total = tp + fp + fn + tn
+    precision = tp / (tp + fp) if tp + fp else 0.0
+    recall = tp / (tp + fn) if tp + fn else 0.0
+    f1 = 2 * precision * recall / (precision + recall) \
+        if precision + recall else 0.0
+    return {
+        'tp': tp, 'fp': fp, 'fn': fn, 'tn': tn,
+        'accuracy': round((tp + tn) / total, 4) if total else 0.0,
+        'precision': round(precision, 4),
+        'recall': round(recall, 4),
+        'f1': round(f1, 4),
+    }
+
+
+def build_detector(args, tfengine=None, pose_engine=None):
+    keypoint_cache = None
+    if pose_engine is None and getattr(args, 'keypoint_cache', None):
+        keypoint_cache = KeypointCache(args.model or _DEFAULT_MODEL['tflite'],
+                                       args.keypoint_cache)
+    return FallDetector(model=_DEFAULT_MODEL if args.model is None
+                        else {'tflite': args.model},
+                        labels=args.labels,
+                        confidence_threshold=args.confidence_threshold,
+                        model_name=args.model_name,
+                        tfengine=tfengine,
+                        pose_engine=pose_engine,
+                        rotation_mode=args.rotation_mode,
+                        keypoint_cache=keypoint_cache)
+
+
+def run_pose_pass(detector, paths, as_pil=False):
+    """Time detect_poses per image. Returns (stats, per image records)."""
+    pose_engine = detector._pose_engine
+    latencies = []
+    records = []
+    for path in paths:
+        frame = load_frame(path, as_pil)
+        start_time = time.perf_counter()
+        poses, _, pose_score = pose_engine.detect_poses(frame)
+        latency = time.perf_counter() - start_time
+        latencies.append(latency)
+        records.append({'path': path, 'latency_ms': round(latency * 1000, 3),
+                        'pose_score': float(pose_score)})
+    stats = latency_stats(latencies)
+    return stats, records
+
+
+def evaluate_fall_image(detector, reference, path, expected, as_pil=False):
+    """Feed reference then image to a fresh detector, time the second frame."""
+    # frames are fed back to back, do not drop the second one as too soon
+    detector.min_time_between_frames = 0
+    next(detector.process_sample(image=reference))
+    frame = load_frame(path, as_pil)
+    searches = metrics.counter('pose_searches')
+    retries = metrics.counter('rotation_retries')
+    start_time = time.perf_counter()
+    sample = next(detector.process_sample(image=frame))
+    latency = time.perf_counter() - start_time
+    labels = [r['label'] for r in (sample or {}).get('inference_result') or []]
+    return {
+        'path': path,
+        'expected_fall': expected,
+        'predicted_fall': 'FALL' in labels,
+        'labels': labels,
+        'latency_ms': round(latency * 1000, 3),
+        'pose_searches': metrics.counter('pose_searches') - searches,
+        'rotation_retries': metrics.counter('rotation_retries') - retries,
+    }
+
+
+def summarize_fall_pass(records):
+    stats = latency_stats([r['latency_ms'] / 1000 for r in records])
+    searches = sum(r['pose_searches'] for r in records)
+    retries = sum(r['rotation_retries'] for r in records)
+    stats['rotation_retry_rate'] = round(retries / searches, 4) \
+        if searches else 0.0
+    stats['confusion'] = confusion_metrics(
+        [(r['expected_fall'], r['predicted_fall']) for r in records])
+    return stats
+
+
+def run_fall_pass(args, tfengine, pose_engine, labelled_paths):
+    reference = load_frame(args.reference, args.pil)
+    records = []
+    for path, expected in labelled_paths:
+        # a fresh detector per image, sharing the loaded model
+        detector = build_detector(args, tfengine, pose_engine)
+        records.append(evaluate_fall_image(detector, reference, path,
+                                           expected, args.pil))
+    return summarize_fall_pass(records), records
+
+
+def compare(results, baseline):
+    """Print the change of the headline numbers against a baseline run."""
+    rows = [('pose fps', ('pose', 'fps')),
+            ('pose p95 ms', ('pose', 'p95_ms')),
+            ('fall fps', ('fall', 'fps')),
+            ('fall p95 ms', ('fall', 'p95_ms')),
+            ('rotation retry rate', ('fall', 'rotation_retry_rate')),
+            ('fall accuracy', ('fall', 'confusion', 'accuracy')),
+            ('fall f1', ('fall', 'confusion', 'f1'))]
+    print(f"\n{'vs baseline':22} {'baseline':>10} {'current':>10} {'change':>9}")
+    for label, keys in rows:
+        old, new = baseline, results
+        for key in keys:
+            old = (old or {}).get(key)
+            new = (new or {}).get(key)
+        if old is None or new is None:
+            continue
+        change = f'{(new - old) / old * 100:+.1f}%' if old else 'n/a'
+        print(f'{label:22} {old:10.4g} {new:10.4g} {change:>9}')
+
+
+def quality_regressed(results, baseline, tolerance):
+    old = baseline.get('fall', {}).get('confusion', {})
+    new = results.get('fall', {}).get('confusion', {})
+    return any(new.get(k, 0) < old.get(k, 0) - tolerance
+               for k in ('accuracy', 'f1'))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--model', default=None,
+                        help='TFLite model, defaults to the bundled PoseNet')
+    parser.add_argument('--model-name', default='mobilenet')
+    parser.add_argument('--labels', default=_DEFAULT_LABELS)
+    parser.add_argument('--confidence-threshold', type=float, default=0.45,
+                        help='same default as CameraService')
+    parser.add_argument('--rotation-mode', default='tensor',
+                        choices=('image', 'tensor', 'batched'))
+    parser.add_argument('--reference', default='Images/fall_img_1.png',
+                        help='standing frame fed before every fall image')
+    parser.add_argument('--limit', type=int, default=None,
+                        help='images per dataset')
+    parser.add_argument('--pil', action='store_true',
+                        help='feed PIL images instead of numpy frames')
+    parser.add_argument('--keypoint-cache', metavar='DIR',
+                        help='reuse raw keypoints cached in DIR across runs')
+    parser.add_argument('--skip-pose', action='store_true')
+    parser.add_argument('--skip-fall', action='store_true')
+    parser.add_argument('--output', help='write results JSON here')
+    parser.add_argument('--records', action='store_true',
+                        help='include per image records in the JSON')
+    parser.add_argument('--baseline', help='results JSON to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.0,
+                        help='allowed accuracy/f1 drop before failing')
+    return parser.parse_args(argv)
+
+
+def print_stats(name, stats):
+    print(f"{name:6} {stats['frames']:5d} frames  {stats.get('fps', 0):8.2f} fps  "
+          f"p50 {stats.get('p50_ms', 0):7.2f} ms  p95 {stats.get('p95_ms', 0):7.2f} ms  "
+          f"p99 {stats.get('p99_ms', 0):7.2f} ms")
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    detector = build_detector(args)
+    tfengine, pose_engine = detector._tfengine, detector._pose_engine
+    # first invokes are slow, keep them out of the numbers
+    warmup = load_frame(args.reference, args.pil)
+    for _ in range(3):
+        pose_engine.detect_poses(warmup)
+
+    datasets = {name: list_images(path, args.limit)
+                for name, path in DATASETS.items() if os.path.isdir(path)}
+    results = {
+        'config': {
+            'model': args.model or _DEFAULT_MODEL['tflite'],
+            'rotation_mode': args.rotation_mode,
+            'confidence_threshold': args.confidence_threshold,
+            'input': 'pil' if args.pil else 'numpy',
+            'limit': args.limit,
+            'keypoint_cache': args.keypoint_cache,
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'cpu_count': os.cpu_count(),
+        },
+        'datasets': {name: len(paths) for name, paths in datasets.items()},
+    }
+
+    if not args.skip_pose:
+        paths = [p for name in DATASETS for p in datasets.get(name, [])]
+        stats, records = run_pose_pass(detector, paths, args.pil)
+        results['pose'] = stats
+        if args.records:
+            results['pose_records'] = records
+        print_stats('pose', stats)
+
+    if not args.skip_fall:
+        labelled = [(p, LABELS[name]) for name in LABELS
+                    for p in datasets.get(name, [])]
+        stats, records = run_fall_pass(args, tfengine, pose_engine, labelled)
+        results['fall'] = stats
+        if args.records:
+            results['fall_records'] = records
+        print_stats('fall', stats)
+        print(f"rotation retry rate {stats['rotation_retry_rate']:.3f}")
+        print('confusion', json.dumps(stats['confusion']))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        compare(results, baseline)
+        if quality_regressed(results, baseline, args.tolerance):
+            print('Detection quality regressed against the baseline.')
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
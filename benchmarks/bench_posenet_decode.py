@@ -0,0 +1,55 @@
+"""Microbenchmark: per joint loop vs vectorized PoseNet heatmap decoding.
+
+Usage:
+    python benchmarks/bench_posenet_decode.py [--iterations N]
+"""
+import argparse
+import os
+import sys
+import timeit
+sys.path.append(os.path.abspath('.'))
+
+import numpy as np
+from src.pipeline.posenet_model import decode_heatmaps
+
+
+def parse_output_loop(heatmap_data, offset_data, image_height):
+    """The original per joint decoder, kept here as the baseline."""
+    joint_num = heatmap_data.shape[-1]
+    pose_kps = np.zeros((joint_num, 3), np.float32)
+    for i in range(joint_num):
+        joint_heatmap = heatmap_data[..., i]
+        max_val_pos = np.squeeze(
+            np.argwhere(joint_heatmap == np.max(joint_heatmap)))
+        remap_pos = np.array(max_val_pos/8*image_height, dtype=np.int32)
+        pose_kps[i, 0] = int(remap_pos[0] + offset_data[max_val_pos[0],
+                             max_val_pos[1], i])
+        pose_kps[i, 1] = int(remap_pos[1] + offset_data[max_val_pos[0],
+                             max_val_pos[1], i+joint_num])
+        pose_kps[i, 2] = 1 / (1 + np.exp(-np.max(joint_heatmap)))
+    return pose_kps
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=2000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    heatmaps = rng.normal(size=(9, 9, 17)).astype(np.float32)
+    offsets = rng.normal(size=(9, 9, 34)).astype(np.float32) * 20
+    np.testing.assert_array_equal(parse_output_loop(heatmaps, offsets, 257),
+                                  decode_heatmaps(heatmaps, offsets, 257))
+
+    loop = timeit.timeit(lambda: parse_output_loop(heatmaps, offsets, 257),
+                         number=args.iterations) / args.iterations
+    vectorized = timeit.timeit(lambda: decode_heatmaps(heatmaps, offsets, 257),
+                               number=args.iterations) / args.iterations
+
+    print(f"per joint loop : {loop * 1e6:8.1f} us/frame")
+    print(f"vectorized     : {vectorized * 1e6:8.1f} us/frame")
+    print(f"speedup        : {loop / vectorized:8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
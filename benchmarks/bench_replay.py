@@ -0,0 +1,97 @@
+"""Replay recorded videos through the fall detector.
+
+Every video is decoded on a background thread and fed to a fresh
+FallDetector with the recorded frame timestamps, as fast as possible or,
+with ``--realtime``, at the recorded pace. Reported per video: frames,
+achieved frames/sec against the video frame rate, frames analysed (the
+others came too soon after the previous one, as they would live) and the
+positions of the frames labelled FALL.
+
+``--output`` writes the reports as JSON. Passed back as ``--baseline``
+the run fails when a video stops or starts detecting a fall, which turns
+recorded incidents into a regression test.
+
+Usage:
+    python benchmarks/bench_replay.py [videos/video_1.mp4 ...] [--realtime]
+        [--output replay.json] [--baseline replay.json]
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+sys.path.append(os.path.abspath('.'))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from bench_dataset import _DEFAULT_LABELS, build_detector
+from video_replay import replay
+
+
+def regressions(reports, baseline):
+    """Videos whose fall/no fall outcome differs from the baseline run."""
+    previous = {r['path']: bool(r['falls']) for r in baseline.get('videos', [])}
+    return [r['path'] for r in reports
+            if r['path'] in previous and bool(r['falls']) != previous[r['path']]]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('videos', nargs='*',
+                        help='video files, defaults to videos/*.mp4')
+    parser.add_argument('--realtime', action='store_true',
+                        help='replay at the recorded pace')
+    parser.add_argument('--model', default=None,
+                        help='TFLite model, defaults to the bundled PoseNet')
+    parser.add_argument('--model-name', default='mobilenet')
+    parser.add_argument('--labels', default=_DEFAULT_LABELS)
+    parser.add_argument('--confidence-threshold', type=float, default=0.45,
+                        help='same default as CameraService')
+    parser.add_argument('--rotation-mode', default='tensor',
+                        choices=('image', 'tensor', 'batched'))
+    parser.add_argument('--keypoint-cache', metavar='DIR',
+                        help='reuse raw keypoints cached in DIR across runs')
+    parser.add_argument('--output', help='write the reports as JSON')
+    parser.add_argument('--baseline', help='reports JSON to compare with')
+    args = parser.parse_args(argv)
+    if not args.videos:
+        args.videos = sorted(glob.glob(os.path.join('videos', '*.mp4')))
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    detector = build_detector(args)
+    tfengine, pose_engine = detector._tfengine, detector._pose_engine
+
+    reports = []
+    print(f"{'video':28} {'frames':>6} {'analysed':>8} {'fps':>8} "
+          f"{'video fps':>9}  falls at (s)")
+    for path in args.videos:
+        try:
+            report = replay(path, build_detector(args, tfengine, pose_engine),
+                            realtime=args.realtime)
+        except IOError as e:
+            print(f'{path:28} skipped: {e}')
+            continue
+        reports.append(report)
+        print(f"{os.path.basename(path):28} {report['frames']:6d} "
+              f"{report['analysed']:8d} {report['fps']:8.2f} "
+              f"{report['video_fps']:9.2f}  {report['falls']}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'realtime': args.realtime, 'videos': reports}, f,
+                      indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            changed = regressions(reports, json.load(f))
+        if changed:
+            print('Fall outcome changed against the baseline:',
+                  ', '.join(changed))
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,96 @@
+"""Cold start cost of each TFLite interpreter backend.
+
+Every backend is measured in a fresh interpreter process, since an import
+only costs anything the first time. Reported per backend: import time,
+resident memory after the import, and optionally the time to load the
+model and run the first invoke.
+
+Usage:
+    python benchmarks/bench_tflite_backends.py [--model PATH] [--json]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+sys.path.append(os.path.abspath('.'))
+
+from src.pipeline.inference import BACKENDS
+
+_DEFAULT_MODEL = os.path.join(
+    'ai_models', 'posenet_mobilenet_v1_100_257x257_multi_kpt_stripped.tflite')
+
+# Runs in the child process. Leaves the backend import for last so its
+# cost is not mixed with numpy and the inference module itself.
+_PROBE = r'''
+import json, sys, time
+sys.path.append({root!r})
+import numpy as np
+from src.pipeline import inference
+base_rss = inference.rss_bytes()
+try:
+    inference.load_backend({backend!r})
+except ImportError as e:
+    print(json.dumps({{"backend": {backend!r}, "available": False,
+                      "error": str(e)}}))
+    sys.exit(0)
+result = dict(inference.backend_info, available=True,
+              base_rss_mb=round(base_rss / 2**20, 1))
+model = {model!r}
+if model:
+    start = time.monotonic()
+    interpreter = inference.Interpreter(model_path=model)
+    interpreter.allocate_tensors()
+    result["load_s"] = round(time.monotonic() - start, 3)
+    details = interpreter.get_input_details()[0]
+    interpreter.set_tensor(details["index"],
+                           np.zeros(details["shape"], details["dtype"]))
+    start = time.monotonic()
+    interpreter.invoke()
+    result["first_invoke_s"] = round(time.monotonic() - start, 3)
+    result["total_rss_mb"] = round(inference.rss_bytes() / 2**20, 1)
+print(json.dumps(result))
+'''
+
+
+def probe(backend, model=None):
+    code = _PROBE.format(root=os.path.abspath('.'), backend=backend,
+                         model=model)
+    out = subprocess.run([sys.executable, '-c', code],
+                         capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--model', default=_DEFAULT_MODEL,
+                        help='TFLite model to load and invoke once')
+    parser.add_argument('--no-model', action='store_true',
+                        help='only measure the import')
+    parser.add_argument('--json', action='store_true',
+                        help='print the results as JSON')
+    args = parser.parse_args()
+
+    model = None
+    if not args.no_model and os.path.isfile(args.model):
+        model = os.path.abspath(args.model)
+    results = [probe(backend, model) for backend in BACKENDS]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'backend':16} {'import s':>9} {'+RSS MB':>8} {'RSS MB':>7} "
+          f"{'load s':>7} {'1st invoke s':>13}")
+    for r in results:
+        if not r['available']:
+            print(f"{r['backend']:16} not installed")
+            continue
+        print(f"{r['backend']:16} {r['import_s']:9.3f} "
+              f"{r.get('import_rss_mb', float('nan')):8.1f} "
+              f"{r.get('rss_mb', float('nan')):7.1f} "
+              f"{r.get('load_s', float('nan')):7.3f} "
+              f"{r.get('first_invoke_s', float('nan')):13.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,228 @@
+"""Parallel fall_dataset evaluation and threshold sweep.
+
+The labelled images are sharded across a ProcessPoolExecutor. Every
+worker loads its own TFInferenceEngine once and then, per image, runs
+pose inference a single time: the upright and both rotated orientations
+go through one batched invoke and the poses are cached. The unmodified
+FallDetector logic is then replayed on that cache for every combination
+of ``confidence_threshold`` and ``_fall_factor``, so a sweep costs one
+inference pass over the dataset plus cheap arithmetic.
+
+The evaluation protocol is the one of bench_dataset.py: a standing
+reference frame followed by the image on a fresh detector.
+
+Usage:
+    python benchmarks/eval_sweep.py --thresholds 0.3,0.45,0.6
+        --fall-factors 45,60,75 [--workers N] [--output sweep.json]
+        [--csv rows.csv] [--keypoint-cache DIR]
+"""
+import argparse
+import copy
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+sys.path.append(os.path.abspath('.'))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+from bench_dataset import (DATASETS, LABELS, build_detector,
+                           confusion_metrics, list_images, load_frame)
+
+
+class CachedPoseEngine:
+    """Pose engine proxy that infers every frame only once.
+
+    Results are cached per frame object and orientation. Callers get deep
+    copies, FallDetector moves keypoints in place when it maps rotated
+    poses back to the upright frame.
+    """
+
+    supports_tensor_rotation = True
+
+    def __init__(self, pose_engine):
+        self._pose_engine = pose_engine
+        self.confidence_threshold = pose_engine.confidence_threshold
+        self._tensor_image_height = pose_engine._tensor_image_height
+        self._tensor_image_width = pose_engine._tensor_image_width
+        self._cache = {}
+        self.inferences = 0
+
+    def detect_poses_rotated(self, img, angles, batched=True):
+        cached = self._cache.setdefault(id(img), {})
+        missing = [angle for angle in angles if angle not in cached]
+        if missing:
+            self.inferences += 1
+            for angle, poses, thumbnail, pose_score in \
+                    self._pose_engine.detect_poses_rotated(img, missing,
+                                                           batched=True):
+                cached[angle] = (poses, thumbnail, pose_score)
+        for angle in angles:
+            poses, thumbnail, pose_score = cached[angle]
+            yield angle, copy.deepcopy(poses), thumbnail, pose_score
+
+    def forget(self, img):
+        self._cache.pop(id(img), None)
+
+
+# per worker process state, set by _init_worker
+_worker = {}
+
+
+def _init_worker(args):
+    detector = build_detector(args)
+    if not getattr(detector._pose_engine, 'supports_tensor_rotation', False):
+        raise RuntimeError('The sweep needs a model with tensor input support')
+    _worker['args'] = args
+    _worker['tfengine'] = detector._tfengine
+    _worker['pose_engine'] = CachedPoseEngine(detector._pose_engine)
+    _worker['reference'] = load_frame(args.reference)
+
+
+def _torso_keypoints(inference_result):
+    for result in inference_result or []:
+        return [[None if np.isnan(v) else round(float(v), 2) for v in corr]
+                for corr in result['keypoints']]
+    return None
+
+
+def _evaluate_shard(shard):
+    """Evaluate (path, expected_fall) items for every parameter combination."""
+    args = _worker['args']
+    pose_engine = _worker['pose_engine']
+    reference = _worker['reference']
+    rows = []
+    start_time = time.perf_counter()
+    for path, expected in shard:
+        frame = load_frame(path)
+        for threshold in args.thresholds:
+            for fall_factor in args.fall_factors:
+                detector = build_detector(
+                    argparse.Namespace(**dict(vars(args),
+                                              confidence_threshold=threshold,
+                                              rotation_mode='tensor')),
+                    _worker['tfengine'], pose_engine)
+                detector._fall_factor = fall_factor
+                detector.min_time_between_frames = 0
+                next(detector.process_sample(image=reference))
+                sample = next(detector.process_sample(image=frame))
+                inference_result = (sample or {}).get('inference_result')
+                labels = [r['label'] for r in inference_result or []]
+                first = (inference_result or [{}])[0]
+                rows.append({
+                    'path': path,
+                    'expected_fall': expected,
+                    'confidence_threshold': threshold,
+                    'fall_factor': fall_factor,
+                    'label': first.get('label'),
+                    'predicted_fall': 'FALL' in labels,
+                    # fall score for FALL, spinal vector score for NORMAL
+                    'score': round(float(first.get('confidence', 0)), 4),
+                    'leaning_angle': round(float(first.get('leaning_angle', 0)), 2),
+                    'keypoints': _torso_keypoints(inference_result),
+                })
+        pose_engine.forget(frame)
+    return rows, time.perf_counter() - start_time, pose_engine.inferences
+
+
+def shard(items, count):
+    """Split items into ``count`` interleaved shards of similar size."""
+    return [items[i::count] for i in range(count) if items[i::count]]
+
+
+def summarize(rows):
+    """Confusion metrics per (confidence_threshold, fall_factor)."""
+    groups = {}
+    for row in rows:
+        key = (row['confidence_threshold'], row['fall_factor'])
+        groups.setdefault(key, []).append(
+            (row['expected_fall'], row['predicted_fall']))
+    summary = []
+    for (threshold, fall_factor), predictions in sorted(groups.items()):
+        summary.append(dict(confidence_threshold=threshold,
+                            fall_factor=fall_factor,
+                            **confusion_metrics(predictions)))
+    return summary
+
+
+def _float_list(value):
+    return [float(v) for v in value.split(',') if v]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--model', default=None)
+    parser.add_argument('--model-name', default='mobilenet')
+    parser.add_argument('--labels', default='ai_models/pose_labels.txt')
+    parser.add_argument('--reference', default='Images/fall_img_1.png')
+    parser.add_argument('--thresholds', type=_float_list, default=[0.45],
+                        help='comma separated confidence_threshold values')
+    parser.add_argument('--fall-factors', type=_float_list, default=[60],
+                        help='comma separated _fall_factor values (degrees)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--limit', type=int, default=None,
+                        help='images per dataset')
+    parser.add_argument('--output', help='write summary and rows as JSON')
+    parser.add_argument('--csv', help='write the per image rows as CSV')
+    parser.add_argument('--keypoint-cache', metavar='DIR',
+                        help='reuse raw keypoints cached in DIR across runs')
+    args = parser.parse_args(argv)
+    # fields build_detector expects
+    args.confidence_threshold = args.thresholds[0]
+    args.rotation_mode = 'tensor'
+    args.pil = False
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    items = [(path, LABELS[name]) for name in LABELS
+             for path in list_images(DATASETS[name], args.limit)]
+    if not items:
+        print('No images to evaluate.')
+        return 1
+    shards = shard(items, max(1, args.workers))
+
+    start_time = time.perf_counter()
+    rows = []
+    inferences = 0
+    with ProcessPoolExecutor(max_workers=len(shards),
+                             initializer=_init_worker,
+                             initargs=(args,)) as executor:
+        for shard_rows, _, shard_inferences in executor.map(_evaluate_shard,
+                                                            shards):
+            rows.extend(shard_rows)
+            inferences += shard_inferences
+    elapsed = time.perf_counter() - start_time
+    rows.sort(key=lambda r: (r['confidence_threshold'], r['fall_factor'],
+                             r['path']))
+    summary = summarize(rows)
+
+    combos = len(args.thresholds) * len(args.fall_factors)
+    print(f'{len(items)} images x {combos} parameter sets on '
+          f'{len(shards)} workers in {elapsed:.1f}s '
+          f'({inferences} inferences)')
+    print(f"{'threshold':>9} {'fall_factor':>11} {'accuracy':>8} "
+          f"{'precision':>9} {'recall':>6} {'f1':>6}")
+    for s in sorted(summary, key=lambda s: -s['f1']):
+        print(f"{s['confidence_threshold']:9.3f} {s['fall_factor']:11.1f} "
+              f"{s['accuracy']:8.4f} {s['precision']:9.4f} "
+              f"{s['recall']:6.4f} {s['f1']:6.4f}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'elapsed_s': round(elapsed, 3), 'workers': len(shards),
+                       'summary': summary, 'rows': rows}, f, indent=2)
+    if args.csv and rows:
+        with open(args.csv, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+            writer.writeheader()
+            for row in rows:
+                writer.writerow(dict(row, keypoints=json.dumps(row['keypoints'])))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,9 +1,17 @@
 import cv2
 import time
 import numpy as np
-from PIL import Image
 from src.pipeline.fall_detect import FallDetector
+from src.pipeline.batching import MicroBatchingPoseEngine
+from src.pipeline.diagnostics import DiagnosticCapture
+from src.pipeline import inference
+from src.pipeline.metrics import metrics
 from notifier import FCMNotifier
+from frame_broadcaster import FrameBroadcaster
+from frame_codec import decode_frame
+from video_replay import VideoReplaySource
+from result_codec import FORMAT_JSON, encode_result
+from session_registry import DetectorSession, SessionRegistry, DEFAULT_STREAM_ID
 import io
 import os # Added for _init_detector
 import threading # For Async AI Loading
@@ -11,26 +19,104 @@ import threading # For Async AI Loading
 
 _model_lock = threading.Lock()
 
+
+def _env_option(name, default, parse):
+    """Reads an option from the environment, 'auto' is passed through."""
+    value = os.environ.get(name, default)
+    if value == 'auto':
+        return value
+    return parse(value)
+
+
 class CameraService:
-    def __init__(self, logger=None):
+    def __init__(self, logger=None, session_ttl=300, max_sessions=32,
+                 reduced_decode=True, admission_control=True):
         self.camera = None
         self.logger = logger
         self.notifier = FCMNotifier(logger=logger)
         self.current_location = None
         self.fall_detector = None # Initialize to None for Async Loader
+        self._detector_config = None
+        self._pose_batcher = None
+        # Decode uploaded JPEGs at the lowest resolution the model needs
+        self.reduced_decode = reduced_decode
+        # Answer frames that arrive faster than min_time_between_frames
+        # from a cache, before they are decoded
+        self.admission_control = admission_control
+        # One DetectorSession per client/camera stream. All sessions share
+        # the model loaded by _init_detector.
+        self.sessions = SessionRegistry(self._create_session,
+                                        ttl=session_ttl,
+                                        max_sessions=max_sessions)
+        # One producer per video source, shared by all /video_feed viewers
+        self._broadcasters = {}
+        self._broadcasters_lock = threading.Lock()
+        # Model warm-up state, see start_warmup()
+        self.ready = threading.Event()
+        self.warmup_status = {"state": "pending"}
+        self._warmup_thread = None
+        self._warmup_lock = threading.Lock()
+        # Recorded video played as the backend camera by generate_frames,
+        # looped in real time. Unset: the camera lives in the frontend.
+        self.replay_video = os.environ.get('REPLAY_VIDEO') or None
         if self.logger: self.logger("Camera Service Initialized (NO AI MODE)", "info")
 
     def update_fcm_token(self, token):
         self.notifier.set_fcm_token(token)
 
-    def update_location(self, lat, lng):
-        self.current_location = {
+    def update_location(self, lat, lng, stream_id=None):
+        location = {
             'lat': lat,
             'lng': lng,
             'map_link': f"https://www.google.com/maps?q={lat},{lng}"
         }
+        if stream_id:
+            self.get_session(stream_id).current_location = location
+        else:
+            self.current_location = location
         if self.logger: self.logger(f"GPS Location Updated: {lat}, {lng}", "info")
 
+    def _create_session(self, stream_id):
+        """Builds a DetectorSession with its own temporal state on the shared model."""
+        base = self._init_detector()
+        fall_detector = FallDetector(tfengine=base._tfengine,
+                                     pose_engine=self._pose_batcher,
+                                     **self._detector_config)
+        if self.logger: self.logger(f"Detector session opened for stream '{stream_id}'", "info")
+        return DetectorSession(stream_id, fall_detector)
+
+    def get_session(self, stream_id=None):
+        """Returns the detector session of a stream, creating it on first use."""
+        return self.sessions.get(stream_id or DEFAULT_STREAM_ID)
+
+    def _skipped_result(self, session, result_format):
+        """Cheap answer for a frame turned away by admission control.
+
+        Repeats the last result of the stream with the current state of
+        its alert latch.
+        """
+        cached = session.cached_results.get(result_format)
+        latched = session.is_latched()
+        if result_format != FORMAT_JSON:
+            # compact results are cached as (status, detection fields)
+            status, fields = cached or ("NORMAL", {})
+            if latched:
+                status = "FALL_DETECTED"
+            elif status == "FALL_DETECTED":
+                status = "NORMAL"
+            return encode_result(status, latched, result_format=result_format,
+                                 **fields)
+        result = dict(cached) if cached else {"status": "NORMAL", "detections": []}
+        if latched:
+            result["status"] = "FALL_DETECTED"
+        elif result["status"] == "FALL_DETECTED":
+            result["status"] = "NORMAL"
+        result["alert_active"] = latched
+        result["skipped"] = True
+        result["next_frame_ms"] = round(1000 * session.next_frame_interval(
+            session.fall_detector.min_time_between_frames))
+        return result
+
     def _init_detector(self):
         if self.fall_detector is not None:
             return self.fall_detector
@@ -58,11 +144,43 @@ class CameraService:
                 'labels': _good_labels,
                 'top_k': 5,
                 'confidence_threshold': 0.45,
-                'model_name': 'mobilenet'
+                'model_name': 'mobilenet',
+                # Rotate the prepared tensor instead of re-running the whole
+                # pipeline on rotated images ('image', 'tensor' or 'batched')
+                'rotation_mode': os.environ.get('ROTATION_MODE', 'tensor'),
+                # Interpreters serving concurrent requests (gunicorn
+                # --threads), the cores left over go to their threads
+                'pool_size': int(os.environ.get('INTERPRETER_POOL_SIZE',
+                                                inference.default_pool_size())),
+                # Interpreter options, 'auto' benchmarks the candidates
+                # at startup and keeps the fastest for this host
+                'num_threads': _env_option('INTERPRETER_NUM_THREADS', 'auto', int),
+                'xnnpack': _env_option('INTERPRETER_XNNPACK', 'auto',
+                                       lambda v: v.lower() not in ('0', 'false', 'off'))
             }
 
             try:
-                self.fall_detector = FallDetector(**config)
+                # Opt-in: every Nth analysed frame of any stream is written
+                # annotated to a ring of JPEGs under DEFAULT_DATA_DIR
+                capture_every = int(os.environ.get('DIAGNOSTIC_CAPTURE_EVERY', 0))
+                if capture_every > 0:
+                    config['diagnostics'] = DiagnosticCapture(
+                        every=capture_every,
+                        ring_size=int(os.environ.get('DIAGNOSTIC_CAPTURE_RING', 200)))
+                fall_detector = FallDetector(**config)
+
+                # Optional micro-batching: concurrent frames from different
+                # streams that arrive within the window share one invoke.
+                batch_window_ms = float(os.environ.get('MICRO_BATCH_WINDOW_MS', 0))
+                if batch_window_ms > 0:
+                    self._pose_batcher = MicroBatchingPoseEngine(
+                        fall_detector._pose_engine,
+                        window=batch_window_ms / 1000.0,
+                        max_batch_size=int(os.environ.get('MICRO_BATCH_MAX_SIZE', 8)),
+                        workers=config['pool_size'])
+                # Published last: a set fall_detector means fully loaded
+                self._detector_config = config
+                self.fall_detector = fall_detector
                 if self.logger:
                     self.logger(
                         "AI Model Loaded: PoseNet MobileNet v1 (Sensitivity: Balanced)",
@@ -77,17 +195,123 @@ class CameraService:
             
             return self.fall_detector
 
+    def start_warmup(self, invokes=None):
+        """Loads the model and runs dummy invokes on a background thread.
+
+        Until this is done process_frame answers AI_NOT_READY right away
+        instead of blocking a worker thread on the TensorFlow import,
+        tensor allocation and the slow first invoke. Calling it again
+        while warm-up runs or after it finished does nothing.
+        """
+        if invokes is None:
+            invokes = int(os.environ.get('WARMUP_INVOKES', 3))
+        with self._warmup_lock:
+            if self.ready.is_set() or getattr(self, 'ai_disabled', False):
+                return
+            if self._warmup_thread is not None and self._warmup_thread.is_alive():
+                return
+            self.warmup_status = {"state": "warming", "started_at": time.time()}
+            self._warmup_thread = threading.Thread(target=self._warmup,
+                                                   args=(invokes,),
+                                                   name='ai-warmup',
+                                                   daemon=True)
+            self._warmup_thread.start()
+
+    def _warmup(self, invokes):
+        start_time = time.monotonic()
+        try:
+            self._init_detector()
+        except Exception as e:
+            # _init_detector disabled the AI, process_frame reports AI_ERROR
+            self.warmup_status = {
+                "state": "failed",
+                "error": str(e),
+                "duration_s": round(time.monotonic() - start_time, 3),
+            }
+            return
+        load_seconds = time.monotonic() - start_time
+        status = {"state": "ready", "load_s": round(load_seconds, 3),
+                  "runtime": dict(inference.backend_info)}
+        try:
+            tfengine = self.fall_detector._tfengine
+            status["invoke_s"] = round(tfengine.warmup(invokes=invokes), 3)
+            status["interpreters"] = tfengine.pool_size
+            status["num_threads"] = tfengine.num_threads
+            status["xnnpack"] = tfengine.xnnpack
+            if tfengine.autotune_results:
+                status["autotune"] = tfengine.autotune_results
+            status["invokes"] = invokes
+            # one pass through pre- and post-processing as well
+            blank = np.zeros((480, 640, 3), dtype=np.uint8)
+            self.fall_detector.find_keypoints(blank)
+        except Exception as e:
+            # The model loaded, only the warm-up itself failed: serve anyway
+            print(f"AI Warm-up Error: {e}", flush=True)
+            status["error"] = str(e)
+        duration = time.monotonic() - start_time
+        status["duration_s"] = round(duration, 3)
+        self.warmup_status = status
+        self.ready.set()
+        if self.logger:
+            runtime = status["runtime"]
+            self.logger(f"AI Warm-up Complete ({duration:.1f}s, runtime: "
+                        f"{runtime.get('backend')}, import {runtime.get('import_s')}s, "
+                        f"+{runtime.get('import_rss_mb')} MB)", "success")
+
+    def after_fork(self):
+        """Restarts the background threads in a forked worker process.
+
+        With gunicorn --preload the app is imported in the master, and no
+        thread survives the fork: the warm-up, the micro-batching workers
+        and the diagnostic capture writer. The batcher and the capture are
+        restarted in place, so the detectors of existing sessions keep
+        working. A model already loaded in the master is reused, a half
+        loaded one is loaded again.
+        """
+        global _model_lock
+        if self._pose_batcher is not None:
+            self._pose_batcher.after_fork()
+        diagnostics = (self._detector_config or {}).get('diagnostics')
+        if diagnostics is not None:
+            diagnostics.after_fork()
+        if self.ready.is_set():
+            return
+        # the lock may have been held by the master's warm-up thread
+        _model_lock = threading.Lock()
+        self._warmup_lock = threading.Lock()
+        self._warmup_thread = None
+        self.start_warmup()
+
     def start_camera(self):
-        # Migrated to Frontend. Backend no longer accesses hardware directly.
-        pass
+        # Migrated to Frontend. Backend no longer accesses hardware directly,
+        # only a recorded video can be replayed in place of a camera.
+        if self.replay_video and self.camera is None:
+            try:
+                self.camera = VideoReplaySource(self.replay_video,
+                                                realtime=True)
+            except IOError as e:
+                print(f"Video replay failed: {e}", flush=True)
 
     def stop_camera(self):
         # Migrated to Frontend.
-        pass
+        if self.camera is not None:
+            self.camera.release()
+            self.camera = None
+
+    def reset_alert(self, stream_id=None):
+        """Manually clears the fall detection latch.
 
-    def reset_alert(self):
-        """Manually clears the fall detection latch."""
-        self.alert_latch_until = 0
+        Clears the latch of a single stream when ``stream_id`` is given,
+        otherwise the latch of every live stream.
+        """
+        if stream_id:
+            session = self.sessions.peek(stream_id)
+            targets = [session] if session is not None else []
+        else:
+            targets = self.sessions.sessions()
+        for session in targets:
+            session.alert_latch_until = 0
+            session.cached_results.clear()
         if self.logger: self.logger("Alert Manually Reset by User", "info")
 
     def _draw_keypoints(self, frame, keypoints):
@@ -137,6 +361,20 @@ class CameraService:
             label_bg_pt2 = (min_x + 140, min_y - 25)
             cv2.rectangle(frame, (min_x, min_y - 30), label_bg_pt2, color, -1)
 
+    def stream_frames(self, source=DEFAULT_STREAM_ID):
+        """MJPEG parts of a video source for one viewer.
+
+        All viewers of a source share a single generate_frames producer,
+        so every frame is captured, analysed and encoded only once.
+        """
+        with self._broadcasters_lock:
+            broadcaster = self._broadcasters.get(source)
+            if broadcaster is None:
+                broadcaster = FrameBroadcaster(self.generate_frames,
+                                               name=f'video-feed-{source}')
+                self._broadcasters[source] = broadcaster
+        return broadcaster.subscribe()
+
     def generate_frames(self):
         # Initial connect attempt
         self.start_camera()
@@ -178,11 +416,11 @@ class CameraService:
             try:
                 # --- AI LOGIC START ---
                 rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                pil_image = Image.fromarray(rgb_frame)
                 
                 # Singleton AI Loading
                 if self.fall_detector is None:
                     self._init_detector()
+                session = self.get_session(DEFAULT_STREAM_ID)
 
                 # AI IS READY
                 if self.fall_detector:
@@ -193,7 +431,10 @@ class CameraService:
                 processed_sample = None
                 if self.fall_detector:
                     try:
-                        processed_sample = next(self.fall_detector.process_sample(image=pil_image))
+                        # replayed frames carry their recorded time
+                        processed_sample = next(session.fall_detector.process_sample(
+                            image=rgb_frame,
+                            timestamp=getattr(self.camera, 'timestamp', None)))
                     except Exception as e:
                         # If inference fails, just show raw video
                         print(f"Inference Error: {e}", flush=True)
@@ -207,7 +448,7 @@ class CameraService:
 
                 # Check for alert latch expiration
                 current_time = time.time()
-                is_latched = hasattr(self, 'alert_latch_until') and current_time < self.alert_latch_until
+                is_latched = session.is_latched(current_time)
 
                 if processed_sample:
                     inference_result = processed_sample.get('inference_result')
@@ -239,14 +480,15 @@ class CameraService:
                                               cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
 
                             if label == 'FALL':
-                                self.alert_latch_until = current_time + 5.0
+                                session.alert_latch_until = current_time + 5.0
                                 is_latched = True
                                 _, img_encoded = cv2.imencode('.jpg', frame)
                                 import datetime
                                 now_str = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
                                 payload = {'timestamp': now_str}
-                                if self.current_location:
-                                    payload.update(self.current_location)
+                                location = session.current_location or self.current_location
+                                if location:
+                                    payload.update(location)
                                 try:
                                     self.notifier.send_fall_alert(img_encoded.tobytes(), payload)
                                 except Exception as e:
@@ -268,43 +510,98 @@ class CameraService:
                 # On error, we just continue so we at least stream the raw frame
                 pass
 
-            ret, buffer = cv2.imencode('.jpg', frame)
+            with metrics.time('encode'):
+                ret, buffer = cv2.imencode('.jpg', frame)
             frame_bytes = buffer.tobytes()
             yield (b'--frame\r\n'
                    b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
 
-    def process_frame(self, image_bytes):
+    def process_frame(self, image_bytes, stream_id=None,
+                      result_format=FORMAT_JSON):
         """
         Processes a single frame uploaded from the frontend.
+        Frames are routed to the detector session of ``stream_id`` so that
+        every camera keeps its own pose history and alert latch.
         Returns detection results (status, keypoints) in JSON-compatible format.
+        With a ``result_format`` of 'binary' or 'msgpack' the result is
+        encoded bytes instead (see result_codec.py), errors stay dicts.
         """
-        try:
-            # Decode image
-            nparr = np.frombuffer(image_bytes, np.uint8)
-            frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-            
-            if frame is None:
-                return {"error": "Failed to decode image"}
+        return self.process_frame_with_interval(image_bytes, stream_id,
+                                                result_format)[0]
 
-            # Prepare for AI
-            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            pil_image = Image.fromarray(rgb_frame)
+    def process_frame_with_interval(self, image_bytes, stream_id=None,
+                                    result_format=FORMAT_JSON):
+        """Like process_frame, returns (result, seconds until the next frame).
 
+        The interval is None when the frame did not reach a detector
+        session (AI not ready, errors).
+        """
+        result, session = self._process_frame(image_bytes, stream_id,
+                                              result_format)
+        if session is None:
+            return result, None
+        return result, session.next_frame_interval(
+            session.fall_detector.min_time_between_frames)
+
+    def _process_frame(self, image_bytes, stream_id, result_format):
+        """process_frame, returns (result, session or None)."""
+        compact = result_format != FORMAT_JSON
+        try:
             # Lazy-load AI if needed (Synchronous here to return result immediately)
             # Lazy-load AI if needed (Singleton Guard)
             if getattr(self, 'ai_disabled', False):
-                return {"status": "AI_ERROR", "error": getattr(self, 'ai_error_msg', "Unknown AI Error")}
-
-            if self.fall_detector is None:
-                try:
-                    self._init_detector()
-                except Exception as e:
-                     return {"error": f"AI Init Failed: {str(e)}"}
+                if compact:
+                    return encode_result("AI_ERROR", False,
+                                         result_format=result_format), None
+                return {"status": "AI_ERROR", "error": getattr(self, 'ai_error_msg', "Unknown AI Error")}, None
+
+            # Do not block on model loading, the client retries
+            if not self.ready.is_set():
+                self.start_warmup()
+                if compact:
+                    return encode_result("AI_NOT_READY", False,
+                                         result_format=result_format), None
+                return {"status": "AI_NOT_READY"}, None
+
+            # Admission control. The detector ignores frames closer than
+            # min_time_between_frames to the previous one, so turn those
+            # away before paying for decoding.
+            # The arrival time is the frame's timestamp for the detector as
+            # well, admission and the detector's own frame spacing check
+            # must not disagree.
+            started = time.monotonic()
+            session = None
+            if self.fall_detector and self.admission_control:
+                session = self.get_session(stream_id)
+                if not session.admit(session.fall_detector.min_time_between_frames,
+                                     now=started):
+                    metrics.inc('frames_skipped')
+                    return self._skipped_result(session, result_format), session
+
+            # Decode image. The model only needs its input size, so large
+            # JPEGs are decoded at 1/2, 1/4 or 1/8 scale.
+            target_size = None
+            if self.reduced_decode and self.fall_detector:
+                pose_engine = self.fall_detector._pose_engine
+                target_size = (pose_engine._tensor_image_width,
+                               pose_engine._tensor_image_height)
+            with metrics.time('decode'):
+                frame, frame_size, decode_factor = decode_frame(image_bytes, target_size)
+                if frame is not None:
+                    # Prepare for AI. The numpy frame goes straight into the
+                    # model's input buffer, PIL is not involved.
+                    rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            
+            if frame is None:
+                return {"error": "Failed to decode image"}, None
 
             # Run Inference
             if self.fall_detector:
-                processed_sample = next(self.fall_detector.process_sample(image=pil_image))
+                session = session or self.get_session(stream_id)
+                processed_sample = next(session.fall_detector.process_sample(
+                    image=rgb_frame, frame_size=frame_size, timestamp=started))
                 inference_result = processed_sample.get('inference_result')
+                encode_start = time.perf_counter()
                 
                 # Default Clean Result
                 result = {
@@ -315,52 +612,84 @@ class CameraService:
 
                 # Check Latch
                 current_time = time.time()
-                is_latched = hasattr(self, 'alert_latch_until') and current_time < self.alert_latch_until
+                is_latched = session.is_latched(current_time)
+                last_det = None
 
                 if inference_result:
                     for det in inference_result:
                         label = det.get('label')
-                        keypoints = det.get('keypoint_corr') # { 'nose': [x,y], ... }
-                        
-                        # Serialize Keypoints (numpy floats to native python floats)
-                        serialized_kpts = {}
-                        if keypoints:
-                            for k, v in keypoints.items():
-                                if v is not None:
-                                    serialized_kpts[k] = [float(v[0]), float(v[1])]
-
-                        detection_data = {
-                            "label": label,
-                            "keypoints": serialized_kpts,
-                            "score": float(det.get('score', 0))
-                        }
-                        result["detections"].append(detection_data)
+                        last_det = det
+
+                        if not compact:
+                            keypoints = det.get('keypoint_corr') # { 'nose': [x,y], ... }
+
+                            # Serialize Keypoints (numpy floats to native python floats)
+                            serialized_kpts = {}
+                            if keypoints:
+                                for k, v in keypoints.items():
+                                    if v is not None:
+                                        serialized_kpts[k] = [float(v[0]), float(v[1])]
+
+                            detection_data = {
+                                "label": label,
+                                "keypoints": serialized_kpts,
+                                "score": float(det.get('confidence', 0))
+                            }
+                            result["detections"].append(detection_data)
 
                         if label == 'FALL':
-                            self.alert_latch_until = current_time + 5.0
+                            session.alert_latch_until = current_time + 5.0
                             is_latched = True
                             
                             # Trigger Notification (Background)
-                            # We re-encode the frame for the alert image
-                            _, img_encoded = cv2.imencode('.jpg', frame)
+                            # We re-encode the frame for the alert image,
+                            # unless it was decoded at reduced resolution:
+                            # then the full size upload is already a JPEG.
+                            if decode_factor > 1:
+                                alert_image = image_bytes
+                            else:
+                                _, img_encoded = cv2.imencode('.jpg', frame)
+                                alert_image = img_encoded.tobytes()
                             import datetime
                             now_str = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
                             payload = {'timestamp': now_str}
-                            if self.current_location:
-                                payload.update(self.current_location)
+                            location = session.current_location or self.current_location
+                            if location:
+                                payload.update(location)
                             
                             # Run notification in separate thread to not block response
                             threading.Thread(target=self.notifier.send_fall_alert, 
-                                           args=(img_encoded.tobytes(), payload)).start()
+                                           args=(alert_image, payload)).start()
 
                 if is_latched:
                     result["status"] = "FALL_DETECTED"
                     result["alert_active"] = True
+
+                session.record_processing_time(time.monotonic() - started)
+                if compact:
+                    # Straight from the keypoint array, no per-keypoint dicts
+                    fields = {}
+                    if last_det is not None:
+                        fields = {'label': last_det.get('label'),
+                                  'score': last_det.get('confidence', 0),
+                                  'keypoints': last_det.get('keypoints')}
+                    # re-encoded with the latch of the moment when replayed
+                    session.cached_results[result_format] = (result["status"], fields)
+                    result = encode_result(result["status"], is_latched,
+                                           result_format=result_format, **fields)
+                else:
+                    result["next_frame_ms"] = round(1000 * session.next_frame_interval(
+                        session.fall_detector.min_time_between_frames))
+                    session.cached_results[result_format] = result
+                metrics.observe('encode', time.perf_counter() - encode_start)
                 
-                return result
+                return result, session
             
-            return {"status": "AI_NOT_READY"}
+            if compact:
+                return encode_result("AI_NOT_READY", False,
+                                     result_format=result_format), None
+            return {"status": "AI_NOT_READY"}, None
 
         except Exception as e:
             print(f"Frame Processing Error: {e}", flush=True)
-            return {"error": str(e)}
+            return {"error": str(e)}, None
@@ -0,0 +1,201 @@
+"""Append-only log of fall events in JSON Lines.
+
+Every event is one line appended to the file, so logging an alert costs
+one small write however long the history is. The newest ``max_events``
+are kept in memory, newest last, and history queries are answered from
+there. Before a query or an append the store only checks the size and
+inode of the file, lines appended by another process (another gunicorn
+worker) are read from where the store left off.
+
+The file is compacted to the newest ``max_events`` lines once it holds
+twice as many. Compaction and :meth:`EventStore.clear` write a new file
+and rename it over the old one, other processes notice the new inode and
+reload it.
+"""
+import itertools
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import deque
+
+_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_EVENTS_FILE = os.path.join(_DIR, 'events.jsonl')
+# the read-modify-write history of earlier versions, imported once
+LEGACY_EVENTS_FILE = os.path.join(_DIR, 'events.json')
+
+
+class EventStore:
+    """Fall event history backed by an append-only JSON Lines file.
+
+    Events are dicts with a unique, increasing integer ``id``, the
+    millisecond time they were logged at.
+    """
+
+    def __init__(self, path=DEFAULT_EVENTS_FILE, max_events=1000,
+                 legacy_path=None):
+        """
+        :Parameters:
+        ----------
+        path: str
+            The JSON Lines file, created when missing.
+        max_events: int
+            Events kept in memory and after compaction.
+        legacy_path: str
+            A JSON list of events, newest first, imported when ``path``
+            does not exist yet.
+        """
+        assert max_events >= 1
+        self.path = path
+        self.max_events = max_events
+        self._events = deque(maxlen=max_events)
+        self._lock = threading.Lock()
+        # what has been read of the file
+        self._inode = None
+        self._offset = 0
+        self._lines = 0
+        self._version = 0
+        # time.time() of the last change, for Last-Modified headers
+        self.modified = time.time()
+        with self._lock:
+            if not os.path.exists(path):
+                self._rewrite(_load_legacy(legacy_path))
+            self._sync()
+
+    @property
+    def version(self):
+        """Increases every time the history changes.
+
+        The in-memory count as of the last query, append or clear: it does
+        not look at the file. Use :meth:`snapshot` for a version that
+        includes the changes of other processes.
+        """
+        return self._version
+
+    def append(self, event):
+        """Log an event dict, returns it with its ``id``."""
+        with self._lock:
+            self._sync()
+            last_id = self._events[-1]['id'] if self._events else 0
+            event = dict(event, id=max(int(time.time() * 1000), last_id + 1))
+            line = (json.dumps(event) + '\n').encode('utf-8')
+            with open(self.path, 'ab') as f:
+                f.write(line)
+                f.flush()
+                end = f.tell()
+            if end == self._offset + len(line):
+                self._offset = end
+                self._lines += 1
+                self._add(event)
+            else:
+                # another process appended meanwhile, read both lines back
+                self._sync()
+            if self._lines >= 2 * self.max_events:
+                self._rewrite(self._events)
+                self._sync()
+            return event
+
+    def query(self, since=None, limit=None, offset=0):
+        """Events newest first.
+
+        :Parameters:
+        ----------
+        since: int
+            Only events with a larger ``id``.
+        limit: int
+            Return at most this many events.
+        offset: int
+            Skip this many of the newest events, for paging.
+        """
+        return self.snapshot(since, limit, offset)[2]
+
+    def snapshot(self, since=None, limit=None, offset=0):
+        """(version, modified, events) of a :meth:`query`, read together.
+
+        The version and the events always match, for ETags of the result.
+        """
+        with self._lock:
+            self._sync()
+            events = reversed(self._events)
+            if since is not None:
+                events = itertools.takewhile(lambda e: e['id'] > since, events)
+            stop = None if limit is None else offset + limit
+            return (self._version, self.modified,
+                    list(itertools.islice(events, offset, stop)))
+
+    def clear(self):
+        """Delete every event."""
+        with self._lock:
+            self._rewrite([])
+            self._sync()
+
+    def __len__(self):
+        with self._lock:
+            self._sync()
+            return len(self._events)
+
+    def _add(self, event):
+        self._events.append(event)
+        self._changed()
+
+    def _changed(self):
+        self._version += 1
+        self.modified = time.time()
+
+    def _sync(self):
+        """Read what was appended to the file since the last call."""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            stat = None
+        if stat is None or stat.st_ino != self._inode \
+                or stat.st_size < self._offset:
+            # replaced by a compaction, cleared or removed
+            self._events.clear()
+            self._changed()
+            self._inode = stat.st_ino if stat else None
+            self._offset = self._lines = 0
+        if stat is None or stat.st_size == self._offset:
+            return
+        with open(self.path, 'rb') as f:
+            f.seek(self._offset)
+            data = f.read(stat.st_size - self._offset)
+        # a line still being written by another process is left for later
+        complete = data.rfind(b'\n') + 1
+        for line in data[:complete].splitlines():
+            self._lines += 1
+            try:
+                self._add(json.loads(line))
+            except ValueError:
+                continue
+        self._offset += complete
+
+    def _rewrite(self, events):
+        """Atomically replace the file with ``events``, oldest first."""
+        fd, tmp_path = tempfile.mkstemp(
+            dir=os.path.dirname(os.path.abspath(self.path)),
+            prefix='.events-', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                for event in events:
+                    f.write(json.dumps(event) + '\n')
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+
+def _load_legacy(path):
+    """Events of an events.json list, oldest first."""
+    if not path or not os.path.exists(path):
+        return []
+    try:
+        with open(path, 'r') as f:
+            events = json.load(f)
+    except ValueError:
+        return []
+    if not isinstance(events, list):
+        return []
+    events = [e for e in events if isinstance(e, dict) and 'id' in e]
+    return sorted(events, key=lambda e: e['id'])
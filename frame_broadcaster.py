@@ -0,0 +1,115 @@
+"""Fan-out of one processed video stream to many HTTP viewers."""
+import threading
+from collections import deque
+
+
+class FrameBroadcaster:
+    """Runs a frame producer once and shares its output with all subscribers.
+
+    The producer (a generator of ready-to-send MJPEG parts) is driven by a
+    single background thread, so capture, inference and JPEG encoding
+    happen once per frame no matter how many viewers are connected. Each
+    part is published into a small ring buffer. Subscribers always take
+    the newest part: a slow viewer skips the frames it missed instead of
+    holding the producer back.
+
+    The producer thread starts with the first subscriber and stops once
+    the last one has left. When the producer ends or fails, the
+    subscribers of that run end too instead of waiting for frames that
+    will never come.
+    """
+
+    def __init__(self, producer, ring_size=4, name='frame-broadcaster'):
+        """
+        :Parameters:
+        ----------
+        producer: callable
+            Returns a fresh iterator of encoded frames on every call.
+        ring_size: int
+            Number of recent frames kept.
+        name: str
+            Name of the producer thread.
+        """
+        assert ring_size >= 1
+        self._producer = producer
+        self.name = name
+        self._ring = deque(maxlen=ring_size)
+        self._seq = 0
+        self._subscribers = 0
+        self._thread = None
+        self._cond = threading.Condition()
+
+    @property
+    def subscribers(self):
+        return self._subscribers
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def latest(self):
+        """(seq, frame) of the newest published frame, None if none yet."""
+        with self._cond:
+            return self._ring[-1] if self._ring else None
+
+    def subscribe(self, timeout=None):
+        """Generator yielding the newest frame each time one is published.
+
+        Closing the generator (e.g. when the HTTP client disconnects)
+        unsubscribes. With a ``timeout`` the generator ends when no frame
+        arrives for that many seconds. It also ends when the producer does.
+        """
+        with self._cond:
+            self._subscribers += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run,
+                                                name=self.name,
+                                                daemon=True)
+                self._thread.start()
+            thread = self._thread
+        try:
+            last_seq = 0
+            while True:
+                with self._cond:
+                    if not self._cond.wait_for(
+                            lambda: self._thread is not thread or (
+                                self._ring and self._ring[-1][0] > last_seq),
+                            timeout):
+                        return
+                    if self._thread is not thread:
+                        return
+                    last_seq, frame = self._ring[-1]
+                yield frame
+        finally:
+            with self._cond:
+                self._subscribers -= 1
+
+    def _publish(self, frame):
+        with self._cond:
+            self._seq += 1
+            self._ring.append((self._seq, frame))
+            self._cond.notify_all()
+
+    def _run(self):
+        frames = self._producer()
+        try:
+            for frame in frames:
+                self._publish(frame)
+                with self._cond:
+                    if self._subscribers == 0:
+                        self._thread = None
+                        return
+        except Exception as e:
+            print(f"Frame producer {self.name} failed: {e}", flush=True)
+        finally:
+            with self._cond:
+                if self._thread is threading.current_thread():
+                    self._thread = None
+                if self._thread is None:
+                    # a later producer run must not serve stale frames
+                    self._ring.clear()
+                # wake the subscribers of this run so they can end
+                self._cond.notify_all()
+            close = getattr(frames, 'close', None)
+            if close is not None:
+                close()
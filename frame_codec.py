@@ -0,0 +1,101 @@
+"""Decoding of uploaded camera frames."""
+import cv2
+import numpy as np
+
+# JPEG start-of-frame markers, they carry the image dimensions
+_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7,
+                0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+# libjpeg DCT scaled decode, largest reduction first
+_REDUCED_DECODE_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+)
+
+
+def jpeg_size(data):
+    """Return (width, height) from a JPEG header, None if not a JPEG.
+
+    Only the marker segments up to the start-of-frame header are walked,
+    the image itself is not decoded.
+    """
+    if len(data) < 4 or data[0] != 0xFF or data[1] != 0xD8:
+        return None
+    i = 2
+    n = len(data)
+    while i + 4 <= n:
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        if marker == 0xFF:
+            # fill byte
+            i += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD8:
+            # markers without a payload
+            i += 2
+            continue
+        segment_length = int.from_bytes(data[i + 2:i + 4], 'big')
+        if marker in _SOF_MARKERS:
+            if i + 9 > n:
+                return None
+            height = int.from_bytes(data[i + 5:i + 7], 'big')
+            width = int.from_bytes(data[i + 7:i + 9], 'big')
+            return width, height
+        i += 2 + segment_length
+    return None
+
+
+def reduced_decode_factor(frame_size, target_size):
+    """Largest DCT scale factor (1, 2, 4 or 8) that still covers target_size.
+
+    The frame is later shrunk to fit target_size preserving its aspect
+    ratio, so it is enough that the reduced frame stays at least as large
+    as that thumbnail.
+    """
+    width, height = frame_size
+    target_width, target_height = target_size
+    max_factor = max(width / target_width, height / target_height)
+    for factor, _ in _REDUCED_DECODE_FLAGS:
+        if factor <= max_factor:
+            return factor
+    return 1
+
+
+def decode_frame(image_bytes, target_size=None):
+    """Decode an uploaded frame into a BGR numpy array.
+
+    :Parameters:
+    ----------
+    image_bytes: bytes
+        Encoded image, usually a JPEG from the browser.
+    target_size: (width, height)
+        Model input size. When given, JPEGs are decoded at the smallest
+        resolution that still covers it, which for large uploads is several
+        times cheaper than a full decode.
+    :Returns:
+    -------
+    (frame, frame_size, factor)
+        frame is None if decoding failed. frame_size is the (width, height)
+        of the original upload, factor the scale the frame was reduced by.
+    """
+    nparr = np.frombuffer(image_bytes, np.uint8)
+    size = jpeg_size(image_bytes) if target_size else None
+    factor = reduced_decode_factor(size, target_size) if size else 1
+    if factor > 1:
+        flag = dict(_REDUCED_DECODE_FLAGS)[factor]
+        frame = cv2.imdecode(nparr, flag)
+    else:
+        frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+    if frame is None:
+        return None, None, factor
+
+    decoded_height, decoded_width = frame.shape[:2]
+    if size is None:
+        return frame, (decoded_width, decoded_height), factor
+    width, height = size
+    if (decoded_width > decoded_height) != (width > height):
+        # EXIF orientation was applied while decoding
+        width, height = height, width
+    return frame, (width, height), factor
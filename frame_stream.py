@@ -0,0 +1,132 @@
+"""Pipelined frame ingestion over a persistent client connection.
+
+Wire format of the binary messages a client sends: one or more frame
+records, each a little-endian header followed by the encoded image:
+
+    uint32 payload length | uint32 frame sequence number | JPEG bytes
+
+Results are pushed back asynchronously, tagged with the sequence number
+of the frame they belong to, so a client can keep several frames in
+flight instead of waiting for a round trip per frame. JSON results carry
+``seq`` and ``dropped`` keys. Results in a compact format (see
+result_codec.py) are binary messages with a little-endian prefix:
+
+    uint32 frame sequence number | uint32 frames dropped | result bytes
+"""
+import struct
+import threading
+from collections import deque
+
+FRAME_HEADER = struct.Struct('<II')
+RESULT_HEADER = struct.Struct('<II')
+
+
+def parse_frames(message):
+    """Yield (seq, payload) for each length-prefixed frame of a message.
+
+    Raises ValueError if the message is truncated.
+    """
+    view = memoryview(message)
+    offset = 0
+    while offset < len(view):
+        if offset + FRAME_HEADER.size > len(view):
+            raise ValueError('Truncated frame header')
+        length, seq = FRAME_HEADER.unpack_from(view, offset)
+        offset += FRAME_HEADER.size
+        if offset + length > len(view):
+            raise ValueError(f'Truncated frame {seq}: expected {length} bytes')
+        yield seq, view[offset:offset + length].tobytes()
+        offset += length
+
+
+def pack_frame(seq, payload):
+    """Encode one frame record, the counterpart of :func:`parse_frames`."""
+    return FRAME_HEADER.pack(len(payload), seq) + payload
+
+
+class FrameStream:
+    """Processes the frames of one connection on a dedicated worker thread.
+
+    Incoming frames wait in a small queue. When the client sends faster
+    than frames are processed, the oldest waiting frame is dropped so the
+    detector always works on recent frames and memory stays bounded.
+    """
+
+    def __init__(self, process, send, max_pending=2):
+        """
+        :Parameters:
+        ----------
+        process: callable
+            ``process(image_bytes)`` returns the detection result dict,
+            or encoded result bytes.
+        send: callable
+            ``send(result)`` pushes a result dict, or tagged result
+            bytes, back to the client.
+        max_pending: int
+            Frames allowed to wait for processing before the oldest
+            is dropped.
+        """
+        assert max_pending >= 1
+        self._process = process
+        self._send = send
+        self.max_pending = max_pending
+        self.received = 0
+        self.dropped = 0
+        self._pending = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._worker = threading.Thread(target=self._run,
+                                        name='frame-stream',
+                                        daemon=True)
+        self._worker.start()
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def feed(self, message):
+        """Queue the frames of a binary client message."""
+        frames = list(parse_frames(message))
+        with self._cond:
+            for frame in frames:
+                self.received += 1
+                if len(self._pending) >= self.max_pending:
+                    self._pending.popleft()
+                    self.dropped += 1
+                self._pending.append(frame)
+            self._cond.notify()
+
+    def close(self, timeout=None):
+        """Stop the worker, frames still waiting are discarded."""
+        with self._cond:
+            self._closed = True
+            self._pending.clear()
+            self._cond.notify()
+        if threading.current_thread() is not self._worker:
+            self._worker.join(timeout)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                seq, payload = self._pending.popleft()
+                dropped = self.dropped
+            try:
+                result = self._process(payload)
+            except Exception as e:
+                result = {"error": str(e)}
+            if isinstance(result, bytes):
+                result = RESULT_HEADER.pack(seq, dropped) + result
+            else:
+                result = dict(result, seq=seq, dropped=dropped)
+            try:
+                self._send(result)
+            except Exception:
+                # client went away
+                with self._cond:
+                    self._closed = True
+                    self._pending.clear()
+                return
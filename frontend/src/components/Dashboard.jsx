@@ -3,6 +3,18 @@ import { auth } from '../firebase';
 import { useNavigate } from 'react-router-dom';
 import Sidebar from './Sidebar';
 
+// Per-tab stream id so the backend keeps a separate detector session per camera
+const getStreamId = () => {
+    let id = sessionStorage.getItem('orion_stream_id');
+    if (!id) {
+        id = (window.crypto && window.crypto.randomUUID)
+            ? window.crypto.randomUUID()
+            : `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+        sessionStorage.setItem('orion_stream_id', id);
+    }
+    return id;
+};
+
 const Dashboard = () => {
     const navigate = useNavigate();
     const [user, setUser] = useState(null);
@@ -23,6 +35,8 @@ const Dashboard = () => {
 
     // Log Scroll
     const logsEndRef = useRef(null);
+    // seq of the newest server log entry received
+    const logSeqRef = useRef(0);
     const lastAlertTimeRef = useRef(null);
     const isInitialLoad = useRef(true);
 
@@ -40,7 +54,10 @@ const Dashboard = () => {
             setIsSirenActive(false);
 
             // Notify Backend to reset state
-            await fetch('/api/reset_alert', { method: 'POST' });
+            await fetch('/api/reset_alert', {
+                method: 'POST',
+                headers: { 'X-Stream-Id': getStreamId() }
+            });
             addLog("Alarm Manually Reset", "info");
 
         } catch (e) {
@@ -135,17 +152,124 @@ const Dashboard = () => {
 
     // --- FRAME PROCESSING LOOP ---
     const isProcessingRef = useRef(false);
+    const socketRef = useRef(null);
+    const inFlightRef = useRef(0);
+    const frameSeqRef = useRef(0);
+    const MAX_IN_FLIGHT = 2;
+    // Server-suggested pacing, frames sent faster are skipped by the server
+    const frameIntervalRef = useRef(0);
+    const lastFrameSentRef = useRef(0);
+
+    const applyResult = (data) => {
+        const canvas = canvasRef.current;
+        if (!canvas) return;
+        const ctx = canvas.getContext('2d');
+
+        if (data.next_frame_ms !== undefined) {
+            frameIntervalRef.current = data.next_frame_ms;
+        }
+        // Skipped frames repeat the previous result, nothing new to draw
+        if (data.skipped) return;
+
+        // Update Status
+        if (data.status) {
+            setDetectionStatus(data.status);
+            if (data.alert_active && !isSirenActive) {
+                playSiren();
+            }
+        }
+
+        // Draw Overlay
+        ctx.clearRect(0, 0, canvas.width, canvas.height);
+
+        // Restore Status Text on Canvas
+        // Scale font based on resolution
+        const fontSize = Math.max(16, Math.floor(canvas.width / 30));
+        ctx.font = `${fontSize}px monospace`;
+        ctx.fillStyle = data.status === "FALL_DETECTED" ? "red" : "#00FF00";
+        ctx.fillText(data.status === "FALL_DETECTED" ? "WARNING: FALL DETECTED" : "AI MONITORING ACTIVE", 20, 40);
+
+        if (data.detections) {
+            data.detections.forEach(det => {
+                if (det.keypoints) {
+                    drawSkeleton(ctx, det.keypoints);
+                    drawBBox(ctx, det.keypoints, det.label === 'FALL' ? 'red' : 'green');
+                }
+            });
+        }
+    };
+
+    // Persistent WebSocket ingestion. Falls back to one POST per frame
+    // when the socket cannot be opened (e.g. behind a proxy without WS).
+    useEffect(() => {
+        if (!isCameraActive) return;
+
+        const base = import.meta.env.VITE_WS_URL ||
+            `${window.location.protocol === 'https:' ? 'wss' : 'ws'}://${window.location.host}`;
+        let socket;
+        try {
+            socket = new WebSocket(`${base}/api/frame_stream?stream_id=${encodeURIComponent(getStreamId())}`);
+        } catch (e) {
+            return;
+        }
+        socket.binaryType = 'arraybuffer';
+        socket.onopen = () => {
+            socketRef.current = socket;
+            inFlightRef.current = 0;
+            addLog("Frame Stream Connected", "success");
+        };
+        let lastDropped = 0;
+        socket.onmessage = (event) => {
+            try {
+                const data = JSON.parse(event.data);
+                // One result per processed frame, frames the server dropped
+                // (cumulative "dropped" count) never get one
+                const dropped = data.dropped || 0;
+                inFlightRef.current = Math.max(0, inFlightRef.current - 1 - (dropped - lastDropped));
+                lastDropped = dropped;
+                if (!data.error) applyResult(data);
+            } catch (e) { }
+        };
+        socket.onclose = () => {
+            if (socketRef.current === socket) socketRef.current = null;
+        };
+        socket.onerror = () => socket.close();
+
+        return () => {
+            socketRef.current = null;
+            socket.close();
+        };
+    }, [isCameraActive]);
+
+    const sendOverSocket = async (socket, blob) => {
+        // Frame record: uint32 LE length | uint32 LE sequence | JPEG bytes
+        const payload = new Uint8Array(await blob.arrayBuffer());
+        const record = new Uint8Array(8 + payload.length);
+        const header = new DataView(record.buffer);
+        header.setUint32(0, payload.length, true);
+        header.setUint32(4, frameSeqRef.current++ >>> 0, true);
+        record.set(payload, 8);
+        inFlightRef.current += 1;
+        socket.send(record);
+    };
 
     useEffect(() => {
         if (!isCameraActive) return;
 
         const interval = setInterval(async () => {
             if (!videoRef.current || !canvasRef.current) return;
-            if (isProcessingRef.current) return; // Prevent stacking requests
+            if (Date.now() - lastFrameSentRef.current < frameIntervalRef.current) return;
+            const socket = socketRef.current;
+            if (socket && socket.readyState === WebSocket.OPEN) {
+                // Pipelined: several frames may be in flight, the server
+                // drops the oldest ones if it falls behind
+                if (inFlightRef.current >= MAX_IN_FLIGHT) return;
+            } else if (isProcessingRef.current) {
+                return; // Prevent stacking requests
+            }
 
             const video = videoRef.current;
             const canvas = canvasRef.current;
-            const ctx = canvas.getContext('2d');
 
             // Match canvas size to video for overlay
             if (video.videoWidth > 0 && canvas.width !== video.videoWidth) {
@@ -161,6 +285,18 @@ const Dashboard = () => {
 
             const offCtx = offscreen.getContext('2d');
             offCtx.drawImage(video, 0, 0);
+            lastFrameSentRef.current = Date.now();
+
+            if (socket && socket.readyState === WebSocket.OPEN) {
+                inFlightRef.current += 1; // reserve the slot while encoding
+                offscreen.toBlob(async (blob) => {
+                    inFlightRef.current -= 1;
+                    if (blob && socket.readyState === WebSocket.OPEN) {
+                        await sendOverSocket(socket, blob);
+                    }
+                }, 'image/jpeg', 0.8);
+                return;
+            }
 
             // Lock processing
             isProcessingRef.current = true;
@@ -173,6 +309,7 @@ const Dashboard = () => {
                 }
                 const formData = new FormData();
                 formData.append('frame', blob);
+                formData.append('stream_id', getStreamId());
 
                 try {
                     // Use relative path for Vercel/Render proxy
@@ -184,33 +321,7 @@ const Dashboard = () => {
                     if (!res.ok) throw new Error("API Error");
 
                     const data = await res.json();
-
-                    // Update Status
-                    if (data.status) {
-                        setDetectionStatus(data.status);
-                        if (data.alert_active && !isSirenActive) {
-                            playSiren();
-                        }
-                    }
-
-                    // Draw Overlay
-                    ctx.clearRect(0, 0, canvas.width, canvas.height);
-
-                    // Restore Status Text on Canvas
-                    // Scale font based on resolution
-                    const fontSize = Math.max(16, Math.floor(canvas.width / 30));
-                    ctx.font = `${fontSize}px monospace`;
-                    ctx.fillStyle = data.status === "FALL_DETECTED" ? "red" : "#00FF00";
-                    ctx.fillText(data.status === "FALL_DETECTED" ? "WARNING: FALL DETECTED" : "AI MONITORING ACTIVE", 20, 40);
-
-                    if (data.detections) {
-                        data.detections.forEach(det => {
-                            if (det.keypoints) {
-                                drawSkeleton(ctx, det.keypoints);
-                                drawBBox(ctx, det.keypoints, det.label === 'FALL' ? 'red' : 'green');
-                            }
-                        });
-                    }
+                    applyResult(data);
 
                 } catch (e) {
                     // console.error(e);
@@ -275,9 +386,14 @@ const Dashboard = () => {
         if (!user) return;
         const fetchLogs = async () => {
             try {
-                const res = await fetch(`/api/system_logs`);
+                const res = await fetch(`/api/system_logs?since=${logSeqRef.current}`);
                 const data = await res.json();
-                if (Array.isArray(data)) setSystemLogs(data);
+                if (!Array.isArray(data) || data.length === 0) return;
+                // entries at or before our cursor: the server restarted
+                // and sent its whole log again
+                const restarted = data[0].seq <= logSeqRef.current;
+                logSeqRef.current = data[data.length - 1].seq;
+                setSystemLogs(prev => restarted ? data : [...prev, ...data].slice(-100));
             } catch (e) { }
         };
         fetchLogs();
@@ -10,6 +10,7 @@ export default defineConfig({
                 target: 'http://127.0.0.1:5000',
                 changeOrigin: true,
                 secure: false,
+                ws: true,
             },
             '/video_feed': {
                 target: 'http://127.0.0.1:5000',
@@ -0,0 +1,59 @@
+"""Bounded in-memory ring of system log entries with sequence numbers."""
+import threading
+from collections import deque
+
+
+class LogRing:
+    """Keeps the newest ``maxlen`` entries, each tagged with a ``seq``.
+
+    Sequence numbers start at 1 and increase by one per entry, so a
+    client that remembers the last ``seq`` it has seen can ask for only
+    the entries after it. Appending is O(1) and safe from any thread.
+    """
+
+    def __init__(self, maxlen=100):
+        self._ring = deque(maxlen=maxlen)
+        self._seq = 0
+        self._cond = threading.Condition()
+
+    @property
+    def seq(self):
+        """Sequence number of the newest entry, 0 when empty."""
+        return self._seq
+
+    def append(self, entry):
+        """Store a dict entry, returns the sequence number it was given."""
+        with self._cond:
+            self._seq += 1
+            self._ring.append(dict(entry, seq=self._seq))
+            self._cond.notify_all()
+            return self._seq
+
+    def since(self, seq=0):
+        """Entries newer than ``seq``, oldest first.
+
+        A ``seq`` ahead of the ring (the process restarted since the
+        client last asked) returns every entry.
+        """
+        with self._cond:
+            if seq > self._seq:
+                seq = 0
+            new = []
+            for entry in reversed(self._ring):
+                if entry['seq'] <= seq:
+                    break
+                new.append(entry)
+        new.reverse()
+        return new
+
+    def wait(self, seq, timeout):
+        """Block until there are entries newer than ``seq`` or ``timeout``.
+
+        Returns them, possibly an empty list.
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self._seq != seq, timeout)
+        return self.since(seq)
+
+    def __len__(self):
+        return len(self._ring)
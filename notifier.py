@@ -9,6 +9,7 @@ from email.mime.image import MIMEImage
 import firebase_admin
 from firebase_admin import credentials, messaging
 import time
+from event_store import DEFAULT_EVENTS_FILE, LEGACY_EVENTS_FILE, EventStore
 try:
     from twilio.rest import Client
 except ImportError:
@@ -16,8 +17,13 @@ except ImportError:
     Client = None
 
 class FCMNotifier:
-    def __init__(self, logger=None):
+    def __init__(self, logger=None, event_store=None):
         self.logger = logger
+        # Fall event history
+        if event_store is None:
+            event_store = EventStore(DEFAULT_EVENTS_FILE,
+                                     legacy_path=LEGACY_EVENTS_FILE)
+        self.events = event_store
         # Settings file path
         self.settings_file = 'settings.json'
         
@@ -34,6 +40,10 @@ class FCMNotifier:
         self.telegram_token = ''
         self.telegram_chat_id = ''
 
+        # Bumped whenever the settings change, for conditional GETs
+        self.settings_version = 0
+        self.settings_modified = time.time()
+
         self._load_settings()
         self._init_firebase()
         
@@ -108,6 +118,7 @@ class FCMNotifier:
             self.telegram_token = sms_conf.get('telegram_token', os.environ.get('TELEGRAM_TOKEN', ''))
             self.telegram_chat_id = sms_conf.get('telegram_chat_id', os.environ.get('TELEGRAM_CHAT_ID', ''))
 
+            self._settings_changed()
             if self.logger: self.logger("Notification Settings Loaded", "info")
         except Exception as e:
             if self.logger: self.logger(f"Failed to load settings: {e}", "error")
@@ -137,8 +148,13 @@ class FCMNotifier:
             self.telegram_token = conf.get('telegram_token', self.telegram_token)
             self.telegram_chat_id = conf.get('telegram_chat_id', self.telegram_chat_id)
             
+        self._settings_changed()
         self._save_settings()
 
+    def _settings_changed(self):
+        self.settings_version += 1
+        self.settings_modified = time.time()
+
     def _save_settings(self):
         try:
             data = {
@@ -198,33 +214,14 @@ class FCMNotifier:
 
     def _log_event(self, location_data):
         try:
-            # Use absolute path to ensure file is written to correct location
-            _dir = os.path.dirname(os.path.abspath(__file__))
-            file_path = os.path.join(_dir, 'events.json')
-            
-            event = {
-                'id': int(time.time() * 1000), 
+            event = self.events.append({
                 'timestamp': location_data.get('timestamp', 'Unknown'),
                 'type': 'Fall Detected',
                 'status': 'CONFIRMED',
                 'confidence': 'HIGH',
                 'location': 'Living Room'
-            }
-            
-            events = []
-            if os.path.exists(file_path):
-                try:
-                    with open(file_path, 'r') as f:
-                        events = json.load(f)
-                except:
-                    events = []
-            
-            events.insert(0, event)
-            events = events[:50]
-            
-            with open(file_path, 'w') as f:
-                json.dump(events, f, indent=4)
-            print(f"DEBUG: Event logged to {file_path}", flush=True)
+            })
+            print(f"DEBUG: Event {event['id']} logged to {self.events.path}", flush=True)
         except Exception as e:
             print(f"ERROR: Failed to log event: {e}", flush=True)
 
@@ -0,0 +1,124 @@
+"""Compact encodings of frame detection results.
+
+JSON stays the default response of /api/process_frame. Clients that poll
+at high frame rates can ask for one of the formats below instead, either
+with the ``Accept`` header or the ``format`` query parameter.
+
+Binary layout (little-endian, 40 bytes, one detection at most):
+
+    uint8   status code, index into STATUS_CODES
+    uint8   alert latch flag
+    uint8   label code, index into LABEL_CODES (0 = no detection)
+    uint8   padding
+    float32 detection score
+    float32[4][2] x, y of left shoulder, left hip, right shoulder,
+            right hip; NaN when missing or when there is no detection
+
+The msgpack encoding is ``[status, alert, label, score, keypoints]`` with
+the same codes and keypoints as the raw 32 byte float32 block.
+"""
+import struct
+import numpy as np
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+FORMAT_JSON = 'json'
+FORMAT_BINARY = 'binary'
+FORMAT_MSGPACK = 'msgpack'
+
+MIMETYPES = {
+    FORMAT_BINARY: 'application/vnd.orion.result',
+    FORMAT_MSGPACK: 'application/msgpack',
+}
+
+STATUS_CODES = ('NORMAL', 'FALL_DETECTED', 'AI_NOT_READY', 'AI_ERROR')
+LABEL_CODES = (None, 'NORMAL', 'FALL')
+
+RESULT_HEADER = struct.Struct('<BBBxf')
+KEYPOINTS_SHAPE = (4, 2)
+RESULT_SIZE = RESULT_HEADER.size + 4 * KEYPOINTS_SHAPE[0] * KEYPOINTS_SHAPE[1]
+
+_STATUS_INDEX = {status: i for i, status in enumerate(STATUS_CODES)}
+_LABEL_INDEX = {label: i for i, label in enumerate(LABEL_CODES)}
+_NO_KEYPOINTS = np.full(KEYPOINTS_SHAPE, np.nan, '<f4')
+
+
+def available_formats():
+    formats = [FORMAT_JSON, FORMAT_BINARY]
+    if msgpack is not None:
+        formats.append(FORMAT_MSGPACK)
+    return formats
+
+
+def negotiate_format(query_format=None, accept=None):
+    """Pick the response format from a query parameter or Accept header.
+
+    The query parameter wins. Unknown or unavailable formats fall back to
+    JSON so existing clients are never broken.
+    """
+    formats = available_formats()
+    if query_format:
+        query_format = query_format.lower()
+        return query_format if query_format in formats else FORMAT_JSON
+    if accept:
+        for result_format, mimetype in MIMETYPES.items():
+            if mimetype in accept and result_format in formats:
+                return result_format
+    return FORMAT_JSON
+
+
+def _fields(status, alert_active, label, score, keypoints):
+    if keypoints is None:
+        keypoints = _NO_KEYPOINTS
+    elif keypoints.dtype != np.dtype('<f4'):
+        keypoints = keypoints.astype('<f4')
+    return (_STATUS_INDEX[status], int(bool(alert_active)),
+            _LABEL_INDEX[label], float(score), keypoints)
+
+
+def encode_result(status, alert_active, label=None, score=0.0,
+                  keypoints=None, result_format=FORMAT_BINARY):
+    """Encode one detection result.
+
+    :Parameters:
+    ----------
+    status: str
+        One of STATUS_CODES.
+    alert_active: bool
+        Whether the alert latch of the stream is set.
+    label: str
+        Detection label, None if no pose was found.
+    score: float
+        Detection score.
+    keypoints: numpy.ndarray
+        (4, 2) float32 torso keypoints as returned by
+        :func:`FallDetector.torso_keypoints`.
+    result_format: str
+        FORMAT_BINARY or FORMAT_MSGPACK.
+    """
+    status, alert, label, score, keypoints = _fields(
+        status, alert_active, label, score, keypoints)
+    if result_format == FORMAT_MSGPACK:
+        if msgpack is None:
+            raise ValueError('msgpack is not installed')
+        return msgpack.packb([status, alert, label, score,
+                              keypoints.tobytes()])
+    if result_format != FORMAT_BINARY:
+        raise ValueError(f'Unsupported result format: {result_format}')
+    return RESULT_HEADER.pack(status, alert, label, score) + \
+        keypoints.tobytes()
+
+
+def decode_result(data):
+    """Decode a binary result, mainly for clients and tests.
+
+    Returns (status, alert_active, label, score, keypoints).
+    """
+    if len(data) != RESULT_SIZE:
+        raise ValueError(f'Expected {RESULT_SIZE} bytes, got {len(data)}')
+    status, alert, label, score = RESULT_HEADER.unpack_from(data)
+    keypoints = np.frombuffer(data, '<f4', offset=RESULT_HEADER.size)
+    return (STATUS_CODES[status], bool(alert), LABEL_CODES[label], score,
+            keypoints.reshape(KEYPOINTS_SHAPE))
@@ -0,0 +1,163 @@
+"""Per-stream detector sessions for the multi-camera backend."""
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_STREAM_ID = 'default'
+
+
+class DetectorSession:
+    """Detection state owned by a single camera stream.
+
+    Holds the stream's own FallDetector (and with it the t-1/t-2 pose
+    history), the fall alert latch and the last reported GPS location.
+    The underlying inference engine is shared between all sessions.
+    """
+
+    # weight of the newest sample in the processing time average
+    PROCESSING_TIME_SMOOTHING = 0.2
+
+    def __init__(self, stream_id, fall_detector):
+        self.stream_id = stream_id
+        self.fall_detector = fall_detector
+        self.alert_latch_until = 0
+        self.current_location = None
+        self.last_seen = time.monotonic()
+        # frame admission state, see admit()
+        self.last_accepted = None
+        self.processing_time = 0.0
+        self.cached_results = {}
+        self._admission_lock = threading.Lock()
+
+    def touch(self):
+        self.last_seen = time.monotonic()
+
+    def admit(self, min_interval, now=None):
+        """Claim the next frame slot of the stream.
+
+        Returns True if at least ``min_interval`` seconds passed since the
+        last accepted frame, and records ``now`` as the new one. Frames that
+        are turned away would only be discarded by the fall detector after
+        paying for decoding and inference.
+        """
+        if now is None:
+            now = time.monotonic()
+        with self._admission_lock:
+            if self.last_accepted is not None and \
+               now - self.last_accepted < min_interval:
+                return False
+            self.last_accepted = now
+            return True
+
+    def record_processing_time(self, seconds):
+        if not self.processing_time:
+            self.processing_time = seconds
+        else:
+            alpha = self.PROCESSING_TIME_SMOOTHING
+            self.processing_time += alpha * (seconds - self.processing_time)
+
+    def next_frame_interval(self, min_interval):
+        """Seconds a client should wait between frames of this stream.
+
+        The larger of the detector's minimum frame distance and the recent
+        average processing time: sending faster only produces skipped frames.
+        """
+        return max(min_interval, self.processing_time)
+
+    def is_latched(self, now=None):
+        if now is None:
+            now = time.time()
+        return now < self.alert_latch_until
+
+
+class SessionRegistry:
+    """Thread-safe registry of DetectorSession objects keyed by stream id.
+
+    Sessions are kept in least-recently-used order. Sessions idle for
+    longer than ``ttl`` seconds are evicted, and when more than
+    ``max_sessions`` are alive the least recently used one is dropped,
+    so memory stays bounded no matter how many cameras connect.
+    """
+
+    def __init__(self, factory, ttl=300, max_sessions=32):
+        """
+        :Parameters:
+        ----------
+        factory: callable
+            ``factory(stream_id)`` returns a new DetectorSession.
+        ttl: float
+            Idle time in seconds after which a session is evicted.
+        max_sessions: int
+            Upper bound on the number of live sessions.
+        """
+        assert max_sessions > 0
+        self._factory = factory
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._sessions)
+
+    def __contains__(self, stream_id):
+        with self._lock:
+            return stream_id in self._sessions
+
+    def get(self, stream_id=None):
+        """Return the session for ``stream_id``, creating it if needed.
+
+        The factory runs outside the registry lock, it may load the model,
+        and other streams must not wait for that. When two threads create
+        the same stream at once the first session inserted wins.
+        """
+        stream_id = stream_id or DEFAULT_STREAM_ID
+        with self._lock:
+            self._evict_expired()
+            session = self._touch(stream_id)
+        if session is not None:
+            return session
+        created = self._factory(stream_id)
+        with self._lock:
+            session = self._touch(stream_id)
+            if session is not None:
+                return session
+            self._sessions[stream_id] = created
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+            created.touch()
+            return created
+
+    def _touch(self, stream_id):
+        session = self._sessions.get(stream_id)
+        if session is not None:
+            self._sessions.move_to_end(stream_id)
+            session.touch()
+        return session
+
+    def peek(self, stream_id=None):
+        """Return an existing session without creating or refreshing it."""
+        stream_id = stream_id or DEFAULT_STREAM_ID
+        with self._lock:
+            return self._sessions.get(stream_id)
+
+    def sessions(self):
+        """Return a snapshot list of the live sessions."""
+        with self._lock:
+            return list(self._sessions.values())
+
+    def remove(self, stream_id):
+        with self._lock:
+            return self._sessions.pop(stream_id, None)
+
+    def _evict_expired(self):
+        # Sessions are ordered by last use, so the stale ones are at the front.
+        if not self.ttl:
+            return
+        deadline = time.monotonic() - self.ttl
+        while self._sessions:
+            stream_id, session = next(iter(self._sessions.items()))
+            if session.last_seen >= deadline:
+                break
+            del self._sessions[stream_id]
@@ -0,0 +1,156 @@
+"""Server side micro-batching of pose detection requests."""
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+log = logging.getLogger(__name__)
+
+
+class MicroBatchingPoseEngine:
+    """PoseEngine proxy that coalesces concurrent detect_poses calls.
+
+    Callers block in :func:`detect_poses` as usual. Behind the scenes the
+    requests go to a queue, and a worker thread collects everything that
+    arrives within ``window`` seconds (up to ``max_batch_size`` images)
+    and runs it through :func:`PoseEngine.detect_poses_batch` with a
+    single interpreter invoke. With many cameras this amortizes the
+    per-invoke overhead at the cost of at most ``window`` added latency.
+
+    :func:`detect_poses_rotated` batches the upright input the same way,
+    it is prepared on the calling thread. Only the rotated retries, for
+    frames without a good upright pose, are run directly.
+    """
+
+    def __init__(self, pose_engine, window=0.005, max_batch_size=8,
+                 workers=1):
+        """
+        :Parameters:
+        ----------
+        pose_engine: PoseEngine
+            Engine that runs the batched inference.
+        window: float
+            Seconds to wait for more requests after the first one arrives.
+        max_batch_size: int
+            Largest number of images sent to a single invoke.
+        workers: int
+            Number of batching threads. Match it to the interpreter
+            pool size so batches can run in parallel.
+        """
+        assert pose_engine is not None
+        assert max_batch_size >= 1
+        self._pose_engine = pose_engine
+        self.window = window
+        self.max_batch_size = max_batch_size
+
+        self.confidence_threshold = pose_engine.confidence_threshold
+        self._tensor_image_height = pose_engine._tensor_image_height
+        self._tensor_image_width = pose_engine._tensor_image_width
+        self.supports_tensor_rotation = getattr(
+            pose_engine, 'supports_tensor_rotation', False)
+
+        self._worker_count = max(1, workers)
+        self._start()
+
+    def _start(self):
+        self._queue = queue.Queue()
+        self._workers = []
+        for i in range(self._worker_count):
+            worker = threading.Thread(target=self._run,
+                                      name=f'pose-batcher-{i}',
+                                      daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def after_fork(self):
+        """Restart the worker threads in a forked child process.
+
+        Threads do not survive a fork, requests queued in the child would
+        wait forever. Requests queued in the parent are not served here.
+        """
+        self._start()
+
+    def _submit(self, run, item):
+        """Queue ``item`` for ``run(items)`` and wait for its result."""
+        future = Future()
+        self._queue.put((run, item, future))
+        return future.result()
+
+    def detect_poses(self, img):
+        """Queue an image for batched detection and wait for its result."""
+        return self._submit(self._pose_engine.detect_poses_batch, img)
+
+    def detect_poses_batch(self, images):
+        return self._pose_engine.detect_poses_batch(images)
+
+    def detect_poses_rotated(self, img, angles, batched=True):
+        """Same as :func:`PoseEngine.detect_poses_rotated`.
+
+        The upright angle, when it comes first, is batched with the
+        requests of other streams. The remaining angles are inferred
+        directly on the same prepared input, in one invoke if ``batched``.
+        """
+        engine = self._pose_engine
+        angles = tuple(angles)
+        if not angles or angles[0] is not None or \
+                getattr(engine, 'keypoint_cache', None) is not None:
+            yield from engine.detect_poses_rotated(img, angles,
+                                                   batched=batched)
+            return
+        # the caller's thread buffer, it waits until the batch has run
+        prepared = engine.prepare_input(img)
+        poses, thumbnail, pose_score = self._submit(
+            engine.detect_poses_prepared, prepared)
+        yield None, poses, thumbnail, pose_score
+        if len(angles) > 1:
+            yield from engine.detect_poses_rotated(img, angles[1:],
+                                                   batched=batched,
+                                                   prepared=prepared)
+
+    def shutdown(self):
+        """Stop the worker threads once the queued requests are served."""
+        for _ in self._workers:
+            self._queue.put(None)
+        for worker in self._workers:
+            worker.join()
+        self._workers = []
+
+    def _collect(self, first):
+        batch = [first]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                # keep the stop signal for the outer loop
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch = self._collect(first)
+            log.debug("Running pose detection batch of %d", len(batch))
+            # images and prepared inputs only mix when callers use both
+            groups = {}
+            for run, item, future in batch:
+                groups.setdefault(run, []).append((item, future))
+            for run, group in groups.items():
+                try:
+                    results = run([item for item, _ in group])
+                except Exception as e:
+                    for _, future in group:
+                        future.set_exception(e)
+                    continue
+                for (_, future), result in zip(group, results):
+                    future.set_result(result)
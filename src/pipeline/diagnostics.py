@@ -0,0 +1,116 @@
+"""Opt-in capture of annotated frames for diagnosing detections.
+
+Every Nth frame the fall detector hands an annotated thumbnail to a
+:class:`DiagnosticCapture`. A background thread encodes and writes it to
+a ring of at most ``ring_size`` JPEG files, the oldest file is removed
+when the ring is full. The detector never waits for the disk: when the
+writer falls behind, captures are dropped and counted.
+"""
+import logging
+import queue
+import re
+import threading
+from collections import deque
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+from src import DEFAULT_DATA_DIR
+
+log = logging.getLogger(__name__)
+
+_FILE_NAME = re.compile(r'^diag-(\d+)-.*\.jpg$')
+
+
+class DiagnosticCapture:
+    """Samples every Nth frame into a bounded on-disk ring."""
+
+    def __init__(self, every=50, ring_size=200, directory=None,
+                 queue_size=4):
+        """
+        :Parameters:
+        ----------
+        every: int
+            Capture one frame out of ``every``.
+        ring_size: int
+            Maximum number of files kept on disk.
+        directory: str
+            Defaults to <DEFAULT_DATA_DIR>/diagnostics.
+        queue_size: int
+            Captures waiting for the writer before new ones are dropped.
+        """
+        assert every >= 1 and ring_size >= 1
+        self.every = every
+        self.ring_size = ring_size
+        self.directory = Path(directory or Path(DEFAULT_DATA_DIR,
+                                                'diagnostics'))
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.written = 0
+        self.dropped = 0
+        self._frames = 0
+        self._lock = threading.Lock()
+        # resume the ring of a previous run
+        existing = sorted(
+            (int(m.group(1)), self.directory / m.group(0))
+            for m in map(_FILE_NAME.match,
+                         (p.name for p in self.directory.iterdir())) if m)
+        self._files = deque(path for _, path in existing)
+        self._seq = existing[-1][0] + 1 if existing else 0
+        self._queue_size = queue_size
+        self._start()
+
+    def _start(self):
+        self._queue = queue.Queue(maxsize=self._queue_size)
+        self._thread = threading.Thread(target=self._write,
+                                        name='diagnostic-capture',
+                                        daemon=True)
+        self._thread.start()
+
+    def after_fork(self):
+        """Restart the writer thread in a forked child process.
+
+        Captures still queued in the parent are left to the parent.
+        """
+        self._lock = threading.Lock()
+        self._start()
+
+    def sample(self):
+        """True for every Nth call, the frame to capture."""
+        with self._lock:
+            self._frames += 1
+            return self._frames % self.every == 0
+
+    def submit(self, image, label=''):
+        """Queue a PIL image or RGB array for writing, never blocks."""
+        try:
+            self._queue.put_nowait((image, label))
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self):
+        """Wait until every queued capture is written."""
+        self._queue.join()
+
+    def _write(self):
+        while True:
+            image, label = self._queue.get()
+            try:
+                self._save(image, label)
+            except (OSError, ValueError) as e:
+                log.warning('Could not write diagnostic capture: %r', e)
+            finally:
+                self._queue.task_done()
+
+    def _save(self, image, label):
+        if isinstance(image, np.ndarray):
+            image = Image.fromarray(image)
+        path = self.directory / 'diag-{:08d}-{}.jpg'.format(self._seq, label)
+        self._seq += 1
+        image.convert('RGB').save(path, format='JPEG')
+        self._files.append(path)
+        self.written += 1
+        while len(self._files) > self.ring_size:
+            try:
+                self._files.popleft().unlink()
+            except FileNotFoundError:
+                pass
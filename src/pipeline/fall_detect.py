@@ -1,16 +1,43 @@
 """Fall detection pipe element."""
 # from .inference import TFInferenceEngine # Lazy loaded
-from src.pipeline.pose_engine import PoseEngine
+from src.pipeline.pose_engine import SCORE, PoseEngine
+from src.pipeline.metrics import metrics
+from src.pipeline import torso_geometry as geometry
 from src import DEFAULT_DATA_DIR
 import logging
-import math
 import time
+import numpy as np
 from PIL import Image, ImageDraw
 from pathlib import Path
 
 log = logging.getLogger(__name__)
 
 
+def _image_size(image):
+    """(width, height) of a PIL image or a numpy (height, width, ...) array."""
+    if isinstance(image, np.ndarray):
+        return image.shape[1], image.shape[0]
+    return image.size
+
+
+class _FrameRecord:
+    """Pose data of a previous frame the current one is compared to."""
+    __slots__ = ['pose_dix', 'timestamp', 'thumbnail', 'torso',
+                 'yaxis_angles', 'body_vector_score']
+
+    def __init__(self, pose_dix, timestamp, thumbnail=None, torso=None,
+                 yaxis_angles=None, body_vector_score=0):
+        self.pose_dix = pose_dix
+        self.timestamp = timestamp
+        self.thumbnail = thumbnail
+        # (4, 2) torso_geometry coordinates, NaN for undetected lines
+        self.torso = torso
+        # (2,) left and right shoulder-hip angles with the y axis
+        self.yaxis_angles = yaxis_angles if yaxis_angles is not None \
+            else np.zeros(2)
+        self.body_vector_score = body_vector_score
+
+
 class FallDetector():
 
     """Detects falls comparing two images spaced about 1-2 seconds apart."""
@@ -19,6 +46,11 @@ class FallDetector():
                  labels=None,
                  confidence_threshold=0.15,
                  model_name=None,
+                 tfengine=None,
+                 pose_engine=None,
+                 rotation_mode='image',
+                 keypoint_cache=None,
+                 diagnostics=None,
                  **kwargs
                  ):
         """Initialize detector with config parameters.
@@ -31,16 +63,53 @@ class FallDetector():
             'edgetpu': 
                 'ai_models/posenet_mobilenet_v1_075_721_1281_quant_decoder_edgetpu.tflite'
         }
+        tfengine: TFInferenceEngine
+            Optional already loaded inference engine. When provided the
+            model is not loaded again, which lets several detectors
+            (one per camera stream) share a single interpreter.
+        pose_engine: PoseEngine
+            Optional pose engine to use instead of a private one, e.g. a
+            MicroBatchingPoseEngine shared by all camera streams.
+        rotation_mode: str
+            How rotated (fallen) poses are searched for when the upright
+            spinal vector score is low:
+            'image' rotates the PIL image and runs the full pipeline again
+            for each rotation.
+            'tensor' rotates the already prepared input tensor with numpy
+            and invokes the model per rotation, stopping at the first
+            good pose.
+            'batched' scores the upright and both rotated tensors in a
+            single batched invoke.
+            Models without tensor input support always use 'image'.
+        keypoint_cache: KeypointCache
+            Optional on-disk cache of raw model keypoints, consulted by the
+            private pose engine before each invoke. Meant for replays and
+            parameter sweeps over the same frames.
+        diagnostics: DiagnosticCapture
+            Optional sampler that receives every Nth analysed frame as a
+            thumbnail annotated with the detected pose and its label.
+        pool_size: int
+            Number of interpreters the inference engine loads so that
+            concurrent frames run in parallel. Defaults to 1.
+        num_threads: int or 'auto'
+            CPU threads per interpreter. Defaults to the TFLite default.
+        xnnpack: bool or 'auto'
+            Use the XNNPACK CPU delegate. Defaults to True.
+            With 'auto' for either option the inference engine times the
+            candidate settings at startup and keeps the fastest.
         """
         
 
-        # Lazy Import
-        from .inference import TFInferenceEngine
-        
-        self._tfengine = TFInferenceEngine(
+        if tfengine is None:
+            # Lazy Import
+            from .inference import TFInferenceEngine
+
+            tfengine = TFInferenceEngine(
                         model=model,
                         labels=labels,
-                        confidence_threshold=confidence_threshold)
+                        confidence_threshold=confidence_threshold,
+                        **kwargs)
+        self._tfengine = tfengine
         self.model_name = model_name
 
         self._sys_data_dir = DEFAULT_DATA_DIR
@@ -48,33 +117,23 @@ class FallDetector():
 
         # previous pose detection information for frame at time t-1 and t-2 \
         # to compare pose changes against
-        self._prev_data = [None] * 2
-
-        # Data of previous frames lookup constants
-        self.POSE_VAL = '_prev_pose_dix'
-        self.TIMESTAMP = '_prev_time'
-        self.THUMBNAIL = '_prev_thumbnail'
-        self.LEFT_ANGLE_WITH_YAXIS = '_prev_left_angle_with_yaxis'
-        self.RIGHT_ANGLE_WITH_YAXIS = '_prev_right_angle_with_yaxis'
-        self.BODY_VECTOR_SCORE = '_prev_body_vector_score'
-
-        _dix = {self.POSE_VAL: [],
-                self.TIMESTAMP: time.monotonic(),
-                self.THUMBNAIL: None,
-                self.LEFT_ANGLE_WITH_YAXIS: None,
-                self.RIGHT_ANGLE_WITH_YAXIS: None,
-                self.BODY_VECTOR_SCORE: 0
-                }
-
         # self._prev_data[0] : store data of frame at t-2
         # self._prev_data[1] : store data of frame at t-1
-        self._prev_data[0] = self._prev_data[1] = _dix
-
-        self._pose_engine = PoseEngine(self._tfengine, self.model_name)
+        _record = _FrameRecord(pose_dix={}, timestamp=time.monotonic())
+        self._prev_data = [_record, _record]
+
+        if pose_engine is None:
+            pose_engine = PoseEngine(self._tfengine, self.model_name,
+                                     keypoint_cache=keypoint_cache)
+        self._pose_engine = pose_engine
+        assert rotation_mode in ('image', 'tensor', 'batched'), \
+            'Unknown rotation_mode: {}'.format(rotation_mode)
+        self.rotation_mode = rotation_mode
         self._fall_factor = 60
         self.confidence_threshold = confidence_threshold
-        log.debug(f"Initializing FallDetector with conficence threshold: \
-                  {self.confidence_threshold}")
+        self.diagnostics = diagnostics
+        log.debug("Initializing FallDetector with conficence threshold: %s",
+                  self.confidence_threshold)
 
         # Require a minimum amount of time between two video frames in seconds.
         # Otherwise on high performing hard, the poses could be too close to
@@ -97,7 +156,15 @@ class FallDetector():
                                  self.RIGHT_SHOULDER, self.RIGHT_HIP]
 
     def process_sample(self, **sample):
-        """Detect objects in sample image."""
+        """Detect objects in sample image.
+
+        An optional ``frame_size`` (width, height) tells the size of the
+        original frame when ``image`` was decoded at reduced resolution.
+        Keypoints are then reported in original frame coordinates.
+        An optional ``timestamp`` in ``time.monotonic`` seconds replaces the
+        arrival time of the frame, e.g. the capture time of a recorded
+        video frame, so frame spacing rules apply as they would live.
+        """
         log.debug("%s received new sample", self.__class__.__name__)
         if not sample:
             # pass through empty samples to next element
@@ -105,7 +172,9 @@ class FallDetector():
         else:
             try:
                 image = sample['image']
-                inference_result, thumbnail = self.fall_detect(image=image)
+                inference_result, thumbnail = self.fall_detect(
+                    image=image, frame_size=sample.get('frame_size'),
+                    timestamp=sample.get('timestamp'))
                 inference_result = self.convert_inference_result(
                                         inference_result)
                 inf_meta = {
@@ -132,48 +201,23 @@ class FallDetector():
             right shoulder-hip with prev frame's right shoulder-hip or
             shoulder-hip line with vertical axis
         '''
+        theta1, theta2 = geometry.segment_angle(p)
+        return float(abs(theta1 - theta2))
 
-        x1, y1 = p[0][0]
-        x2, y2 = p[0][1]
-
-        x3, y3 = p[1][0]
-        x4, y4 = p[1][1]
-
-        theta1 = math.degrees(math.atan2(y2-y1, x1-x2))
-        theta2 = math.degrees(math.atan2(y4-y3, x3-x4))
-
-        angle = abs(theta1-theta2)
-        return angle
-
-    def is_body_line_motion_downward(self, left_angle_with_yaxis,
-                                     rigth_angle_with_yaxis, inx):
+    def is_body_line_motion_downward(self, yaxis_angles, inx):
+        """Did a shoulder-hip line tilt further from vertical since ``inx``."""
+        return bool(geometry.motion_downward(
+            yaxis_angles, self._prev_data[inx].yaxis_angles))
 
-        test = False
+    def _find_rotated_pose(self, image, min_score):
+        """Search the upright image, then its +/- 90' rotations, for a pose.
 
-        l_angle = left_angle_with_yaxis and \
-            self._prev_data[inx][self.LEFT_ANGLE_WITH_YAXIS]  \
-            and left_angle_with_yaxis > \
-            self._prev_data[inx][self.LEFT_ANGLE_WITH_YAXIS]
-        r_angle = rigth_angle_with_yaxis and \
-            self._prev_data[inx][self.RIGHT_ANGLE_WITH_YAXIS] \
-            and rigth_angle_with_yaxis > \
-            self._prev_data[inx][self.RIGHT_ANGLE_WITH_YAXIS]
-
-        if l_angle or r_angle:
-            test = True
-
-        return test
-
-    def find_keypoints(self, image):
-
-        # this score value should be related to the configuration \
-        # confidence_threshold parameter
-        min_score = self.confidence_threshold
+        Rotations are applied to the PIL image and each one runs the full
+        pose detection pipeline again.
+        """
         rotations = [Image.ROTATE_270, Image.ROTATE_90]
-        angle = 0
-        pose = None
+        angle = None
         poses, thumbnail, _ = self._pose_engine.detect_poses(image)
-        width, height = thumbnail.size
         # if no pose detected with high confidence,
         # try rotating the image +/- 90' to find a fallen person
         # currently only looking at pose[0] because we are focused \
@@ -183,11 +227,62 @@ class FallDetector():
                                         poses[0])
         while spinal_vector_score < min_score and rotations:
             angle = rotations.pop()
+            metrics.inc('rotation_retries')
             transposed = image.transpose(angle)
             # we are interested in the poses but not the rotated thumbnail
             poses, _, _ = self._pose_engine.detect_poses(transposed)
             spinal_vector_score, pose_dix = self.estimate_spinal_vector_score(
                                     poses[0])
+        # rotated keypoints are relative to the rotated thumbnail
+        width, height = _image_size(thumbnail)
+        return angle, poses, thumbnail, spinal_vector_score, pose_dix, \
+            (width, height)
+
+    def _find_rotated_pose_tensor(self, image, min_score):
+        """Same search as :func:`_find_rotated_pose` on one prepared tensor.
+
+        The image is thumbnailed and padded once and rotated with numpy.
+        In 'batched' mode all three orientations are scored in one invoke,
+        in 'tensor' mode the model runs per orientation and stops early.
+        """
+        angles = (None, Image.ROTATE_90, Image.ROTATE_270)
+        results = self._pose_engine.detect_poses_rotated(
+            image, angles, batched=self.rotation_mode == 'batched')
+        for angle, poses, thumbnail, _ in results:
+            if angle is not None:
+                metrics.inc('rotation_retries')
+            spinal_vector_score, pose_dix = \
+                self.estimate_spinal_vector_score(poses[0])
+            if spinal_vector_score >= min_score:
+                break
+        # rotated keypoints are relative to the rotated, padded input tensor
+        rotated_size = (self._pose_engine._tensor_image_width,
+                        self._pose_engine._tensor_image_height)
+        return angle, poses, thumbnail, spinal_vector_score, pose_dix, \
+            rotated_size
+
+    def find_keypoints(self, image, frame_size=None):
+
+        # this score value should be related to the configuration \
+        # confidence_threshold parameter
+        min_score = self.confidence_threshold
+        pose = None
+        metrics.inc('pose_searches')
+        tensor_rotation = self.rotation_mode != 'image' and \
+            getattr(self._pose_engine, 'supports_tensor_rotation', False)
+        if isinstance(image, np.ndarray) and not tensor_rotation:
+            # numpy frames are only preprocessed natively by models that
+            # take tensor input, everything else needs a PIL image
+            image = Image.fromarray(image)
+        if tensor_rotation:
+            angle, poses, thumbnail, spinal_vector_score, pose_dix, \
+                (rot_width, rot_height) = \
+                self._find_rotated_pose_tensor(image, min_score)
+        else:
+            angle, poses, thumbnail, spinal_vector_score, pose_dix, \
+                (rot_width, rot_height) = \
+                self._find_rotated_pose(image, min_score)
+        width, height = _image_size(thumbnail)
 
         if poses and poses[0]:
             pose = poses[0]
@@ -198,262 +293,161 @@ class FallDetector():
             # if the image was rotated, we need to rotate back to the original\
             # image coordinates
             # before comparing with poses in other frames.
-            if angle == Image.ROTATE_90:
-                # ROTATE_90 rotates 90' counter clockwise \
-                # from ^ to < orientation.
-                for _, keypoint in pose.keypoints.items():
-                    # keypoint.yx[0] is the x coordinate in an image
-                    # keypoint.yx[0] is the y coordinate in an image, \
-                    # with 0,0 in the upper left corner (not lower left).
-                    tmp_swap = keypoint.yx[0]
-                    keypoint.yx[0] = width-keypoint.yx[1]
-                    keypoint.yx[1] = tmp_swap
-            elif angle == Image.ROTATE_270:
-                # ROTATE_270 rotates 90' clockwise from ^ to > orientation.
-                for _, keypoint in pose.keypoints.items():
-                    tmp_swap = keypoint.yx[0]
-                    keypoint.yx[0] = keypoint.yx[1]
-                    keypoint.yx[1] = height-tmp_swap
+            pose.rotate_back(angle, rot_width, rot_height)
             # we could not detexct a pose with sufficient confidence
-            log.debug(f"""A pose detected with
-                    spinal_vector_score={spinal_vector_score} >= {min_score}
-                    confidence threshold.
-                    Pose keypoints: {pose_dix}"
-                """)
-            
+            log.debug("A pose detected with spinal_vector_score=%s >= %s "
+                      "confidence threshold. Pose keypoints: %r",
+                      spinal_vector_score, min_score, pose_dix)
+
             # --- SCALING FIX: Map 257x257 coordinates back to 640x480 ---
-            orig_w, orig_h = image.size
+            # frame_size is the original frame when image is a reduced decode
+            orig_w, orig_h = frame_size or _image_size(image)
             if orig_w > 0 and orig_h > 0 and width > 0 and height > 0:
-                scale_x = orig_w / width
-                scale_y = orig_h / height
-                for keypoint in pose.keypoints.values():
-                    keypoint.yx[0] *= scale_x
-                    keypoint.yx[1] *= scale_y
-                
-                # Update the simple dictionary copy too
-                # Note: pose_dix uses the same reference if it pointed to keypoint.yx lists,
-                # but earlier it assigned copy of values?
-                # estimate_spinal_vector_score does: pose_dix[...] = pose.keypoints[...].yx
-                # .yx is a list (mutable). So if we modified the list in place above, pose_dix is auto-updated.
-                pass
+                # pose_dix holds views into the pose array, both are
+                # updated at once
+                pose.rescale(orig_w / width, orig_h / height)
         else:
             pose = None
 
         return pose, thumbnail, spinal_vector_score, pose_dix
 
-    def find_changes_in_angle(self, pose_dix, inx):
+    def find_changes_in_angle(self, torso, inx):
         '''
             Find the changes in angle for shoulder-hip lines
             b/w current and previpus frame.
         '''
-
-        prev_leftLine_corr_exist = all(e in self._prev_data[inx][self.POSE_VAL]
-                                       for e in [self.LEFT_SHOULDER, self.LEFT_HIP])
-        curr_leftLine_corr_exist = all(e in pose_dix for e in [self.LEFT_SHOULDER,self.LEFT_HIP])
-
-        prev_rightLine_corr_exist = all(e in self._prev_data[inx][self.POSE_VAL] for e in [self.RIGHT_SHOULDER, self.RIGHT_HIP])
-        curr_rightLine_corr_exist = all(e in pose_dix for e in [self.RIGHT_SHOULDER, self.RIGHT_HIP])
-
-        left_angle = right_angle = 0
-
-        if prev_leftLine_corr_exist and curr_leftLine_corr_exist:
-            temp_left_vector = [[self._prev_data[inx][self.POSE_VAL][self.LEFT_SHOULDER],
-                                self._prev_data[inx][self.POSE_VAL][self.LEFT_HIP]],
-                                [pose_dix[self.LEFT_SHOULDER], pose_dix[self.LEFT_HIP]]]
-            left_angle = self.calculate_angle(temp_left_vector)
-            log.debug("Left shoulder-hip angle: %r", left_angle)
-
-        if prev_rightLine_corr_exist and curr_rightLine_corr_exist:
-            temp_right_vector = [[self._prev_data[inx][self.POSE_VAL][self.RIGHT_SHOULDER],
-                                 self._prev_data[inx][self.POSE_VAL][self.RIGHT_HIP]],
-                                 [pose_dix[self.RIGHT_SHOULDER], pose_dix[self.RIGHT_HIP]]]
-            right_angle = self.calculate_angle(temp_right_vector)
-            log.debug("Right shoulder-hip angle: %r", right_angle)
-
-        angle_change = max(left_angle, right_angle)
+        angle_change = float(geometry.leaning_angle(self._prev_data[inx].torso,
+                                                    torso))
+        log.debug("Shoulder-hip angle change: %r", angle_change)
         return angle_change
 
-    def assign_prev_records(self, pose_dix, left_angle_with_yaxis,
-                            rigth_angle_with_yaxis, now, thumbnail,
-                            current_body_vector_score):
+    def assign_prev_records(self, pose_dix, torso, yaxis_angles, now,
+                            thumbnail, current_body_vector_score):
 
-        curr_data = {self.POSE_VAL: pose_dix,
-                     self.TIMESTAMP: now,
-                     self.THUMBNAIL: thumbnail,
-                     self.LEFT_ANGLE_WITH_YAXIS: left_angle_with_yaxis,
-                     self.RIGHT_ANGLE_WITH_YAXIS: rigth_angle_with_yaxis,
-                     self.BODY_VECTOR_SCORE: current_body_vector_score}
+        curr_data = _FrameRecord(pose_dix=pose_dix,
+                                 timestamp=now,
+                                 thumbnail=thumbnail,
+                                 torso=torso,
+                                 yaxis_angles=yaxis_angles,
+                                 body_vector_score=current_body_vector_score)
 
         self._prev_data[-2] = self._prev_data[-1]
         self._prev_data[-1] = curr_data
 
-    def draw_lines(self, thumbnail, pose_dix, score):
-        """Draw body lines if available. Return number of lines drawn."""
-        # save an image with drawn lines for debugging
-        draw = ImageDraw.Draw(thumbnail)
-        path = None
+    def draw_lines(self, image, pose_dix, scale=(1.0, 1.0)):
+        """Draw body lines if available. Return number of lines drawn.
+
+        ``scale`` maps the pose_dix coordinates onto the PIL ``image``.
+        """
+        draw = ImageDraw.Draw(image)
         body_lines_drawn = 0
 
         if pose_dix is None:
             return body_lines_drawn
 
-        if pose_dix.keys() >= {self.LEFT_SHOULDER, self.LEFT_HIP}:
-            body_line = [tuple(pose_dix[self.LEFT_SHOULDER]),
-                         tuple(pose_dix[self.LEFT_HIP])]
-            draw.line(body_line, fill='red')
-            body_lines_drawn += 1
-
-        if pose_dix.keys() >= {self.RIGHT_SHOULDER, self.RIGHT_HIP}:
-            body_line = [tuple(pose_dix[self.RIGHT_SHOULDER]),
-                         tuple(pose_dix[self.RIGHT_HIP])]
-            draw.line(body_line, fill='red')
-            body_lines_drawn += 1
-
-        # save a thumbnail for debugging
-        timestr = int(time.monotonic()*1000)
-        debug_image_file_name = \
-            f'tmp-fall-detect-thumbnail-{timestr}-score-{score}.jpg'
-        # thumbnail.save(
-        #                Path(self._sys_data_dir, debug_image_file_name),
-        #                format='JPEG')
-        print(Path(self._sys_data_dir, debug_image_file_name))
+        torso = geometry.torso_xy(pose_dix) * scale
+        for shoulder, hip in (torso[:2], torso[2:]):
+            if not np.isnan(shoulder).any() and not np.isnan(hip).any():
+                draw.line([tuple(shoulder), tuple(hip)], fill='red', width=2)
+                body_lines_drawn += 1
         return body_lines_drawn
 
-    def get_line_angles_with_yaxis(self, pose_dix):
+    def capture_diagnostics(self, thumbnail, pose, pose_dix,
+                            inference_result, frame_size):
+        """Annotate a copy of the thumbnail and queue it for writing."""
+        if thumbnail is None:
+            return
+        if isinstance(thumbnail, np.ndarray):
+            image = Image.fromarray(thumbnail)
+        else:
+            image = thumbnail.copy()
+        label, score = 'NONE', 0.0
+        if pose is not None:
+            # keypoints are in frame coordinates
+            width, height = _image_size(thumbnail)
+            scale = (width / frame_size[0], height / frame_size[1])
+            draw = ImageDraw.Draw(image)
+            for x, y, _ in pose.array[pose.array[:, SCORE] >
+                                      self.confidence_threshold]:
+                x, y = x * scale[0], y * scale[1]
+                draw.ellipse((x - 2, y - 2, x + 2, y + 2), fill='green')
+            self.draw_lines(image, pose_dix, scale)
+        if inference_result:
+            label, score = inference_result[0][0], inference_result[0][1]
+        self.diagnostics.submit(image, '{}-score-{:.2f}'.format(label, score))
+
+    def get_line_angles_with_yaxis(self, torso):
         '''
             Find the angle b/w shoulder-hip line with yaxis.
+            Returns a (2,) array of the left and right line angle, 0 for
+            a missing line.
         '''
-        y_axis_corr = [[0, 0], [0, self._pose_engine._tensor_image_height]]
-
-        leftLine_corr_exist = all(e in pose_dix for e in [self.LEFT_SHOULDER, self.LEFT_HIP])
-        rightLine_corr_exist = all(e in pose_dix for e in [self.RIGHT_SHOULDER, self.RIGHT_HIP])
-
-        l_angle = r_angle = 0
-
-        if leftLine_corr_exist:
-            l_angle = self.calculate_angle([y_axis_corr,
-                                           [pose_dix[self.LEFT_SHOULDER],
-                                            pose_dix[self.LEFT_HIP]]])
-
-        if rightLine_corr_exist:
-            r_angle = self.calculate_angle([y_axis_corr,
-                                           [pose_dix[self.RIGHT_SHOULDER],
-                                            pose_dix[self.RIGHT_HIP]]])
-
-        return (l_angle, r_angle)
+        return geometry.angles_with_yaxis(torso)
 
     def estimate_spinal_vector_score(self, pose):
-        pose_dix = {}
-        is_leftVector = is_rightVector = False
-
-        # Calculate leftVectorScore & rightVectorScore
-        leftVectorScore = min(pose.keypoints[self.LEFT_SHOULDER].score,
-                              pose.keypoints[self.LEFT_HIP].score)
-        rightVectorScore = min(pose.keypoints[self.RIGHT_SHOULDER].score,
-                               pose.keypoints[self.RIGHT_HIP].score)
-
-        if leftVectorScore > self.confidence_threshold:
-            is_leftVector = True
-            pose_dix[self.LEFT_SHOULDER] = \
-                pose.keypoints[self.LEFT_SHOULDER].yx
-            pose_dix[self.LEFT_HIP] = pose.keypoints[self.LEFT_HIP].yx
-
-        if rightVectorScore > self.confidence_threshold:
-            is_rightVector = True
-            pose_dix[self.RIGHT_SHOULDER] = \
-                pose.keypoints[self.RIGHT_SHOULDER].yx
-            pose_dix[self.RIGHT_HIP] = pose.keypoints[self.RIGHT_HIP].yx
-
-        def find_spinalLine():
-            left_spinal_x1 = (pose_dix[self.LEFT_SHOULDER][0] +
-                              pose_dix[self.RIGHT_SHOULDER][0]) / 2
-            left_spinal_y1 = (pose_dix[self.LEFT_SHOULDER][1] +
-                              pose_dix[self.RIGHT_SHOULDER][1]) / 2
-
-            right_spinal_x1 = (pose_dix[self.LEFT_HIP][0] +
-                               pose_dix[self.RIGHT_HIP][0]) / 2
-            right_spinal_y1 = (pose_dix[self.LEFT_HIP][1] +
-                               pose_dix[self.RIGHT_HIP][1]) / 2
-
-            return (left_spinal_x1, left_spinal_y1), \
-                   (right_spinal_x1, right_spinal_y1)
-
-        if is_leftVector and is_rightVector:
-            spinalVectorEstimate = find_spinalLine()
-            spinalVectorScore = (leftVectorScore + rightVectorScore) / 2.0
-        elif is_leftVector:
-            spinalVectorEstimate = pose_dix[self.LEFT_SHOULDER], \
-                                   pose_dix[self.LEFT_HIP]
-            # 10% score penalty in conficence as only \
-            # left shoulder-hip line is detected
-            spinalVectorScore = leftVectorScore * 0.9
-        elif is_rightVector:
-            spinalVectorEstimate = pose_dix[self.RIGHT_SHOULDER], \
-                                   pose_dix[self.RIGHT_HIP]
-            # 10% score penalty in conficence as only \
-            # right shoulder-hip line is detected
-            spinalVectorScore = rightVectorScore * 0.9
-        else:
-            spinalVectorScore = 0
+        torso = geometry.Torso.from_pose(pose)
+        spinalVectorScore, detected = geometry.spinal_vector_score(
+            torso.scores, self.confidence_threshold)
+
+        # views into the pose array, they follow the rotation back and
+        # rescaling applied to the pose afterwards
+        pose_dix = geometry.TorsoKeypoints(pose.array, detected)
 
-        log.debug(f"Estimated spinal vector score: {spinalVectorScore}")
+        spinalVectorScore = float(spinalVectorScore)
+        log.debug("Estimated spinal vector score: %s", spinalVectorScore)
         return spinalVectorScore, pose_dix
 
-    def fall_detect(self, image=None):
-        assert image
+    def fall_detect(self, image=None, frame_size=None, timestamp=None):
+        assert image is not None
         log.debug("Calling TF engine for inference")
         start_time = time.monotonic()
 
-        now = time.monotonic()
-        lapse = now - self._prev_data[-1][self.TIMESTAMP]
+        now = start_time if timestamp is None else timestamp
+        lapse = now - self._prev_data[-1].timestamp
 
-        if self._prev_data[-1][self.POSE_VAL] \
+        if self._prev_data[-1].pose_dix \
            and lapse < self.min_time_between_frames:
             log.debug("Received an image frame too soon after the previous \
                 frame. Only %.2f ms apart.\
                 Minimum %.2f ms distance required for fall detection.",
                 lapse, self.min_time_between_frames)
             inference_result = None
-            thumbnail = self._prev_data[-1][self.THUMBNAIL]
+            thumbnail = self._prev_data[-1].thumbnail
         else:
             # Detection using tensorflow posenet module
             pose, thumbnail, spinal_vector_score, pose_dix = \
-                        self.find_keypoints(image)
+                        self.find_keypoints(image, frame_size=frame_size)
+            fall_logic_start = time.perf_counter()
 
             inference_result = None
             if not pose:
-                log.debug(f"No pose detected or detection score does not meet \
-                    confidence threshold of {self.confidence_threshold}.")
+                log.debug("No pose detected or detection score does not "
+                          "meet confidence threshold of %s.",
+                          self.confidence_threshold)
             else:
                 inference_result = []
 
                 current_body_vector_score = spinal_vector_score
 
+                # array form of the torso, after rotation back and rescaling
+                torso = geometry.torso_xy(pose_dix)
                 # Find line angle with vertcal axis
-                left_angle_with_yaxis, rigth_angle_with_yaxis = \
-                    self.get_line_angles_with_yaxis(pose_dix)
-
-                # save an image with drawn lines for debugging
-                if log.getEffectiveLevel() <= logging.DEBUG:
-                    # development mode
-                    self.draw_lines(thumbnail, pose_dix, spinal_vector_score)
+                yaxis_angles = self.get_line_angles_with_yaxis(torso)
 
                 for t in [-1, -2]:
-                    lapse = now - self._prev_data[t][self.TIMESTAMP]
+                    lapse = now - self._prev_data[t].timestamp
 
-                    if not self._prev_data[t][self.POSE_VAL] or \
+                    if not self._prev_data[t].pose_dix or \
                        lapse > self.max_time_between_frames:
                         log.debug("No recent pose to compare to. Will save \
                             this frame pose for subsequent comparison.")
-                    elif not self.is_body_line_motion_downward(
-                                                        left_angle_with_yaxis,
-                                                        rigth_angle_with_yaxis,
-                                                        inx=t):
+                    elif not self.is_body_line_motion_downward(yaxis_angles,
+                                                               inx=t):
                         log.debug("The body-line angle with vertical axis is \
                                     decreasing from the previous frame. \
                                     Not likely to be a fall.")
                     else:
-                        leaning_angle = self.find_changes_in_angle(pose_dix,
+                        leaning_angle = self.find_changes_in_angle(torso,
                                                                    inx=t)
 
                         # Get leaning_probability by comparing leaning_angle
@@ -465,7 +459,7 @@ class FallDetector():
                         # previous frame's body vector score with \
                         # leaning_probability
                         fall_score = leaning_probability * \
-                            (self._prev_data[t][self.BODY_VECTOR_SCORE] +
+                            (self._prev_data[t].body_vector_score +
                              current_body_vector_score) / 2
 
                         if fall_score >= self.confidence_threshold:
@@ -475,12 +469,14 @@ class FallDetector():
                             break
                         else:
                             if leaning_angle > self._fall_factor:
-                                print(f"DEBUG: NEAR FALL detected! Score: {fall_score:.2f} (Threshold: {self.confidence_threshold})", flush=True)
-                            
-                            log.debug(f"No fall detected due to low \
-                            confidence score:  \
-                            {fall_score} < {self.confidence_threshold} \
-                            min threshold.Inference result: {inference_result}")
+                                log.debug("Near fall: score %.2f < %s threshold",
+                                          fall_score,
+                                          self.confidence_threshold)
+                            log.debug("No fall detected due to low confidence "
+                                      "score: %s < %s min threshold. "
+                                      "Inference result: %r", fall_score,
+                                      self.confidence_threshold,
+                                      inference_result)
 
                 # If after checking history we still have no fall detected, 
                 # but we have a valid pose, return it as NORMAL so UI can draw it
@@ -488,17 +484,33 @@ class FallDetector():
                      inference_result.append(('NORMAL', current_body_vector_score, 0, pose_dix))
 
                 log.debug("Saving pose for subsequent comparison.")
-                self.assign_prev_records(pose_dix, left_angle_with_yaxis,
-                                         rigth_angle_with_yaxis, now,
+                self.assign_prev_records(pose_dix, torso, yaxis_angles, now,
                                          thumbnail,
                                          current_body_vector_score)
 
                 # log.debug("Logging stats")
 
+            metrics.observe('fall_logic',
+                            time.perf_counter() - fall_logic_start)
+
+            if self.diagnostics is not None and self.diagnostics.sample():
+                self.capture_diagnostics(
+                    thumbnail, pose, pose_dix, inference_result,
+                    frame_size or _image_size(image))
+
         # self.log_stats(start_time=start_time)
         log.debug("thumbnail: %r", thumbnail)
         return inference_result, thumbnail
 
+    def torso_keypoints(self, pose_dix):
+        """(4, 2) float32 array of the fall_detect_corr keypoints.
+
+        Rows follow the order of ``fall_detect_corr``, missing keypoints
+        are NaN. Read straight from the pose array, compact result
+        encoders never touch a dict.
+        """
+        return geometry.torso_xy(pose_dix).astype(np.float32)
+
     def convert_inference_result(self, inference_result):
         inf_json = []
 
@@ -515,14 +527,10 @@ class FallDetector():
                     'label': label,
                     'confidence': confidence,
                     'leaning_angle': leaning_angle,
-                    'keypoint_corr': {
-                        'left shoulder': keypoint_corr.get('left shoulder',
-                                                           None),
-                        'left hip': keypoint_corr.get('left hip', None),
-                        'right shoulder': keypoint_corr.get('right shoulder',
-                                                            None),
-                        'right hip': keypoint_corr.get('right hip', None)
-                    }
+                    # mapping of the detected keypoints, only JSON
+                    # responses and drawing iterate it
+                    'keypoint_corr': keypoint_corr,
+                    'keypoints': self.torso_keypoints(keypoint_corr)
                 }
                 inf_json.append(one_inf)
 
@@ -1,13 +1,129 @@
 """Tensorflow inference engine wrapper."""
+import importlib
+import importlib.util
 import logging
 import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from functools import partial
 import numpy as np
-# Lazy imports handled in __init__
+# Lazy imports handled in load_backend()
 Interpreter = None
 load_delegate = None
+OpResolverType = None
 
 log = logging.getLogger(__name__)
 
+# TFLite interpreter providers in order of preference. The first two ship
+# only the TFLite runtime and import in a fraction of the time and memory
+# of the full tensorflow package, which is the last resort.
+BACKENDS = ('ai_edge_litert', 'tflite_runtime', 'tensorflow')
+SLIM_BACKENDS = ('ai_edge_litert', 'tflite_runtime')
+_BACKEND_MODULES = {
+    'ai_edge_litert': 'ai_edge_litert.interpreter',
+    'tflite_runtime': 'tflite_runtime.interpreter',
+}
+
+# Which backend was loaded and what importing it cost, see load_backend()
+backend_info = {}
+
+
+def _backend_order(preferred=None):
+    """Backends to try. ``preferred`` (or $TFLITE_BACKEND) pins one."""
+    preferred = preferred or os.environ.get('TFLITE_BACKEND', 'auto')
+    if preferred == 'auto':
+        return BACKENDS
+    if preferred not in BACKENDS:
+        raise ValueError('Unknown TFLite backend {!r}, expected one of {}'
+                         .format(preferred, ', '.join(BACKENDS)))
+    return (preferred,)
+
+
+def slim_backend_available(preferred=None):
+    """True if a TFLite-only runtime will be used instead of tensorflow.
+
+    Only looks for the packages, nothing is imported.
+    """
+    for name in _backend_order(preferred):
+        if name in SLIM_BACKENDS and importlib.util.find_spec(name):
+            return True
+    return False
+
+
+def rss_bytes():
+    """Resident set size of this process, None if it cannot be read."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+        # peak rather than current, in KiB on Linux and bytes on macOS
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss if os.uname().sysname == 'Darwin' else maxrss * 1024
+    except (ImportError, AttributeError):
+        return None
+
+
+def _import_backend(name):
+    if name == 'tensorflow':
+        # tf.lite is a generated API module, not importable by its path
+        module = importlib.import_module('tensorflow').lite
+        experimental = getattr(module, 'experimental', None)
+        return (module.Interpreter,
+                getattr(experimental, 'load_delegate', None),
+                getattr(experimental, 'OpResolverType', None))
+    module = importlib.import_module(_BACKEND_MODULES[name])
+    return (module.Interpreter, getattr(module, 'load_delegate', None),
+            getattr(module, 'OpResolverType', None))
+
+
+def load_backend(preferred=None):
+    """Import the first available TFLite interpreter backend.
+
+    Sets the module level ``Interpreter`` and ``load_delegate`` and records
+    the import time and resident memory growth in ``backend_info``.
+
+    :Parameters:
+    ----------
+    preferred: str
+        One of BACKENDS or 'auto'. Defaults to $TFLITE_BACKEND, then 'auto'.
+    :Returns:
+    -------
+    str
+        Name of the loaded backend.
+    """
+    global Interpreter, load_delegate, OpResolverType
+    if Interpreter is not None:
+        return backend_info.get('backend')
+    errors = []
+    for name in _backend_order(preferred):
+        rss_before = rss_bytes()
+        start_time = time.monotonic()
+        try:
+            interpreter, delegate, resolver_type = _import_backend(name)
+        except ImportError as e:
+            errors.append('{}: {}'.format(name, e))
+            continue
+        import_seconds = time.monotonic() - start_time
+        rss_after = rss_bytes()
+        Interpreter, load_delegate = interpreter, delegate
+        OpResolverType = resolver_type
+        backend_info.clear()
+        backend_info['backend'] = name
+        backend_info['import_s'] = round(import_seconds, 3)
+        if rss_before is not None and rss_after is not None:
+            backend_info['rss_mb'] = round(rss_after / 2**20, 1)
+            backend_info['import_rss_mb'] = round(
+                (rss_after - rss_before) / 2**20, 1)
+        log.info('TFLite backend %s imported in %.2fs', name, import_seconds)
+        return name
+    raise ImportError('No TFLite interpreter backend available ({})'
+                      .format('; '.join(errors)))
+
 
 def _get_edgetpu_interpreter(model=None):  # pragma: no cover
     # Note: Looking for ideas how to test Coral EdgeTPU dependent code
@@ -28,6 +144,149 @@ def _get_edgetpu_interpreter(model=None):  # pragma: no cover
     return tf_interpreter
 
 
+def _get_cpu_interpreter(model=None, num_threads=None, xnnpack=True):
+    kwargs = {}
+    if num_threads:
+        kwargs['num_threads'] = num_threads
+    if not xnnpack:
+        if OpResolverType is None:
+            log.warning('This TFLite backend cannot disable XNNPACK.')
+        else:
+            # XNNPACK is applied as a default delegate, opt out of those
+            kwargs['experimental_op_resolver_type'] = \
+                OpResolverType.BUILTIN_WITHOUT_DEFAULT_DELEGATES
+    return Interpreter(model_path=model, **kwargs)
+
+
+def default_pool_size(cpu_count=None):
+    """Interpreters to load when the pool size is not configured.
+
+    Half the cores, at most 4: one interpreter per core would leave each
+    a single thread, and :func:`thread_candidates` nothing to tune.
+    """
+    cpu_count = cpu_count or os.cpu_count() or 1
+    return max(1, min(4, cpu_count // 2))
+
+
+def thread_candidates(pool_size=1, cpu_count=None):
+    """Thread counts worth trying: powers of two up to the cores per interpreter."""
+    cpu_count = cpu_count or os.cpu_count() or 1
+    limit = max(1, cpu_count // max(1, pool_size))
+    candidates = []
+    threads = 1
+    while threads < limit:
+        candidates.append(threads)
+        threads *= 2
+    candidates.append(limit)
+    return candidates
+
+
+def benchmark_interpreter_options(model, options, invokes=10, warmup=2):
+    """Time single frame inference for each interpreter option set.
+
+    :Parameters:
+    ----------
+    model: str
+        Path of the TFLite model.
+    options: list of dict
+        Keyword arguments of :func:`_get_cpu_interpreter`, e.g.
+        ``{'num_threads': 2, 'xnnpack': True}``.
+    invokes: int
+        Timed invokes per option set, the median is reported.
+    warmup: int
+        Untimed invokes run first.
+    :Returns:
+    -------
+    list of dict
+        The option sets with a 'latency_ms' entry, fastest first.
+        Option sets that fail to load are left out.
+    """
+    load_backend()
+    results = []
+    for option in options:
+        try:
+            interpreter = _get_cpu_interpreter(model=model, **option)
+            interpreter.allocate_tensors()
+        except Exception as e:
+            log.warning('Interpreter options %r failed: %r', option, e)
+            continue
+        details = interpreter.get_input_details()[0]
+        dummy = np.zeros(details['shape'], details['dtype'])
+        timings = []
+        for i in range(warmup + invokes):
+            interpreter.set_tensor(details['index'], dummy)
+            start_time = time.perf_counter()
+            interpreter.invoke()
+            if i >= warmup:
+                timings.append(time.perf_counter() - start_time)
+        results.append(dict(option,
+                            latency_ms=round(1000 * float(np.median(timings)), 3)))
+    results.sort(key=lambda r: r['latency_ms'])
+    return results
+
+
+class InterpreterPool:
+    """Pool of TFLite interpreters with checkout/return semantics.
+
+    A TFLite Interpreter is not thread safe: set_tensor/invoke/get_tensor
+    from two threads on the same instance mix up their tensors. Each caller
+    checks out an interpreter for exclusive use and returns it afterwards,
+    so up to ``size`` frames can be inferred in parallel.
+
+    With a ``factory`` the pool starts with the given interpreters (maybe
+    none) and creates more on demand, up to ``max_size``.
+    """
+
+    def __init__(self, interpreters=(), factory=None, max_size=None):
+        self._interpreters = list(interpreters)
+        assert self._interpreters or factory, \
+            'InterpreterPool requires at least one interpreter or a factory.'
+        self._factory = factory
+        self._max_size = max(max_size or 0, len(self._interpreters), 1)
+        self._grow_lock = threading.Lock()
+        self._idle = queue.LifoQueue()
+        for interpreter in self._interpreters:
+            self._idle.put(interpreter)
+
+    @property
+    def size(self):
+        return len(self._interpreters)
+
+    @property
+    def interpreters(self):
+        return tuple(self._interpreters)
+
+    def acquire(self, timeout=None):
+        """Block until an interpreter is free and take it out of the pool."""
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        if self._factory is not None:
+            with self._grow_lock:
+                if len(self._interpreters) < self._max_size:
+                    interpreter = self._factory()
+                    self._interpreters.append(interpreter)
+                    return interpreter
+        try:
+            return self._idle.get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError(
+                'No TFLite interpreter available after {}s'.format(timeout))
+
+    def release(self, interpreter):
+        """Return an interpreter taken with :func:`acquire` to the pool."""
+        self._idle.put(interpreter)
+
+    @contextmanager
+    def checkout(self, timeout=None):
+        interpreter = self.acquire(timeout=timeout)
+        try:
+            yield interpreter
+        finally:
+            self.release(interpreter)
+
+
 class TFInferenceEngine:
     """Thin wrapper around TFLite Interpreter.
 
@@ -42,6 +301,10 @@ class TFInferenceEngine:
                  model=None,
                  labels=None,
                  confidence_threshold=0.1,
+                 pool_size=1,
+                 num_threads=None,
+                 xnnpack=True,
+                 autotune_invokes=10,
                  **kwargs
                  ):
         """Create an instance of Tensorflow inference engine.
@@ -59,25 +322,26 @@ class TFInferenceEngine:
             Location of file with model labels.
         confidence_threshold : float
             Inference confidence threshold.
+        pool_size : int
+            Number of interpreters to load. Each one can serve one
+            inference at a time, see :func:`checkout`. Interpreters for
+            batched input are created on first use, up to as many per
+            batch size.
+        num_threads : int or 'auto'
+            CPU threads used by each TFLite interpreter.
+            None keeps the TFLite default.
+        xnnpack : bool or 'auto'
+            Whether the XNNPACK CPU delegate is used.
+        autotune_invokes : int
+            When num_threads or xnnpack is 'auto', each candidate setting
+            is timed over this many invokes at startup and the fastest
+            one is used. See :func:`benchmark_interpreter_options`.
         
         """
-        global Interpreter, load_delegate
-        
-        # LAZY LOAD TENSORFLOW
+        # LAZY LOAD TFLITE RUNTIME (or TensorFlow as a fallback)
         if Interpreter is None:
             log.info("Lazy Loading TensorFlow/TFLite...")
-            try:
-                from tflite_runtime.interpreter import Interpreter as _Interpreter
-                from tflite_runtime.interpreter import load_delegate as _load_delegate
-                Interpreter = _Interpreter
-                load_delegate = _load_delegate
-            except ImportError:
-                import tensorflow.lite as tflite
-                Interpreter = tflite.Interpreter
-                try:
-                    load_delegate = tflite.experimental.load_delegate
-                except AttributeError:
-                    load_delegate = None
+            load_backend()
 
         assert model
         assert model['tflite'], 'TFLite AI model path required.'
@@ -114,15 +378,25 @@ class TFInferenceEngine:
 #        module_object = import_module('edgetpu.detection.engine',
 #                                      packaage=edgetpu_class)
 #        target_class = getattr(module_object, edgetpu_class)
-        self._tf_interpreter = _get_edgetpu_interpreter(model=model_edgetpu)
-        if not self._tf_interpreter:
-            log.debug('EdgeTPU not available. Will use TFLite CPU runtime.')
-            self._tf_interpreter = Interpreter(model_path=model_tflite)
-        assert self._tf_interpreter
-        self._tf_interpreter.allocate_tensors()
-        # check the type of the input tensor
-        self._tf_input_details = self._tf_interpreter.get_input_details()
-        self._tf_output_details = self._tf_interpreter.get_output_details()
+        assert pool_size >= 1, 'Interpreter pool size must be at least 1.'
+        self.autotune_results = None
+        if num_threads == 'auto' or xnnpack == 'auto':
+            num_threads, xnnpack = self._autotune(
+                model_tflite, pool_size, num_threads, xnnpack,
+                autotune_invokes)
+        self._num_threads = num_threads
+        self._xnnpack = xnnpack
+        interpreters = [self._new_interpreter() for _ in range(pool_size)]
+        # One pool per input batch size. An interpreter keeps its batch
+        # size for life: resizing reallocates all tensors, which can cost
+        # more than the invoke that batching saves.
+        self._interpreter_pool = InterpreterPool(interpreters)
+        self._batch_pools = {1: self._interpreter_pool}
+        self._batch_pools_lock = threading.Lock()
+        # all interpreters load the same model, check the type of its
+        # input tensor. Interpreters are only used through checkout().
+        self._tf_input_details = interpreters[0].get_input_details()
+        self._tf_output_details = interpreters[0].get_output_details()
         self._tf_is_quantized_model = \
             self.input_details[0]['dtype'] != np.float32
 
@@ -138,6 +412,119 @@ class TFInferenceEngine:
     def is_quantized(self):
         return self._tf_is_quantized_model
 
+    @property
+    def pool_size(self):
+        return self._interpreter_pool.size
+
+    @property
+    def num_threads(self):
+        return self._num_threads
+
+    @property
+    def xnnpack(self):
+        return self._xnnpack
+
+    def _autotune(self, model, pool_size, num_threads, xnnpack, invokes):
+        """Pick the fastest thread count / XNNPACK setting on this host."""
+        if num_threads == 'auto':
+            thread_options = thread_candidates(pool_size)
+        else:
+            thread_options = [num_threads]
+        xnnpack_options = [True, False] if xnnpack == 'auto' else [xnnpack]
+        options = [{'num_threads': threads, 'xnnpack': use_xnnpack}
+                   for use_xnnpack in xnnpack_options
+                   for threads in thread_options]
+        results = benchmark_interpreter_options(model, options,
+                                                invokes=invokes)
+        self.autotune_results = results
+        if not results:
+            log.warning('Interpreter autotune failed, using defaults.')
+            return (None if num_threads == 'auto' else num_threads,
+                    True if xnnpack == 'auto' else xnnpack)
+        best = results[0]
+        log.info('Interpreter autotune picked num_threads=%s xnnpack=%s '
+                 '(%.2f ms/invoke)', best['num_threads'], best['xnnpack'],
+                 best['latency_ms'])
+        return best['num_threads'], best['xnnpack']
+
+    def _new_interpreter(self, batch_size=1):
+        """Load the model into a new interpreter with the given input batch size."""
+        tf_interpreter = _get_edgetpu_interpreter(
+            model=self._model_edgetpu_path)
+        if not tf_interpreter:
+            log.debug('EdgeTPU not available. Will use TFLite CPU runtime.')
+            tf_interpreter = _get_cpu_interpreter(
+                model=self._model_tflite_path, num_threads=self._num_threads,
+                xnnpack=self._xnnpack)
+        assert tf_interpreter
+        if batch_size != 1:
+            details = tf_interpreter.get_input_details()[0]
+            shape = list(details['shape'])
+            shape[0] = batch_size
+            tf_interpreter.resize_tensor_input(details['index'], shape)
+        tf_interpreter.allocate_tensors()
+        return tf_interpreter
+
+    @staticmethod
+    def padded_batch_size(batch_size):
+        """Batch size to run ``batch_size`` inputs at, the next power of two.
+
+        Padding batches keeps the number of interpreter batch sizes, and
+        so of interpreters, small.
+        """
+        return 1 << (max(1, batch_size) - 1).bit_length()
+
+    def checkout(self, timeout=None, batch_size=1):
+        """Context manager lending an interpreter for exclusive use.
+
+        The interpreter takes input of ``batch_size`` frames. Interpreters
+        for a batch size other than 1 are loaded on first use.
+
+        Example:
+            with tfengine.checkout() as interpreter:
+                interpreter.set_tensor(...)
+                interpreter.invoke()
+                out = interpreter.get_tensor(...)
+        """
+        pool = self._batch_pools.get(batch_size)
+        if pool is None:
+            with self._batch_pools_lock:
+                pool = self._batch_pools.get(batch_size)
+                if pool is None:
+                    pool = InterpreterPool(
+                        factory=partial(self._new_interpreter, batch_size),
+                        max_size=self.pool_size)
+                    self._batch_pools[batch_size] = pool
+        return pool.checkout(timeout=timeout)
+
+    def warmup(self, invokes=1):
+        """Run dummy invokes on every pooled single frame interpreter.
+
+        The first invoke of a TFLite interpreter is much slower than the
+        following ones (delegate setup, memory planning). Paying it here
+        keeps it out of the first real request.
+
+        :Returns:
+        -------
+        float
+            Seconds spent.
+        """
+        start_time = time.monotonic()
+        pool = self._interpreter_pool
+        # take out all interpreters so each one is warmed up exactly once
+        interpreters = [pool.acquire() for _ in range(pool.size)]
+        try:
+            details = self.input_details[0]
+            dummy = np.zeros(details['shape'], details['dtype'])
+            for interpreter in interpreters:
+                for _ in range(invokes):
+                    interpreter.set_tensor(details['index'], dummy)
+                    interpreter.invoke()
+        finally:
+            for interpreter in interpreters:
+                pool.release(interpreter)
+        return time.monotonic() - start_time
+
     @property
     def confidence_threshold(self):
         """
@@ -152,18 +539,3 @@ class TFInferenceEngine:
 
         """
         return self._confidence_threshold
-
-    
-    def infer(self):
-        """Invoke model inference on current input tensor."""
-        return self._tf_interpreter.invoke()
-
-    def set_tensor(self, index=None, tensor_data=None):
-        """Set tensor data at given reference index."""
-        assert isinstance(index, int)
-        self._tf_interpreter.set_tensor(index, tensor_data)
-
-    def get_tensor(self, index=None):
-        """Return tensor data at given reference index."""
-        assert isinstance(index, int)
-        return self._tf_interpreter.get_tensor(index)
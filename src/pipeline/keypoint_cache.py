@@ -0,0 +1,116 @@
+"""On-disk cache of raw model keypoints.
+
+Pose inference is the expensive part of fall detection, the geometry
+applied to its output is cheap. Caching the raw keypoint array of every
+(image, model, rotation) lets tuning sessions, benchmarks and replays
+re-run the fall logic over hundreds of images without invoking the
+model again.
+"""
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+from src import DEFAULT_DATA_DIR
+
+log = logging.getLogger(__name__)
+
+_ROTATION_NAMES = {
+    None: 'r0',
+    Image.ROTATE_90: 'r90',
+    Image.ROTATE_270: 'r270',
+}
+
+_model_hashes = {}
+_model_hashes_lock = threading.Lock()
+
+
+def file_hash(path, chunk_size=1 << 20):
+    """sha256 hex digest of a file, memoized per path, size and mtime."""
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    with _model_hashes_lock:
+        digest = _model_hashes.get(memo_key)
+    if digest is None:
+        sha = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                sha.update(chunk)
+        digest = sha.hexdigest()
+        with _model_hashes_lock:
+            _model_hashes[memo_key] = digest
+    return digest
+
+
+def image_hash(image):
+    """Content hash of a PIL image or numpy frame, including its geometry."""
+    h = hashlib.blake2b(digest_size=20)
+    if isinstance(image, np.ndarray):
+        h.update(f'{image.shape}{image.dtype}'.encode())
+        h.update(np.ascontiguousarray(image).data)
+    else:
+        h.update(f'{image.size}{image.mode}'.encode())
+        h.update(image.tobytes())
+    return h.hexdigest()
+
+
+class KeypointCache:
+    """Raw keypoint arrays stored as .npy files under one directory.
+
+    Entries live in ``<directory>/<model hash>/<xx>/<image hash>-<rotation>.npy``,
+    so caches of different models never mix and a cache directory can be
+    shared by several processes: files are written atomically.
+    """
+
+    def __init__(self, model_path, directory=None):
+        """
+        :Parameters:
+        ----------
+        model_path: str
+            TFLite model file, its content hash is part of every key.
+        directory: str
+            Cache root. Defaults to <DEFAULT_DATA_DIR>/keypoint_cache.
+        """
+        if directory is None:
+            directory = Path(DEFAULT_DATA_DIR, 'keypoint_cache')
+        self.model_hash = file_hash(model_path)
+        self.directory = Path(directory, self.model_hash[:16])
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, image, angle=None):
+        return '{}-{}'.format(image_hash(image), _ROTATION_NAMES[angle])
+
+    def _path(self, key):
+        return self.directory / key[:2] / (key + '.npy')
+
+    def get(self, key):
+        """The cached keypoint array of ``key``, None on a miss."""
+        try:
+            kps = np.load(self._path(key), allow_pickle=False)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return kps
+
+    def put(self, key, kps):
+        path = self._path(key)
+        tmp_path = None
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                np.save(f, np.asarray(kps), allow_pickle=False)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            log.warning('Could not write keypoint cache entry %s: %r', path, e)
+            if tmp_path is not None:
+                try:
+                    os.unlink(tmp_path)
+                except OSError:
+                    pass
@@ -0,0 +1,132 @@
+"""Always-on latency histograms and counters for the detection pipeline.
+
+Stages time themselves with wall-clock ``time.perf_counter`` and record
+into the module level :data:`metrics` registry:
+
+    with metrics.time('invoke'):
+        interpreter.invoke()
+
+The registry renders itself in the Prometheus text exposition format for
+the /api/metrics endpoint.
+"""
+import bisect
+import threading
+import time
+
+# Pipeline stages in the order a frame passes through them
+STAGES = ('decode', 'preprocess', 'invoke', 'parse', 'fall_logic', 'encode')
+
+# Upper bounds in seconds, from sub-millisecond numpy work up to slow
+# first invokes
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+class Histogram:
+    """Cumulative bucket histogram of durations in seconds."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        i = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            self._counts[i] += 1
+            self._sum += seconds
+
+    @property
+    def count(self):
+        return sum(self._counts)
+
+    def snapshot(self):
+        """(cumulative counts per bucket incl. +Inf, sum, count)."""
+        with self._lock:
+            counts = list(self._counts)
+            total = self._sum
+        cumulative = []
+        running = 0
+        for c in counts:
+            running += c
+            cumulative.append(running)
+        return cumulative, total, running
+
+
+class _StageTimer:
+    __slots__ = ('_histogram', '_start')
+
+    def __init__(self, histogram):
+        self._histogram = histogram
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._histogram.observe(time.perf_counter() - self._start)
+        return False
+
+
+class PipelineMetrics:
+    """Registry of per-stage latency histograms and event counters."""
+
+    def __init__(self, stages=STAGES, buckets=DEFAULT_BUCKETS):
+        self._buckets = buckets
+        self._histograms = {stage: Histogram(buckets) for stage in stages}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, stage):
+        histogram = self._histograms.get(stage)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(
+                    stage, Histogram(self._buckets))
+        return histogram
+
+    def observe(self, stage, seconds):
+        """Record the duration of one pass through ``stage``."""
+        self.histogram(stage).observe(seconds)
+
+    def time(self, stage):
+        """Context manager recording the time spent in its block."""
+        return _StageTimer(self.histogram(stage))
+
+    def inc(self, counter, amount=1):
+        with self._lock:
+            self._counters[counter] = self._counters.get(counter, 0) + amount
+
+    def counter(self, counter):
+        return self._counters.get(counter, 0)
+
+    def reset(self):
+        with self._lock:
+            self._histograms = {stage: Histogram(self._buckets)
+                                for stage in self._histograms}
+            self._counters = {}
+
+    def render_prometheus(self, prefix='orion'):
+        """Prometheus text exposition (format version 0.0.4)."""
+        name = f'{prefix}_stage_seconds'
+        lines = [f'# HELP {name} Wall-clock time spent per pipeline stage.',
+                 f'# TYPE {name} histogram']
+        for stage, histogram in list(self._histograms.items()):
+            cumulative, total, count = histogram.snapshot()
+            for bound, value in zip(histogram.buckets, cumulative):
+                lines.append(f'{name}_bucket{{stage="{stage}",le="{bound}"}} '
+                             f'{value}')
+            lines.append(f'{name}_bucket{{stage="{stage}",le="+Inf"}} {count}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {total!r}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {count}')
+        with self._lock:
+            counters = sorted(self._counters.items())
+        for counter, value in counters:
+            counter_name = f'{prefix}_{counter}_total'
+            lines.append(f'# TYPE {counter_name} counter')
+            lines.append(f'{counter_name} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+metrics = PipelineMetrics()
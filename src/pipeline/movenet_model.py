@@ -1,4 +1,5 @@
 from src.pipeline.pose_base import AbstractPoseModel
+from src.pipeline.metrics import metrics
 import numpy as np
 import time
 
@@ -58,32 +59,35 @@ class Movenet(AbstractPoseModel):
         _tensor_input_size = (self._tensor_image_width,
                               self._tensor_image_height)
 
-        # thumbnail is a proportionately resized image
-        thumbnail = self.thumbnail(image=img,
-                                               desired_size=_tensor_input_size)
-        # convert thumbnail into an image with the exact size
-        # as the input tensor preserving proportions by padding with
-        # a solid color as needed
-        template_image = self.resize(image=thumbnail,
-                                desired_size=_tensor_input_size)
+        with metrics.time('preprocess'):
+            # thumbnail is a proportionately resized image
+            thumbnail = self.thumbnail(image=img,
+                                       desired_size=_tensor_input_size)
+            # convert thumbnail into an image with the exact size
+            # as the input tensor preserving proportions by padding with
+            # a solid color as needed
+            template_image = self.resize(image=thumbnail,
+                                         desired_size=_tensor_input_size)
 
-        start_time = time.process_time()
+            template_input = np.expand_dims(template_image.copy(), axis=0)
+            floating_model = self._tfengine.input_details[0]['dtype'] == np.float32
 
-        template_input = np.expand_dims(template_image.copy(), axis=0)
-        floating_model = self._tfengine.input_details[0]['dtype'] == np.float32
+            if floating_model:
+                template_input = template_input.astype(np.float32)
 
-        if floating_model:
-            template_input = template_input.astype(np.float32)
-            
-        self.tf_interpreter().\
-            set_tensor(self._tfengine.input_details[0]['index'],
-                       template_input)
-        self.tf_interpreter().invoke()
+        start_time = time.perf_counter()
+
+        with self._tfengine.checkout() as interpreter:
+            interpreter.set_tensor(self._tfengine.input_details[0]['index'],
+                                   template_input)
+            with metrics.time('invoke'):
+                interpreter.invoke()
 
-        keypoints_with_scores = self.tf_interpreter().get_tensor(self._tfengine.output_details[0]['index'])
-        kps = self.parse_output(keypoints_with_scores, self._tensor_image_height, self._tensor_image_width)
+            keypoints_with_scores = interpreter.get_tensor(self._tfengine.output_details[0]['index'])
+        with metrics.time('parse'):
+            kps = self.parse_output(keypoints_with_scores, self._tensor_image_height, self._tensor_image_width)
 
 
-        _inference_time = time.process_time() - start_time
+        _inference_time = time.perf_counter() - start_time
 
         return kps, template_image, thumbnail, _inference_time
\ No newline at end of file
@@ -1,4 +1,6 @@
 from abc import ABC, abstractmethod
+import math
+import threading
 import numpy as np
 from PIL import ImageOps
 
@@ -10,6 +12,10 @@ class AbstractPoseModel(ABC):
         Abstract class for pose estimation models.
     """
 
+    # True when the model can run on prepared input tensors directly,
+    # see Posenet_MobileNet.execute_model_tensors.
+    supports_tensor_input = False
+
     def __init__(self, tfengine):
                 
         """Initialize posenet-base class with Tensorflow inference engine.
@@ -28,6 +34,9 @@ class AbstractPoseModel(ABC):
         self.confidence_threshold = self._tfengine.confidence_threshold
         log.debug(f"Initializing PoseEngine with confidence threshold \
             {self.confidence_threshold}")
+
+        # per thread reusable input tensor, see input_buffer()
+        self._buffers = threading.local()
         
 
     def get_input_tensor_shape(self):
@@ -45,9 +54,94 @@ class AbstractPoseModel(ABC):
         """
         return self._tfengine.input_details[0]['shape']
 
- 
-    def tf_interpreter(self):
-        return self._tfengine._tf_interpreter
+
+    def input_buffer(self):
+        """Return this thread's preallocated (1, height, width, depth) input.
+
+        The buffer is reused by every frame prepared on the same thread,
+        so its content is only valid until the next frame is prepared.
+        """
+        buffer = getattr(self._buffers, 'input', None)
+        if buffer is None:
+            buffer = np.empty((1, self._tensor_image_height,
+                               self._tensor_image_width,
+                               self._tensor_image_depth),
+                              dtype=self._tfengine.input_details[0]['dtype'])
+            self._buffers.input = buffer
+        return buffer
+
+
+    @staticmethod
+    def thumbnail_size(image_size, desired_size):
+        """Size PIL.Image.thumbnail would shrink image_size to.
+
+        :Parameters:
+        ----------
+        image_size : (width, height)
+        desired_size : (width, height)
+        :Returns:
+        -------
+        (width, height)
+            Largest size fitting desired_size with the aspect ratio of
+            image_size. Images that already fit are not enlarged.
+        """
+        width, height = image_size
+        x, y = (int(v) for v in desired_size)
+        if x >= width and y >= height:
+            return width, height
+
+        def round_aspect(number, key):
+            return max(min(math.floor(number), math.ceil(number), key=key), 1)
+
+        aspect = width / height
+        if x / y >= aspect:
+            x = round_aspect(y * aspect, key=lambda n: abs(aspect - n / y))
+        else:
+            y = round_aspect(x / aspect,
+                             key=lambda n: 0 if n == 0 else abs(aspect - x / n))
+        return x, y
+
+
+    def letterbox(self, frame, out, normalize=False):
+        """Numpy counterpart of :func:`thumbnail` followed by :func:`resize`.
+
+        Shrinks an RGB frame with cv2 and writes it straight into the top
+        left corner of ``out``, padding the rest with black, without any
+        PIL round trips or intermediate full frame copies.
+        :Parameters:
+        ----------
+        frame : numpy.ndarray
+            uint8 RGB image of shape (height, width, 3).
+        out : numpy.ndarray
+            Destination of shape (tensor height, tensor width, 3).
+        normalize : bool
+            Write (pixel - 127.5) / 127.5 as expected by float models.
+        :Returns:
+        -------
+        numpy.ndarray
+            The resized frame (the thumbnail) without padding.
+        """
+        import cv2  # only needed by the numpy preprocessing path
+        height, width = frame.shape[:2]
+        out_height, out_width = out.shape[:2]
+        thumb_w, thumb_h = self.thumbnail_size((width, height),
+                                               (out_width, out_height))
+        if (thumb_w, thumb_h) == (width, height):
+            thumb = frame
+        else:
+            thumb = cv2.resize(frame, (thumb_w, thumb_h),
+                               interpolation=cv2.INTER_AREA)
+
+        pad = -1.0 if normalize else 0
+        out[thumb_h:, :] = pad
+        out[:thumb_h, thumb_w:] = pad
+        region = out[:thumb_h, :thumb_w]
+        if normalize:
+            np.subtract(thumb, 127.5, out=region)
+            np.divide(region, 127.5, out=region)
+        else:
+            region[...] = thumb
+        return thumb
 
 
     def thumbnail(self, image=None, desired_size=None):
@@ -128,4 +222,24 @@ class AbstractPoseModel(ABC):
     def execute_model(self, img):
         '''
             Execute Pose Estimation Model.
-        '''
\ No newline at end of file
+        '''
+
+    def execute_model_batch(self, imgs):
+        '''Execute Pose Estimation Model on several images.
+
+        Models that support a batched input tensor override this with a
+        single invoke. The default runs :func:`execute_model` per image.
+        :Returns:
+        -------
+        kps:
+            Sequence with the keypoints of each image.
+        template_images: list of PIL.Image
+        thumbnails: list of PIL.Image
+        _inference_time: float
+            Total model inference time in seconds
+        '''
+        results = [self.execute_model(img) for img in imgs]
+        return ([r[0] for r in results],
+                [r[1] for r in results],
+                [r[2] for r in results],
+                sum(r[3] for r in results))
\ No newline at end of file
@@ -1,7 +1,8 @@
 from src import DEFAULT_DATA_DIR
 import logging
-import time
-from PIL import ImageDraw
+from collections.abc import Mapping
+import numpy as np
+from PIL import Image, ImageDraw
 from pathlib import Path
 
 
@@ -30,6 +31,16 @@ KEYPOINTS = (
   'right ankle'
 )
 
+# row of each keypoint in Pose.array
+(NOSE, LEFT_EYE, RIGHT_EYE, LEFT_EAR, RIGHT_EAR,
+ LEFT_SHOULDER, RIGHT_SHOULDER, LEFT_ELBOW, RIGHT_ELBOW,
+ LEFT_WRIST, RIGHT_WRIST, LEFT_HIP, RIGHT_HIP,
+ LEFT_KNEE, RIGHT_KNEE, LEFT_ANKLE, RIGHT_ANKLE) = range(len(KEYPOINTS))
+KEYPOINT_INDEX = {k: i for i, k in enumerate(KEYPOINTS)}
+
+# columns of Pose.array
+X, Y, SCORE = range(3)
+
 
 class Keypoint:
     __slots__ = ['k', 'yx', 'score']
@@ -43,22 +54,89 @@ class Keypoint:
         return 'Keypoint(<{}>, {}, {})'.format(self.k, self.yx, self.score)
 
 
-class Pose:
-    __slots__ = ['keypoints', 'score']
+class _KeypointsView(Mapping):
+    """Read access to a pose array as a dict of Keypoint objects.
+
+    The ``yx`` of every Keypoint is a view into the array, writes to it
+    change the pose.
+    """
+    __slots__ = ['_array']
+
+    def __init__(self, array):
+        self._array = array
+
+    def __getitem__(self, k):
+        i = KEYPOINT_INDEX[k]
+        return Keypoint(k, self._array[i, X:SCORE], self._array[i, SCORE])
+
+    def __iter__(self):
+        return iter(KEYPOINTS)
 
-    def __init__(self, keypoints, score=None):
-        assert len(keypoints) == len(KEYPOINTS)
-        self.keypoints = keypoints
+    def __len__(self):
+        return len(KEYPOINTS)
+
+
+class Pose:
+    """Keypoints of one person as a (17, 3) float32 array.
+
+    Rows follow ``KEYPOINTS``, columns are ``X``, ``Y`` and ``SCORE``.
+    ``keypoints`` offers the former dict of Keypoint objects as a view.
+    """
+    __slots__ = ['array', 'score']
+
+    def __init__(self, array, score=None):
+        if isinstance(array, Mapping):
+            # dict of Keypoint objects
+            array = np.array([[*array[k].yx, array[k].score]
+                              for k in KEYPOINTS], np.float32)
+        assert array.shape == (len(KEYPOINTS), 3)
+        self.array = array
         self.score = score
 
+    @classmethod
+    def from_model_output(cls, kps, score=None):
+        """Pose of a (17, 3) model output array of y, x, score rows."""
+        return cls(np.asarray(kps, np.float32)[:, (1, 0, 2)], score)
+
+    @property
+    def keypoints(self):
+        return _KeypointsView(self.array)
+
+    def rotate_back(self, angle, width, height):
+        """Map keypoints of a rotated image back to the upright one.
+
+        ``width`` and ``height`` are the size of the rotated image.
+        """
+        if angle is None:
+            return
+        xy = self.array[:, X:SCORE]
+        xy[:] = xy[:, ::-1]
+        if angle == Image.ROTATE_90:
+            # ROTATE_90 rotates 90' counter clockwise from ^ to <
+            np.subtract(width, xy[:, X], out=xy[:, X])
+        elif angle == Image.ROTATE_270:
+            # ROTATE_270 rotates 90' clockwise from ^ to >
+            np.subtract(height, xy[:, Y], out=xy[:, Y])
+        else:
+            raise ValueError('Unsupported rotation: {}'.format(angle))
+
+    def rescale(self, scale_x, scale_y):
+        """Scale keypoint coordinates in place."""
+        self.array[:, X] *= scale_x
+        self.array[:, Y] *= scale_y
+
     def __repr__(self):
-        return 'Pose({}, {})'.format(self.keypoints, self.score)
+        return 'Pose({}, {})'.format(self.array.tolist(), self.score)
 
 
 class PoseEngine():
     """Engine used for pose tasks."""
-    def __init__(self, tfengine=None, model_name=None, context=None):
+    def __init__(self, tfengine=None, model_name=None, context=None,
+                 keypoint_cache=None):
         """Creates a PoseEngine wrapper around an initialized tfengine.
+
+        An optional :class:`KeypointCache` is consulted before every model
+        invocation, cached frames skip inference entirely.
         """
 
         assert tfengine is not None
@@ -75,6 +153,9 @@ class PoseEngine():
             self._sys_data_dir = DEFAULT_DATA_DIR
         self._sys_data_dir = Path(self._sys_data_dir)
 
+        self.keypoint_cache = keypoint_cache
+        # resolved once, production mode pays no per frame debug cost
+        self._debug = log.isEnabledFor(logging.DEBUG)
         self.confidence_threshold = self._model.confidence_threshold
         self._tensor_image_height = self._model._tensor_image_height
         self._tensor_image_width = self._model._tensor_image_width
@@ -136,63 +217,207 @@ class PoseEngine():
         Detects poses in a given image.
         :Parameters:
         ----------
-        img : PIL.Image
-            Input Image for AI model detection.
+        img : PIL.Image or numpy.ndarray
+            Input Image for AI model detection. Numpy arrays (uint8 RGB)
+            skip PIL preprocessing for models that support it.
         :Returns:
         -------
         poses:
             A list of Pose objects with keypoints and confidence scores
-        PIL.Image
+        PIL.Image or numpy.ndarray
             Resized image fitting the AI model input tensor.
         """
 
+        cache = self.keypoint_cache
+        if cache is not None:
+            key = cache.key(img)
+            kps = cache.get(key)
+            if kps is not None:
+                _, template_image, thumbnail = self._prepare_input(img)
+                poses, pose_score = self._build_poses(kps, template_image)
+                return poses, thumbnail, pose_score
+
         kps, template_image, thumbnail, _ = self._model.execute_model(img)
-        poses = []
-
-        keypoint_dict = {}
-        cnt = 0
-
-        keypoint_count = kps.shape[0]
-        for point_i in range(keypoint_count):
-            x, y = kps[point_i, 1], kps[point_i, 0]
-            prob = kps[point_i, 2]
-
-            if prob > self.confidence_threshold and \
-                0 < y < self._tensor_image_height and \
-                0 < x < self._tensor_image_width:
-
-                cnt += 1
-                if log.getEffectiveLevel() <= logging.DEBUG:
-                    # development mode
-                    # draw on image and save it for debugging
-                    draw = ImageDraw.Draw(template_image)
-                    draw.line(((0, 0), (x, y)), fill='blue')
-                    draw.line(((0, 0), (x, y)), fill='blue')
-            
-            # Allow raw probability to pass through even if "low"
-            # else:
-            #     prob = 0
-
-            keypoint = Keypoint(KEYPOINTS[point_i], [x, y], prob)
-            keypoint_dict[KEYPOINTS[point_i]] = keypoint
+        if cache is not None:
+            cache.put(key, kps)
+        poses, pose_score = self._build_poses(kps, template_image)
+        return poses, thumbnail, pose_score
+
+    def _prepare_input(self, img):
+        """Preprocessing without inference, for keypoints from the cache."""
+        if hasattr(self._model, 'prepare_input'):
+            return self._model.prepare_input(img)
+        size = (self._tensor_image_width, self._tensor_image_height)
+        thumbnail = self._model.thumbnail(image=img, desired_size=size)
+        template_image = self._model.resize(image=thumbnail, desired_size=size)
+        return None, template_image, thumbnail
+
+    def detect_poses_batch(self, images):
+        """
+        Detects poses in several images with a single model invocation.
+        :Parameters:
+        ----------
+        images : list of PIL.Image
+            Input Images for AI model detection.
+        :Returns:
+        -------
+        list
+            One (poses, thumbnail, pose_score) tuple per input image,
+            same as :func:`detect_poses` returns.
+        """
+
+        if not images:
+            return []
+        if self.keypoint_cache is not None:
+            # per image lookups, only the misses are inferred
+            return [self.detect_poses(img) for img in images]
+        kps_batch, template_images, thumbnails, _ = \
+            self._model.execute_model_batch(images)
+        results = []
+        for kps, template_image, thumbnail in zip(kps_batch,
+                                                  template_images,
+                                                  thumbnails):
+            poses, pose_score = self._build_poses(kps, template_image)
+            results.append((poses, thumbnail, pose_score))
+        return results
+
+    @property
+    def supports_tensor_rotation(self):
+        """True if :func:`detect_poses_rotated` can be used with this model."""
+        return self._model.supports_tensor_input
+
+    def prepare_input(self, img):
+        """Thumbnail and pad an image into the model input tensor.
+
+        Returns (template_input, template_image, thumbnail) for
+        :func:`detect_poses_prepared` and :func:`detect_poses_rotated`.
+        The tensor is this thread's reused input buffer, valid until the
+        thread prepares its next frame.
+        """
+        return self._model.prepare_input(img)
+
+    def detect_poses_prepared(self, prepared):
+        """
+        Detects upright poses in several prepared inputs with one invoke.
+        :Parameters:
+        ----------
+        prepared : list
+            Results of :func:`prepare_input`.
+        :Returns:
+        -------
+        list
+            One (poses, thumbnail, pose_score) tuple per input.
+        """
+
+        if not prepared:
+            return []
+        kps_batch = self._model.execute_model_tensors(
+            np.concatenate([template_input for template_input, _, _
+                            in prepared]))
+        results = []
+        for kps, (_, template_image, thumbnail) in zip(kps_batch, prepared):
+            poses, pose_score = self._build_poses(kps, template_image)
+            results.append((poses, thumbnail, pose_score))
+        return results
+
+    def detect_poses_rotated(self, img, angles, batched=True, prepared=None):
+        """
+        Detects poses in an image and its 90 degree rotations.
+
+        The image is thumbnailed and padded once, the rotations are made
+        with numpy on the prepared input tensor. Keypoints of rotated
+        inputs are in the coordinates of the rotated
+        (tensor width x tensor height) input.
+        :Parameters:
+        ----------
+        img : PIL.Image
+            Input Image for AI model detection.
+        angles : sequence
+            None for the upright image, PIL.Image.ROTATE_90 or
+            PIL.Image.ROTATE_270.
+        batched : bool
+            True runs all angles in a single invoke. False invokes
+            the model once per angle, lazily, so callers can stop
+            iterating as soon as a pose is good enough.
+        prepared : tuple
+            Result of :func:`prepare_input` for ``img``, to skip
+            preprocessing it again.
+        :Yields:
+        -------
+        (angle, poses, thumbnail, pose_score) for each angle in order.
+        """
+
+        template_input, template_image, thumbnail = \
+            prepared or self._model.prepare_input(img)
+
+        def _template(angle):
+            if angle is None or template_image is None:
+                return template_image
+            return template_image.transpose(angle)
+
+        cache = self.keypoint_cache
+        if cache is not None:
+            keys = {angle: cache.key(img, angle) for angle in angles}
+            cached = {angle: cache.get(keys[angle]) for angle in angles}
+            missing = [a for a in angles if cached[a] is None]
+            if batched and missing:
+                kps_batch = self._model.execute_model_tensors(np.concatenate(
+                    [self._model.rotate_input(template_input, angle)
+                     for angle in missing]))
+                for angle, kps in zip(missing, kps_batch):
+                    cache.put(keys[angle], kps)
+                    cached[angle] = kps
+            for angle in angles:
+                kps = cached[angle]
+                if kps is None:
+                    kps = self._model.execute_model_tensors(
+                        self._model.rotate_input(template_input, angle))[0]
+                    cache.put(keys[angle], kps)
+                poses, pose_score = self._build_poses(kps, _template(angle))
+                yield angle, poses, thumbnail, pose_score
+            return
+
+        if batched:
+            kps_batch = self._model.execute_model_tensors(np.concatenate(
+                [self._model.rotate_input(template_input, angle)
+                 for angle in angles]))
+            for angle, kps in zip(angles, kps_batch):
+                poses, pose_score = self._build_poses(kps, _template(angle))
+                yield angle, poses, thumbnail, pose_score
+        else:
+            for angle in angles:
+                kps = self._model.execute_model_tensors(
+                    self._model.rotate_input(template_input, angle))[0]
+                poses, pose_score = self._build_poses(kps, _template(angle))
+                yield angle, poses, thumbnail, pose_score
+
+    def _build_poses(self, kps, template_image):
+        """Convert a keypoint array into a list of Pose objects."""
+        pose = Pose.from_model_output(kps)
+        x, y, prob = pose.array.T
+
+        # Allow raw probability to pass through even if "low", the
+        # threshold only decides which keypoints count for the pose score
+        valid = (prob > self.confidence_threshold) & \
+            (0 < y) & (y < self._tensor_image_height) & \
+            (0 < x) & (x < self._tensor_image_width)
+        cnt = int(np.count_nonzero(valid))
 
         # overall pose score is calculated as the average of all
         # individual keypoint scores
-        pose_score = cnt/keypoint_count
-        log.debug(f"Overall pose score (keypoint score average): {pose_score}")
-        poses.append(Pose(keypoint_dict, pose_score))
-        if cnt > 0 and log.getEffectiveLevel() <= logging.DEBUG:
+        pose_score = cnt/len(pose.array)
+        pose.score = pose_score
+        poses = [pose]
+        if self._debug:
             # development mode
-            # save template_image for debugging
-            timestr = int(time.monotonic()*1000)
-            log.debug(f"Detected a pose with {cnt} keypoints that score over \
-                the minimum confidence threshold of \
-                {self.confidence_threshold}.")
-            debug_image_file_name = \
-                f'tmp-pose-detect-image-time-{timestr}-keypoints-{cnt}.jpg'
-            # template_image.save(
-            #                     Path(self._sys_data_dir,
-            #                          debug_image_file_name),
-            #                     format='JPEG')
-            log.debug(f"Debug image saved: {debug_image_file_name}")
-        return poses, thumbnail, pose_score
+            log.debug("Overall pose score (keypoint score average): %s",
+                      pose_score)
+            if cnt and template_image is not None:
+                # mark the keypoints on the template image
+                draw = ImageDraw.Draw(template_image)
+                for point_x, point_y in zip(x[valid], y[valid]):
+                    draw.line(((0, 0), (point_x, point_y)), fill='blue')
+                log.debug("Detected a pose with %d keypoints that score over "
+                          "the minimum confidence threshold of %s.",
+                          cnt, self.confidence_threshold)
+        return poses, pose_score
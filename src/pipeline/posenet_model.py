@@ -1,10 +1,59 @@
 from src.pipeline.pose_base import AbstractPoseModel
+from src.pipeline.metrics import metrics
 import numpy as np
 import time
+from PIL import Image
+
+
+def decode_heatmaps(heatmap_data, offset_data, image_height):
+    '''Vectorized PoseNet single pose decoder.
+
+    Picks the heatmap maximum of every joint with one argmax over the
+    flattened grid, gathers the matching offsets with fancy indexing and
+    applies the sigmoid to all scores at once. Any leading dimensions are
+    treated as a batch.
+
+    :Parameters:
+    ----------
+    heatmap_data: numpy.ndarray
+        Heatmaps of shape (..., grid_h, grid_w, joints).
+    offset_data: numpy.ndarray
+        Offsets of shape (..., grid_h, grid_w, 2 * joints).
+    image_height: int
+        Height of the model input tensor.
+    :Returns:
+    -------
+    numpy.ndarray
+        float32 array of shape (..., joints, 3) holding y, x, score.
+    '''
+    *batch, grid_h, grid_w, joint_num = heatmap_data.shape
+    heatmaps = heatmap_data.reshape(*batch, grid_h * grid_w, joint_num)
+    offsets = offset_data.reshape(*batch, grid_h * grid_w, 2 * joint_num)
+
+    # first maximum in row-major order, same as np.argwhere()[0]
+    max_idx = np.argmax(heatmaps, axis=-2)[..., np.newaxis, :]
+    max_prob = np.take_along_axis(heatmaps, max_idx, axis=-2)[..., 0, :]
+    offset_y = np.take_along_axis(offsets[..., :joint_num],
+                                  max_idx, axis=-2)[..., 0, :]
+    offset_x = np.take_along_axis(offsets[..., joint_num:],
+                                  max_idx, axis=-2)[..., 0, :]
+
+    row, col = np.divmod(max_idx[..., 0, :], grid_w)
+    remap_y = np.array(row / (grid_h - 1) * image_height, dtype=np.int32)
+    remap_x = np.array(col / (grid_h - 1) * image_height, dtype=np.int32)
+
+    pose_kps = np.empty((*batch, joint_num, 3), np.float32)
+    pose_kps[..., 0] = np.trunc(remap_y + offset_y)
+    pose_kps[..., 1] = np.trunc(remap_x + offset_x)
+    pose_kps[..., 2] = 1 / (1 + np.exp(-max_prob))
+    return pose_kps
+
 
 class Posenet_MobileNet(AbstractPoseModel):
     '''The class for pose estimation using Posenet Mobilenet implementation.'''
 
+    supports_tensor_input = True
+
     def __init__(self, tfengine):
         super().__init__(tfengine)
 
@@ -18,26 +67,59 @@ class Posenet_MobileNet(AbstractPoseModel):
             Parse Output of TFLite model and get keypoints with score.
         '''
 
-        joint_num = heatmap_data.shape[-1]
-        pose_kps = np.zeros((joint_num, 3), np.float32)
+        return decode_heatmaps(heatmap_data, offset_data,
+                               self._tensor_image_height)
 
-        for i in range(heatmap_data.shape[-1]):
 
-            joint_heatmap = heatmap_data[..., i]
-            max_val_pos = np.squeeze(
-                np.argwhere(joint_heatmap == np.max(joint_heatmap)))
-            remap_pos = np.array(max_val_pos/8*self._tensor_image_height,
-                                 dtype=np.int32)
-            pose_kps[i, 0] = int(remap_pos[0] + offset_data[max_val_pos[0],
-                                 max_val_pos[1], i])
-            pose_kps[i, 1] = int(remap_pos[1] + offset_data[max_val_pos[0],
-                                 max_val_pos[1], i+joint_num])
-            max_prob = np.max(joint_heatmap)
-            
-            pose_kps[i,2] = self.sigmoid(max_prob)
-            
+    def prepare_input(self, img, out=None):
+        '''Thumbnail, pad and normalize an image for the input tensor.
 
-        return pose_kps
+        :Parameters:
+        ----------
+        img: PIL.Image or numpy.ndarray
+            Input Image, numpy arrays are uint8 RGB (height, width, 3).
+            Arrays are letterboxed with numpy/cv2 and never touch PIL.
+        out: numpy.ndarray
+            Optional (1, height, width, 3) destination, e.g. a slot of a
+            batch. Defaults to this thread's reused input buffer.
+        :Returns:
+        -------
+        template_input: numpy.ndarray
+            ``out`` filled with the model input.
+        template_image: PIL.Image
+            Padded input image, None for numpy input.
+        thumbnail: PIL.Image or numpy.ndarray
+            Proportionately resized image, same type as img.
+        '''
+
+        with metrics.time('preprocess'):
+            if out is None:
+                out = self.input_buffer()
+            floating_model = self._tfengine.input_details[0]['dtype'] == np.float32
+
+            if isinstance(img, np.ndarray):
+                thumbnail = self.letterbox(img, out[0], normalize=floating_model)
+                return out, None, thumbnail
+
+            _tensor_input_size = (self._tensor_image_width,
+                                  self._tensor_image_height)
+
+            # thumbnail is a proportionately resized image
+            thumbnail = self.thumbnail(image=img,
+                                       desired_size=_tensor_input_size)
+
+            # convert thumbnail into an image with the exact size
+            # as the input tensor preserving proportions by padding with
+            # a solid color as needed
+            template_image = self.resize(image=thumbnail,
+                                    desired_size=_tensor_input_size)
+
+            out[0] = np.asarray(template_image)
+            if floating_model:
+                out -= 127.5
+                out /= 127.5
+
+            return out, template_image, thumbnail
 
 
     def execute_model(self, img):
@@ -45,56 +127,132 @@ class Posenet_MobileNet(AbstractPoseModel):
         
         :Parameters:
         ----------
-        img: PIL.Image
+        img: PIL.Image or numpy.ndarray
             Input Image for AI model detection.
         :Returns:
         -------
         kps:
             A list of Pose objects with keypoints and confidence scores
         template_image: PIL.Image
-            Input resized image.
-        thumbnail: PIL.Image
+            Input resized image, None for numpy input.
+        thumbnail: PIL.Image or numpy.ndarray
             Thumbnail input image
         _inference_time: float
             Model inference time in seconds
         '''
 
-        _tensor_input_size = (self._tensor_image_width,
-                              self._tensor_image_height)
+        template_input, template_image, thumbnail = self.prepare_input(img)
 
-        # thumbnail is a proportionately resized image
-        thumbnail = self.thumbnail(image=img,
-                                   desired_size=_tensor_input_size)
+        start_time = time.perf_counter()
 
-        # convert thumbnail into an image with the exact size
-        # as the input tensor preserving proportions by padding with
-        # a solid color as needed
-        template_image = self.resize(image=thumbnail,
-                                desired_size=_tensor_input_size)
+        with self._tfengine.checkout() as interpreter:
+            interpreter.set_tensor(self._tfengine.input_details[0]['index'],
+                                   template_input)
+            with metrics.time('invoke'):
+                interpreter.invoke()
 
-        start_time = time.process_time()
+            template_output_data = interpreter.\
+                get_tensor(self._tfengine.output_details[0]['index'])
+            template_offset_data = interpreter.\
+                get_tensor(self._tfengine.output_details[1]['index'])
 
-        template_input = np.expand_dims(template_image.copy(), axis=0)
-        floating_model = self._tfengine.input_details[0]['dtype'] == np.float32
+        template_heatmaps = np.squeeze(template_output_data)
+        template_offsets = np.squeeze(template_offset_data)
 
-        if floating_model:
-            template_input = (np.float32(template_input) - 127.5) / 127.5
+        with metrics.time('parse'):
+            kps = self.parse_output(template_heatmaps, template_offsets)
 
-        self.tf_interpreter().\
-            set_tensor(self._tfengine.input_details[0]['index'],
-                       template_input)
-        self.tf_interpreter().invoke()
+        _inference_time = time.perf_counter() - start_time
 
-        template_output_data = self.tf_interpreter().\
-            get_tensor(self._tfengine.output_details[0]['index'])
-        template_offset_data = self.tf_interpreter().\
-            get_tensor(self._tfengine.output_details[1]['index'])
+        return kps, template_image, thumbnail, _inference_time
 
-        template_heatmaps = np.squeeze(template_output_data)
-        template_offsets = np.squeeze(template_offset_data)
 
-        kps = self.parse_output(template_heatmaps, template_offsets)
+    def execute_model_batch(self, imgs):
+        ''' Run TFLite model once on a batch of images.
 
-        _inference_time = time.process_time() - start_time
+        The interpreter input is resized to the number of images and all
+        heatmaps are decoded in one vectorized pass.
+        :Parameters:
+        ----------
+        imgs: list of PIL.Image
+            Input Images for AI model detection.
+        :Returns:
+        -------
+        kps: numpy.ndarray
+            Keypoints of shape (len(imgs), 17, 3)
+        template_images: list of PIL.Image
+        thumbnails: list of PIL.Image
+        _inference_time: float
+            Model inference time in seconds for the whole batch
+        '''
+
+        batch_input = np.empty((len(imgs), self._tensor_image_height,
+                                self._tensor_image_width,
+                                self._tensor_image_depth),
+                               dtype=self._tfengine.input_details[0]['dtype'])
+        prepared = [self.prepare_input(img, out=batch_input[i:i + 1])
+                    for i, img in enumerate(imgs)]
+
+        start_time = time.perf_counter()
+
+        kps = self.execute_model_tensors(batch_input)
+
+        _inference_time = time.perf_counter() - start_time
+
+        return kps, [p[1] for p in prepared], [p[2] for p in prepared], \
+            _inference_time
+
+
+    def execute_model_tensors(self, batch_input):
+        ''' Run TFLite model on already prepared input tensors.
+
+        :Parameters:
+        ----------
+        batch_input: numpy.ndarray
+            Model input of shape (N, height, width, 3) as returned
+            by :func:`prepare_input`.
+        :Returns:
+        -------
+        kps: numpy.ndarray
+            Keypoints of shape (N, 17, 3)
+        '''
+
+        count = batch_input.shape[0]
+        # interpreters have a fixed batch size, pad up to one of them
+        batch_size = self._tfengine.padded_batch_size(count)
+        if batch_size > count:
+            padded = np.zeros((batch_size,) + batch_input.shape[1:],
+                              dtype=batch_input.dtype)
+            padded[:count] = batch_input
+            batch_input = padded
+        with self._tfengine.checkout(batch_size=batch_size) as interpreter:
+            interpreter.set_tensor(self._tfengine.input_details[0]['index'],
+                                   np.ascontiguousarray(batch_input))
+            with metrics.time('invoke'):
+                interpreter.invoke()
+
+            batch_heatmaps = interpreter.\
+                get_tensor(self._tfengine.output_details[0]['index'])
+            batch_offsets = interpreter.\
+                get_tensor(self._tfengine.output_details[1]['index'])
 
-        return kps, template_image, thumbnail, _inference_time
\ No newline at end of file
+        with metrics.time('parse'):
+            return decode_heatmaps(batch_heatmaps[:count],
+                                   batch_offsets[:count],
+                                   self._tensor_image_height)
+
+
+    @staticmethod
+    def rotate_input(template_input, angle):
+        '''Rotate a prepared (N, height, width, 3) input tensor.
+
+        :Parameters:
+        ----------
+        angle:
+            None, PIL.Image.ROTATE_90 (counter clockwise) or
+            PIL.Image.ROTATE_270 (clockwise).
+        '''
+        if angle is None:
+            return template_input
+        k = 1 if angle == Image.ROTATE_90 else 3
+        return np.rot90(template_input, k=k, axes=(1, 2))
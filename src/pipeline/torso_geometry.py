@@ -0,0 +1,231 @@
+"""Vectorized shoulder-hip geometry used by the fall detector.
+
+The torso of a pose is the four keypoints of ``TORSO_KEYPOINTS`` as a
+(4, 2) array of x, y coordinates and a (4,) array of their scores. The
+rows form two lines, left shoulder-hip and right shoulder-hip. A line
+that was not detected with enough confidence has NaN coordinates.
+
+Every function accepts any number of leading dimensions, so the same
+code scores a single frame, a pair of frames or a whole recorded
+sequence of shape (T, 4, 2).
+"""
+from collections.abc import Mapping
+
+import numpy as np
+from src.pipeline.pose_engine import KEYPOINT_INDEX, SCORE, X
+
+TORSO_KEYPOINTS = ('left shoulder', 'left hip', 'right shoulder', 'right hip')
+# their rows in Pose.array
+TORSO_ROWS = [KEYPOINT_INDEX[k] for k in TORSO_KEYPOINTS]
+
+# score penalty when only one shoulder-hip line is detected
+SINGLE_LINE_PENALTY = 0.9
+
+
+class Torso:
+    """Torso keypoint coordinates and scores of one pose."""
+    __slots__ = ['xy', 'scores']
+
+    def __init__(self, xy, scores):
+        self.xy = xy
+        self.scores = scores
+
+    @classmethod
+    def from_pose(cls, pose):
+        rows = pose.array[TORSO_ROWS].astype(np.float64)
+        return cls(rows[:, X:SCORE], rows[:, SCORE])
+
+    def __repr__(self):
+        return 'Torso({}, {})'.format(self.xy.tolist(), self.scores.tolist())
+
+
+class TorsoKeypoints(Mapping):
+    """Detected torso keypoints of a pose as a read-only mapping.
+
+    Maps the names of the keypoints of detected shoulder-hip lines to
+    [x, y] views into the pose array, so no dict is built per frame and
+    the mapping follows any rotation back or rescaling of the pose. Use
+    :func:`torso_xy` for the array form.
+    """
+    __slots__ = ['array', 'detected']
+
+    def __init__(self, array, detected):
+        """
+        :Parameters:
+        ----------
+        array: numpy.ndarray
+            (17, 3) Pose.array.
+        detected: numpy.ndarray
+            (2,) bool [left, right] as returned by
+            :func:`spinal_vector_score`.
+        """
+        self.array = array
+        self.detected = detected
+
+    def __getitem__(self, name):
+        try:
+            i = TORSO_KEYPOINTS.index(name)
+        except ValueError:
+            raise KeyError(name)
+        if not self.detected[i // 2]:
+            raise KeyError(name)
+        return self.array[TORSO_ROWS[i], X:SCORE]
+
+    def __iter__(self):
+        return (name for i, name in enumerate(TORSO_KEYPOINTS)
+                if self.detected[i // 2])
+
+    def __len__(self):
+        return 2 * int(np.count_nonzero(self.detected))
+
+    def xy(self):
+        """(4, 2) float64 array, NaN for undetected lines."""
+        return mask_lines(self.array[TORSO_ROWS, X:SCORE], self.detected)
+
+    def __repr__(self):
+        return 'TorsoKeypoints({})'.format(
+            {name: self[name].tolist() for name in self})
+
+
+def torso_xy(pose_dix):
+    """(4, 2) float64 array of a keypoint dict, NaN for missing keypoints."""
+    if isinstance(pose_dix, TorsoKeypoints):
+        return pose_dix.xy()
+    xy = np.full((len(TORSO_KEYPOINTS), 2), np.nan)
+    for i, name in enumerate(TORSO_KEYPOINTS):
+        corr = pose_dix.get(name)
+        if corr is not None:
+            xy[i] = corr[0], corr[1]
+    return xy
+
+
+def _lines(xy):
+    """(..., 4, 2) -> (..., 2, 2, 2): [left, right] x [shoulder, hip] x xy."""
+    return xy.reshape(xy.shape[:-2] + (2, 2, 2))
+
+
+def spinal_vector_score(scores, threshold):
+    """Spinal vector score and detected lines of torso keypoint scores.
+
+    A line counts as detected when both of its keypoints score above
+    ``threshold``, its score is the lower of the two. The spinal vector
+    score is the mean of both line scores, or the score of the single
+    detected line less a 10% penalty, or 0.
+
+    Returns (score (...,), detected (..., 2) bool [left, right]).
+    """
+    scores = np.asarray(scores, np.float64)
+    line_scores = scores.reshape(scores.shape[:-1] + (2, 2)).min(axis=-1)
+    detected = line_scores > threshold
+    left, right = line_scores[..., 0], line_scores[..., 1]
+    score = np.where(detected[..., 0] & detected[..., 1],
+                     (left + right) / 2.0,
+                     np.where(detected[..., 0], left * SINGLE_LINE_PENALTY,
+                              np.where(detected[..., 1],
+                                       right * SINGLE_LINE_PENALTY, 0.0)))
+    return score, detected
+
+
+def mask_lines(xy, detected):
+    """Set the coordinates of undetected lines to NaN."""
+    xy = np.array(xy, np.float64)
+    lines = _lines(xy)
+    lines[~np.asarray(detected)] = np.nan
+    return xy
+
+
+def segment_angle(points):
+    """Angle in degrees of (..., 2, 2) [start, end] x [x, y] segments.
+
+    Measured as atan2(end y - start y, start x - end x), image y pointing
+    down. NaN for segments with missing points.
+    """
+    points = np.asarray(points, np.float64)
+    d = points[..., 1, :] - points[..., 0, :]
+    return np.degrees(np.arctan2(d[..., 1], -d[..., 0]))
+
+
+def line_angles(xy):
+    """Angle of the left and right shoulder-hip lines, (..., 2)."""
+    return segment_angle(_lines(np.asarray(xy, np.float64)))
+
+
+def angles_with_yaxis(xy):
+    """Angle between each shoulder-hip line and the vertical axis, (..., 2).
+
+    0 for missing lines.
+    """
+    # the y axis, pointing down the image, has an angle of 90 degrees
+    return np.nan_to_num(np.abs(90.0 - line_angles(xy)))
+
+
+def leaning_angle(prev_xy, xy):
+    """Largest change of the shoulder-hip line angles between two torsos.
+
+    Only lines present in both are compared, 0 when there is none.
+    """
+    change = np.abs(line_angles(prev_xy) - line_angles(xy))
+    return np.nan_to_num(change).max(axis=-1)
+
+
+def motion_downward(yaxis_angles, prev_yaxis_angles):
+    """True where a line present in both frames tilted further from vertical."""
+    angles = np.asarray(yaxis_angles)
+    prev = np.asarray(prev_yaxis_angles)
+    return np.any((angles > 0) & (prev > 0) & (angles > prev), axis=-1)
+
+
+def sequence_features(xy, scores, threshold, lags=(1, 2)):
+    """Fall detection features of a sequence of torsos in one pass.
+
+    :Parameters:
+    ----------
+    xy: array (T, 4, 2)
+        Torso keypoint coordinates of consecutive frames, in the order of
+        ``TORSO_KEYPOINTS``.
+    scores: array (T, 4)
+        Their keypoint scores.
+    threshold: float
+        Keypoint score a line needs to be used, the detector
+        confidence_threshold.
+    lags: tuple
+        Frame distances to compare, the live detector looks back at t-1
+        and t-2.
+
+    Returns a dict of arrays: ``spinal_score`` (T,), ``detected`` (T, 2),
+    ``yaxis_angles`` (T, 2) and, per lag along the last axis,
+    ``leaning_angle`` (T, len(lags)) and ``downward`` (T, len(lags)).
+    Frames without a predecessor at a lag get 0 and False.
+    """
+    score, detected = spinal_vector_score(scores, threshold)
+    xy = mask_lines(xy, detected)
+    yaxis = angles_with_yaxis(xy)
+    count = xy.shape[0]
+    leaning = np.zeros((count, len(lags)))
+    downward = np.zeros((count, len(lags)), bool)
+    for i, lag in enumerate(lags):
+        if lag < count:
+            leaning[lag:, i] = leaning_angle(xy[:-lag], xy[lag:])
+            downward[lag:, i] = motion_downward(yaxis[lag:], yaxis[:-lag])
+    return {
+        'spinal_score': score,
+        'detected': detected,
+        'yaxis_angles': yaxis,
+        'leaning_angle': leaning,
+        'downward': downward,
+    }
+
+
+def fall_scores(features, fall_factor, lags=(1, 2)):
+    """Fall score per frame and lag from :func:`sequence_features`.
+
+    The score is the mean spinal score of both frames when the body line
+    moved downward and leaned more than ``fall_factor`` degrees, else 0.
+    """
+    score = features['spinal_score']
+    result = np.zeros(features['leaning_angle'].shape)
+    for i, lag in enumerate(lags):
+        if lag < len(score):
+            result[lag:, i] = (score[:-lag] + score[lag:]) / 2
+    leaning = features['leaning_angle'] > fall_factor
+    return np.where(leaning & features['downward'], result, 0.0)
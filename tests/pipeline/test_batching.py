@@ -0,0 +1,122 @@
+"""Test micro-batching of pose detection requests."""
+import sys
+import os
+sys.path.append(os.path.abspath('.'))
+
+import threading
+import pytest
+from src.pipeline.batching import MicroBatchingPoseEngine
+
+
+class _RecordingPoseEngine:
+    confidence_threshold = 0.5
+    _tensor_image_height = 257
+    _tensor_image_width = 257
+    keypoint_cache = None
+
+    def __init__(self):
+        self.batch_sizes = []
+        self.rotated = []
+
+    def detect_poses_batch(self, images):
+        self.batch_sizes.append(len(images))
+        return [([img], None, 1.0) for img in images]
+
+    # tensor rotation mode
+    def prepare_input(self, img):
+        return ('tensor', img), None, 'thumb'
+
+    def detect_poses_prepared(self, prepared):
+        self.batch_sizes.append(len(prepared))
+        return [([tensor[1]], thumbnail, 1.0)
+                for tensor, _, thumbnail in prepared]
+
+    def detect_poses_rotated(self, img, angles, batched=True, prepared=None):
+        assert prepared is not None, 'rotations reuse the prepared input'
+        for angle in angles:
+            self.rotated.append(angle)
+            yield angle, [img], 'thumb', 0.0
+
+
+def test_concurrent_requests_share_a_batch():
+    """Requests arriving within the window are served by one batch call."""
+    engine = _RecordingPoseEngine()
+    batcher = MicroBatchingPoseEngine(engine, window=0.2, max_batch_size=4)
+    results = {}
+
+    def request(i):
+        results[i] = batcher.detect_poses(i)
+
+    threads = [threading.Thread(target=request, args=(i,)) for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    batcher.shutdown()
+
+    assert sum(engine.batch_sizes) == 4
+    assert len(engine.batch_sizes) < 4
+    for i in range(4):
+        assert results[i][0] == [i]
+
+
+def test_batch_errors_reach_every_caller():
+    class _FailingPoseEngine(_RecordingPoseEngine):
+        def detect_poses_batch(self, images):
+            raise RuntimeError('invoke failed')
+
+    batcher = MicroBatchingPoseEngine(_FailingPoseEngine(), window=0.001)
+    try:
+        batcher.detect_poses('img')
+        assert False, 'expected RuntimeError'
+    except RuntimeError:
+        pass
+    batcher.shutdown()
+
+
+def test_upright_tensors_of_concurrent_callers_share_a_batch():
+    """In tensor rotation mode the upright search goes through the queue,
+    only the rotated retries run directly."""
+    engine = _RecordingPoseEngine()
+    batcher = MicroBatchingPoseEngine(engine, window=0.2, max_batch_size=4)
+    results = {}
+
+    def request(i):
+        search = batcher.detect_poses_rotated(i, (None, 90, 270),
+                                              batched=False)
+        results[i] = next(search)
+        if i == 0:
+            # no good upright pose, try the rotations
+            results['rotated'] = list(search)
+
+    threads = [threading.Thread(target=request, args=(i,)) for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    batcher.shutdown()
+
+    assert sum(engine.batch_sizes) == 4
+    assert len(engine.batch_sizes) < 4
+    for i in range(4):
+        assert results[i] == (None, [i], 'thumb', 1.0)
+    assert [r[0] for r in results['rotated']] == [90, 270]
+    assert engine.rotated == [90, 270]
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='needs os.fork')
+def test_workers_are_restarted_after_a_fork():
+    """Under gunicorn --preload the batcher is created before the fork."""
+    engine = _RecordingPoseEngine()
+    batcher = MicroBatchingPoseEngine(engine, window=0.01)
+    pid = os.fork()
+    if pid == 0:
+        batcher.after_fork()
+        worker = threading.Thread(target=batcher.detect_poses, args=(1,),
+                                  daemon=True)
+        worker.start()
+        worker.join(5)
+        os._exit(1 if worker.is_alive() else 0)
+    _, status = os.waitpid(pid, 0)
+    batcher.shutdown()
+    assert os.WIFEXITED(status) and os.WEXITSTATUS(status) == 0
@@ -0,0 +1,67 @@
+"""Test the opt-in diagnostic frame capture."""
+import sys
+import os
+sys.path.append(os.path.abspath('.'))
+
+import threading
+import pytest
+import numpy as np
+from src.pipeline.diagnostics import DiagnosticCapture
+
+
+def _frame(value=0):
+    return np.full((8, 8, 3), value, np.uint8)
+
+
+def test_samples_every_nth_frame(tmp_path):
+    capture = DiagnosticCapture(every=3, directory=tmp_path)
+    assert [capture.sample() for _ in range(7)] == \
+        [False, False, True, False, False, True, False]
+
+
+def test_ring_keeps_the_newest_files(tmp_path):
+    capture = DiagnosticCapture(every=1, ring_size=3, directory=tmp_path)
+    for i in range(5):
+        capture.submit(_frame(i), 'NORMAL')
+        capture.flush()
+    names = sorted(p.name for p in tmp_path.iterdir())
+    assert names == ['diag-00000002-NORMAL.jpg', 'diag-00000003-NORMAL.jpg',
+                     'diag-00000004-NORMAL.jpg']
+    assert capture.written == 5
+
+    # a new capture resumes the ring on disk
+    capture = DiagnosticCapture(every=1, ring_size=3, directory=tmp_path)
+    capture.submit(_frame(), 'FALL')
+    capture.flush()
+    names = sorted(p.name for p in tmp_path.iterdir())
+    assert names == ['diag-00000003-NORMAL.jpg', 'diag-00000004-NORMAL.jpg',
+                     'diag-00000005-FALL.jpg']
+
+
+def test_submit_drops_instead_of_blocking(tmp_path):
+    capture = DiagnosticCapture(every=1, directory=tmp_path, queue_size=1)
+    release = threading.Event()
+    save = capture._save
+    capture._save = lambda *args: (release.wait(), save(*args))
+    for _ in range(5):
+        capture.submit(_frame())
+    assert capture.dropped >= 3
+    release.set()
+    capture.flush()
+    assert capture.written + capture.dropped == 5
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='needs os.fork')
+def test_writer_is_restarted_after_a_fork(tmp_path):
+    capture = DiagnosticCapture(every=1, directory=tmp_path)
+    pid = os.fork()
+    if pid == 0:
+        capture.after_fork()
+        capture.submit(_frame(), 'CHILD')
+        writer = threading.Thread(target=capture.flush, daemon=True)
+        writer.start()
+        writer.join(5)
+        os._exit(1 if writer.is_alive() else 0)
+    _, status = os.waitpid(pid, 0)
+    assert os.WIFEXITED(status) and os.WEXITSTATUS(status) == 0
+    assert [p.name for p in tmp_path.iterdir()] == ['diag-00000000-CHILD.jpg']
@@ -0,0 +1,159 @@
+"""Test rotated pose search modes of the fall detector."""
+import sys
+import os
+sys.path.append(os.path.abspath('.'))
+
+from contextlib import contextmanager
+import numpy as np
+import pytest
+from PIL import Image
+from src.pipeline.fall_detect import FallDetector
+
+
+class _SpotInterpreter:
+    """Stand-in for a PoseNet interpreter.
+
+    Every joint is placed on the brightest pixel of the input. Scores are
+    high only when that pixel lies below the image diagonal, so an upright
+    frame with a spot in the upper right corner needs a rotation to be
+    accepted.
+    """
+
+    def __init__(self):
+        self.invocations = 0
+        self.batch_sizes = []
+
+    def resize_tensor_input(self, index, shape):
+        pass
+
+    def allocate_tensors(self):
+        pass
+
+    def set_tensor(self, index, data):
+        self._input = np.array(data)
+
+    def invoke(self):
+        self.invocations += 1
+        n = self._input.shape[0]
+        self.batch_sizes.append(n)
+        heatmaps = np.full((n, 9, 9, 17), -20, np.float32)
+        offsets = np.zeros((n, 9, 9, 34), np.float32)
+        for b in range(n):
+            y, x = np.unravel_index(np.argmax(self._input[b].sum(-1)),
+                                    self._input.shape[1:3])
+            gy, gx = round(y / 257 * 8), round(x / 257 * 8)
+            heatmaps[b, gy, gx, :] = 10 if y > x else -10
+            offsets[b, gy, gx, :17] = y - int(gy / 8 * 257)
+            offsets[b, gy, gx, 17:] = x - int(gx / 8 * 257)
+        self._output = [heatmaps, offsets]
+
+    def get_tensor(self, index):
+        return self._output[index]
+
+
+class _SpotEngine:
+    confidence_threshold = 0.6
+    input_details = [{'shape': np.array([1, 257, 257, 3]),
+                      'dtype': np.float32, 'index': 0}]
+    output_details = [{'index': 0}, {'index': 1}]
+
+    def __init__(self):
+        self.interpreter = _SpotInterpreter()
+
+    @contextmanager
+    def checkout(self, timeout=None, batch_size=1):
+        yield self.interpreter
+
+    @staticmethod
+    def padded_batch_size(batch_size):
+        return 1 << (batch_size - 1).bit_length()
+
+
+def _spot_image():
+    img = np.zeros((100, 200, 3), np.uint8)
+    img[18:23, 148:153] = 255
+    return Image.fromarray(img)
+
+
+@pytest.mark.parametrize('rotation_mode', ['image', 'tensor', 'batched'])
+def test_rotated_keypoints_map_back_to_original(rotation_mode):
+    """All modes find the rotated pose and map it back to the same spot."""
+    engine = _SpotEngine()
+    fall_detector = FallDetector(tfengine=engine,
+                                 model_name='mobilenet',
+                                 confidence_threshold=0.6,
+                                 rotation_mode=rotation_mode)
+    pose, thumbnail, score, pose_dix = \
+        fall_detector.find_keypoints(_spot_image())
+
+    assert pose is not None
+    assert score > 0.6
+    # the spot spans 5 pixels, allow for resampling and pixel rounding
+    x, y = pose_dix['left shoulder']
+    assert abs(x - 150) <= 4
+    assert abs(y - 20) <= 4
+
+
+def test_batched_mode_invokes_once():
+    engine = _SpotEngine()
+    fall_detector = FallDetector(tfengine=engine,
+                                 model_name='mobilenet',
+                                 confidence_threshold=0.6,
+                                 rotation_mode='batched')
+    fall_detector.find_keypoints(_spot_image())
+    # three orientations, padded to the interpreter batch size
+    assert engine.interpreter.batch_sizes == [4]
+
+
+def test_tensor_mode_stops_early():
+    """The first rotation is accepted, the second is never inferred."""
+    engine = _SpotEngine()
+    fall_detector = FallDetector(tfengine=engine,
+                                 model_name='mobilenet',
+                                 confidence_threshold=0.6,
+                                 rotation_mode='tensor')
+    fall_detector.find_keypoints(_spot_image())
+    assert engine.interpreter.batch_sizes == [1, 1]
+
+
+@pytest.mark.parametrize('rotation_mode', ['image', 'tensor', 'batched'])
+def test_keypoint_cache_skips_inference(tmp_path, rotation_mode):
+    """A second detector over the same frame is served from the cache."""
+    from src.pipeline.keypoint_cache import KeypointCache
+
+    model = tmp_path / 'model.tflite'
+    model.write_bytes(b'spot')
+    results = []
+    invocations = []
+    for _ in range(2):
+        engine = _SpotEngine()
+        fall_detector = FallDetector(
+            tfengine=engine, model_name='mobilenet',
+            confidence_threshold=0.6, rotation_mode=rotation_mode,
+            keypoint_cache=KeypointCache(str(model), tmp_path / 'cache'))
+        pose, _, score, pose_dix = \
+            fall_detector.find_keypoints(_spot_image())
+        results.append((score, tuple(pose_dix['left shoulder'])))
+        invocations.append(engine.interpreter.invocations)
+
+    assert invocations[0] > 0
+    assert invocations[1] == 0
+    assert results[0] == results[1]
+
+
+def test_diagnostic_capture_writes_annotated_frames(tmp_path):
+    from src.pipeline.diagnostics import DiagnosticCapture
+
+    capture = DiagnosticCapture(every=2, directory=tmp_path)
+    fall_detector = FallDetector(tfengine=_SpotEngine(),
+                                 model_name='mobilenet',
+                                 confidence_threshold=0.6,
+                                 rotation_mode='tensor',
+                                 diagnostics=capture)
+    fall_detector.min_time_between_frames = 0
+    for _ in range(4):
+        fall_detector.fall_detect(image=_spot_image())
+    capture.flush()
+    names = sorted(p.name for p in tmp_path.iterdir())
+    assert len(names) == 2
+    assert all('-NORMAL-score-' in name for name in names)
@@ -0,0 +1,105 @@
+"""Test TFLite interpreter pool."""
+import sys
+import os
+sys.path.append(os.path.abspath('.'))
+
+import threading
+import time
+import pytest
+from src.pipeline.inference import InterpreterPool
+
+
+def test_checkout_is_exclusive():
+    """An interpreter is lent to a single caller at a time."""
+    pool = InterpreterPool([object(), object()])
+    in_use = set()
+    overlaps = []
+    lock = threading.Lock()
+
+    def worker():
+        for _ in range(20):
+            with pool.checkout() as interpreter:
+                with lock:
+                    if interpreter in in_use:
+                        overlaps.append(interpreter)
+                    in_use.add(interpreter)
+                time.sleep(0.001)
+                with lock:
+                    in_use.discard(interpreter)
+
+    threads = [threading.Thread(target=worker) for _ in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not overlaps
+
+
+def test_checkout_returns_interpreter_on_error():
+    pool = InterpreterPool([object()])
+    with pytest.raises(RuntimeError):
+        with pool.checkout():
+            raise RuntimeError('inference failed')
+    with pool.checkout(timeout=0.1) as interpreter:
+        assert interpreter is pool.interpreters[0]
+
+
+def test_acquire_timeout():
+    pool = InterpreterPool([object()])
+    pool.acquire()
+    with pytest.raises(TimeoutError):
+        pool.acquire(timeout=0.01)
+
+
+def test_backend_selection(monkeypatch):
+    from src.pipeline import inference
+    monkeypatch.setenv('TFLITE_BACKEND', 'tensorflow')
+    assert inference._backend_order() == ('tensorflow',)
+    assert not inference.slim_backend_available()
+    monkeypatch.setenv('TFLITE_BACKEND', 'auto')
+    assert inference._backend_order() == inference.BACKENDS
+    with pytest.raises(ValueError):
+        inference._backend_order('caffe')
+
+
+def test_thread_candidates_share_cores_between_pooled_interpreters():
+    from src.pipeline.inference import thread_candidates
+    assert thread_candidates(pool_size=1, cpu_count=6) == [1, 2, 4, 6]
+    assert thread_candidates(pool_size=2, cpu_count=8) == [1, 2, 4]
+    assert thread_candidates(pool_size=8, cpu_count=4) == [1]
+
+
+def test_default_pool_size_leaves_threads_to_tune():
+    from src.pipeline.inference import default_pool_size, thread_candidates
+    assert default_pool_size(cpu_count=1) == 1
+    assert default_pool_size(cpu_count=2) == 1
+    assert default_pool_size(cpu_count=8) == 4
+    assert default_pool_size(cpu_count=32) == 4
+    for cpu_count in (2, 4, 8, 16):
+        pool_size = default_pool_size(cpu_count=cpu_count)
+        assert len(thread_candidates(pool_size, cpu_count=cpu_count)) > 1
+
+
+def test_pool_grows_on_demand_up_to_max_size():
+    created = []
+
+    def factory():
+        created.append(object())
+        return created[-1]
+
+    pool = InterpreterPool(factory=factory, max_size=2)
+    first = pool.acquire()
+    second = pool.acquire()
+    assert len(created) == 2
+    with pytest.raises(TimeoutError):
+        pool.acquire(timeout=0.01)
+    pool.release(first)
+    assert pool.acquire(timeout=0.1) is first
+    pool.release(second)
+    assert pool.size == 2
+
+
+def test_batches_are_padded_to_powers_of_two():
+    from src.pipeline.inference import TFInferenceEngine
+    sizes = [TFInferenceEngine.padded_batch_size(n) for n in range(1, 10)]
+    assert sizes == [1, 2, 4, 4, 8, 8, 8, 8, 16]
@@ -0,0 +1,65 @@
+"""Test the on-disk keypoint cache."""
+import sys
+import os
+sys.path.append(os.path.abspath('.'))
+
+import numpy as np
+from PIL import Image
+from src.pipeline.keypoint_cache import KeypointCache, image_hash
+
+
+def _cache(tmp_path):
+    model = tmp_path / 'model.tflite'
+    model.write_bytes(b'model')
+    return KeypointCache(str(model), tmp_path / 'cache')
+
+
+def test_keys_differ_by_content_and_rotation(tmp_path):
+    cache = _cache(tmp_path)
+    img = np.zeros((4, 6, 3), np.uint8)
+    other = img.copy()
+    other[0, 0, 0] = 1
+    assert cache.key(img) == cache.key(img.copy())
+    assert cache.key(img) != cache.key(other)
+    assert cache.key(img) != cache.key(img, Image.ROTATE_90)
+    assert cache.key(img, Image.ROTATE_90) != \
+        cache.key(img, Image.ROTATE_270)
+
+
+def test_pil_and_numpy_frames_hash_by_geometry():
+    img = np.zeros((4, 6, 3), np.uint8)
+    assert image_hash(img) != image_hash(img.reshape(6, 4, 3))
+    assert image_hash(Image.fromarray(img)) == \
+        image_hash(Image.fromarray(img.copy()))
+
+
+def test_put_get_round_trip(tmp_path):
+    cache = _cache(tmp_path)
+    kps = np.random.rand(1, 17, 3).astype(np.float32)
+    key = cache.key(np.ones((2, 2, 3), np.uint8))
+    assert cache.get(key) is None
+    cache.put(key, kps)
+    np.testing.assert_array_equal(cache.get(key), kps)
+    assert (cache.hits, cache.misses) == (1, 1)
+    # no temporary files are left behind
+    assert not list(cache.directory.rglob('*.tmp'))
+
+
+def test_cache_is_scoped_by_model(tmp_path):
+    cache = _cache(tmp_path)
+    key = cache.key(np.ones((2, 2, 3), np.uint8))
+    cache.put(key, np.zeros((1, 17, 3), np.float32))
+    other_model = tmp_path / 'other.tflite'
+    other_model.write_bytes(b'other model')
+    other = KeypointCache(str(other_model), tmp_path / 'cache')
+    assert other.get(key) is None
+
+
+def test_unwritable_cache_is_only_logged(tmp_path):
+    cache = _cache(tmp_path)
+    key = cache.key(np.ones((2, 2, 3), np.uint8))
+    # a file where the shard directory should be, mkdir fails
+    cache.directory.mkdir(parents=True, exist_ok=True)
+    (cache.directory / key[:2]).write_bytes(b'')
+    cache.put(key, np.zeros((1, 17, 3), np.float32))
+    assert cache.get(key) is None
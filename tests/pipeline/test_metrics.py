@@ -0,0 +1,40 @@
+"""Test pipeline latency metrics."""
+import sys
+import os
+sys.path.append(os.path.abspath('.'))
+
+import time
+from src.pipeline.metrics import PipelineMetrics, Histogram
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram(buckets=(0.01, 0.1))
+    for seconds in (0.005, 0.05, 0.05, 5):
+        histogram.observe(seconds)
+    cumulative, total, count = histogram.snapshot()
+    assert cumulative == [1, 3, 4]
+    assert count == 4
+    assert abs(total - 5.105) < 1e-9
+
+
+def test_stage_timer_records_wall_clock():
+    metrics = PipelineMetrics(stages=('invoke',))
+    with metrics.time('invoke'):
+        time.sleep(0.01)
+    _, total, count = metrics.histogram('invoke').snapshot()
+    assert count == 1
+    assert total >= 0.01
+
+
+def test_prometheus_text_format():
+    metrics = PipelineMetrics(stages=('decode',), buckets=(0.001,))
+    metrics.observe('decode', 0.0005)
+    metrics.inc('rotation_retries', 2)
+    text = metrics.render_prometheus()
+    assert '# TYPE orion_stage_seconds histogram' in text
+    assert 'orion_stage_seconds_bucket{stage="decode",le="0.001"} 1' in text
+    assert 'orion_stage_seconds_bucket{stage="decode",le="+Inf"} 1' in text
+    assert 'orion_stage_seconds_count{stage="decode"} 1' in text
+    assert '# TYPE orion_rotation_retries_total counter' in text
+    assert 'orion_rotation_retries_total 2' in text
+    assert text.endswith('\n')
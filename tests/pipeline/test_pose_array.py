@@ -0,0 +1,72 @@
+"""Test the array-backed Pose representation."""
+import sys
+import os
+sys.path.append(os.path.abspath('.'))
+
+import numpy as np
+import pytest
+from PIL import Image
+from src.pipeline.pose_engine import (KEYPOINTS, LEFT_HIP, LEFT_SHOULDER,
+                                      SCORE, X, Y, Keypoint, Pose)
+
+
+def _model_output():
+    # y, x, score rows like the model returns them
+    kps = np.zeros((len(KEYPOINTS), 3), np.float32)
+    kps[:, 0] = np.arange(len(KEYPOINTS)) * 10      # y
+    kps[:, 1] = np.arange(len(KEYPOINTS)) * 10 + 5  # x
+    kps[:, 2] = 0.5
+    return kps
+
+
+def test_from_model_output_swaps_to_xy():
+    pose = Pose.from_model_output(_model_output(), 0.8)
+    assert pose.array.dtype == np.float32
+    assert pose.array[LEFT_SHOULDER].tolist() == [55, 50, 0.5]
+    assert pose.score == 0.8
+
+
+def test_keypoints_view_writes_through():
+    pose = Pose.from_model_output(_model_output())
+    keypoint = pose.keypoints['left hip']
+    assert keypoint.k == 'left hip'
+    assert list(keypoint.yx) == [115, 110]
+    assert keypoint.score == pytest.approx(0.5)
+    keypoint.yx[0] = 1
+    assert pose.array[LEFT_HIP, X] == 1
+    assert list(pose.keypoints) == list(KEYPOINTS)
+
+
+def test_pose_from_keypoint_dict():
+    keypoints = {k: Keypoint(k, [i, i + 1], 0.25)
+                 for i, k in enumerate(KEYPOINTS)}
+    pose = Pose(keypoints, 0.5)
+    assert pose.array[LEFT_SHOULDER].tolist() == [5, 6, 0.25]
+
+
+@pytest.mark.parametrize('angle', [Image.ROTATE_90, Image.ROTATE_270])
+def test_rotate_back_inverts_the_rotation(angle):
+    """A point of a rotated input maps back to where PIL took it from."""
+    # rotated model inputs are square tensors
+    img = np.zeros((40, 40), np.uint8)
+    img[7, 12] = 255
+    rotated = np.asarray(Image.fromarray(img).transpose(angle))
+    ry, rx = np.argwhere(rotated)[0]
+
+    pose = Pose(np.zeros((len(KEYPOINTS), 3), np.float32))
+    pose.array[:, X], pose.array[:, Y] = rx, ry
+    # pixel centres, the formulas map continuous coordinates
+    pose.array[:, X:SCORE] += 0.5
+    pose.rotate_back(angle, rotated.shape[1], rotated.shape[0])
+    np.testing.assert_allclose(pose.array[0, X:SCORE], [12.5, 7.5])
+
+
+def test_rotate_back_without_rotation_and_rescale():
+    pose = Pose.from_model_output(_model_output())
+    before = pose.array.copy()
+    pose.rotate_back(None, 257, 257)
+    np.testing.assert_array_equal(pose.array, before)
+    pose.rescale(2, 0.5)
+    np.testing.assert_allclose(pose.array[:, X], before[:, X] * 2)
+    np.testing.assert_allclose(pose.array[:, Y], before[:, Y] * 0.5)
+    np.testing.assert_array_equal(pose.array[:, SCORE], before[:, SCORE])
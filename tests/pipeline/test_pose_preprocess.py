@@ -0,0 +1,55 @@
+"""Test numpy preprocessing of frames for the PoseNet input tensor."""
+import sys
+import os
+sys.path.append(os.path.abspath('.'))
+
+import numpy as np
+from PIL import Image
+from src.pipeline.posenet_model import Posenet_MobileNet
+
+
+class _Engine:
+    confidence_threshold = 0.5
+    input_details = [{'shape': np.array([1, 257, 257, 3]),
+                      'dtype': np.float32, 'index': 0}]
+
+
+def _frame(width, height):
+    rng = np.random.default_rng(width * height)
+    return rng.integers(0, 256, size=(height, width, 3), dtype=np.uint8)
+
+
+def test_thumbnail_size_matches_pil():
+    model = Posenet_MobileNet(_Engine())
+    for size in [(640, 480), (480, 640), (1920, 1080), (257, 257),
+                 (100, 50), (1000, 3), (3, 1000), (258, 100)]:
+        pil_thumb = Image.new('RGB', size)
+        pil_thumb.thumbnail((257, 257))
+        assert model.thumbnail_size(size, (257, 257)) == pil_thumb.size
+
+
+def test_numpy_input_matches_pil_input():
+    """Numpy letterboxing is close to the PIL thumbnail/pad path."""
+    model = Posenet_MobileNet(_Engine())
+    frame = _frame(640, 480)
+    pil_input, _, pil_thumb = model.prepare_input(Image.fromarray(frame))
+    pil_input = pil_input.copy()
+    np_input, template_image, np_thumb = model.prepare_input(frame)
+
+    assert template_image is None
+    assert np_input.shape == (1, 257, 257, 3)
+    assert np_thumb.shape[1::-1] == pil_thumb.size
+    h, w = np_thumb.shape[:2]
+    # padding is normalized black
+    assert np.all(np_input[0, h:] == -1.0)
+    assert np.all(pil_input[0, h:] == -1.0)
+    # resampling filters differ slightly between PIL and cv2
+    assert np.abs(np_input - pil_input).mean() < 0.1
+
+
+def test_input_buffer_is_reused():
+    model = Posenet_MobileNet(_Engine())
+    first, _, _ = model.prepare_input(_frame(640, 480))
+    second, _, _ = model.prepare_input(_frame(320, 240))
+    assert first is second
+    assert first is model.input_buffer()
@@ -0,0 +1,108 @@
+"""Test the vectorized torso geometry of the fall detector."""
+import sys
+import os
+sys.path.append(os.path.abspath('.'))
+
+import numpy as np
+from src.pipeline import torso_geometry as geometry
+
+
+def _torso(shoulder, hip, right_offset=10):
+    """Torso with the right line parallel to the left one."""
+    (sx, sy), (hx, hy) = shoulder, hip
+    return np.array([[sx, sy], [hx, hy],
+                     [sx + right_offset, sy], [hx + right_offset, hy]],
+                    np.float64)
+
+
+def test_angles_with_yaxis():
+    upright = _torso((50, 10), (50, 60))
+    lying = _torso((10, 50), (60, 50))
+    diagonal = _torso((10, 10), (60, 60))
+    angles = geometry.angles_with_yaxis(np.stack([upright, lying, diagonal]))
+    np.testing.assert_allclose(angles, [[0, 0], [90, 90], [45, 45]],
+                               atol=1e-9)
+
+
+def test_missing_lines_count_as_zero():
+    torso = _torso((10, 50), (60, 50))
+    torso[2:] = np.nan
+    np.testing.assert_allclose(geometry.angles_with_yaxis(torso), [90, 0])
+    assert geometry.leaning_angle(_torso((50, 10), (50, 60)), torso) == 90
+    assert geometry.leaning_angle(np.full((4, 2), np.nan), torso) == 0
+
+
+def test_spinal_vector_score():
+    scores = np.array([[0.9, 0.8, 0.7, 0.6],   # both lines
+                       [0.9, 0.8, 0.1, 0.6],   # left only
+                       [0.1, 0.8, 0.7, 0.6],   # right only
+                       [0.1, 0.8, 0.7, 0.1]])  # none
+    score, detected = geometry.spinal_vector_score(scores, 0.5)
+    np.testing.assert_allclose(score, [0.7, 0.72, 0.54, 0])
+    assert detected.tolist() == [[True, True], [True, False],
+                                 [False, True], [False, False]]
+
+
+def test_motion_downward():
+    assert geometry.motion_downward([30, 0], [10, 0])
+    assert not geometry.motion_downward([10, 0], [30, 0])
+    # a line missing in either frame is not compared
+    assert not geometry.motion_downward([30, 0], [0, 10])
+
+
+def test_sequence_matches_frame_by_frame():
+    rng = np.random.default_rng(0)
+    xy = rng.uniform(0, 257, (12, 4, 2))
+    scores = rng.uniform(0.2, 1, (12, 4))
+    features = geometry.sequence_features(xy, scores, 0.45)
+
+    for t in range(12):
+        score, detected = geometry.spinal_vector_score(scores[t], 0.45)
+        assert features['spinal_score'][t] == score
+        torso = geometry.mask_lines(xy[t], detected)
+        np.testing.assert_allclose(features['yaxis_angles'][t],
+                                   geometry.angles_with_yaxis(torso))
+        for i, lag in enumerate((1, 2)):
+            if t < lag:
+                assert features['leaning_angle'][t, i] == 0
+                continue
+            prev = geometry.mask_lines(
+                xy[t - lag],
+                geometry.spinal_vector_score(scores[t - lag], 0.45)[1])
+            np.testing.assert_allclose(features['leaning_angle'][t, i],
+                                       geometry.leaning_angle(prev, torso))
+
+
+def test_fall_scores_of_a_fall():
+    xy = np.stack([_torso((50, 10), (50, 60)),
+                   _torso((50, 10), (50, 60)),
+                   _torso((10, 50), (60, 50))])
+    scores = np.full((3, 4), 0.8)
+    features = geometry.sequence_features(xy, scores, 0.45)
+    falls = geometry.fall_scores(features, fall_factor=60)
+    # the upright frames have no yaxis angle, so no downward motion from
+    # them can be measured
+    assert not falls.any()
+
+    xy[:2] = _torso((45, 10), (50, 60))
+    features = geometry.sequence_features(xy, scores, 0.45)
+    falls = geometry.fall_scores(features, fall_factor=60)
+    np.testing.assert_allclose(falls[2], [0.8, 0.8])
+    assert not falls[:2].any()
+
+
+def test_torso_keypoints_are_views_of_detected_lines():
+    array = np.zeros((17, 3), np.float32)
+    array[geometry.TORSO_ROWS, 0] = [1, 2, 3, 4]
+    torso = geometry.TorsoKeypoints(array, np.array([False, True]))
+    assert list(torso) == ['right shoulder', 'right hip']
+    assert len(torso) == 2
+    assert torso.get('left shoulder') is None
+    assert torso['right hip'][0] == 4
+    array[geometry.TORSO_ROWS[2], 0] = 7
+    assert torso['right shoulder'][0] == 7
+    xy = torso.xy()
+    assert np.isnan(xy[:2]).all()
+    assert xy[2:, 0].tolist() == [7, 4]
+    assert np.array_equal(geometry.torso_xy(dict(torso)), xy, equal_nan=True)
+    assert not geometry.TorsoKeypoints(array, np.array([False, False]))
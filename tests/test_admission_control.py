@@ -0,0 +1,63 @@
+"""Test that frames turned away by admission control are answered cheaply."""
+import sys
+import os
+sys.path.append(os.path.abspath('.'))
+
+import time
+import cv2
+import numpy as np
+from camera_service import CameraService
+from result_codec import FORMAT_BINARY, decode_result
+from session_registry import DetectorSession, SessionRegistry
+
+
+class _RecordingDetector:
+    min_time_between_frames = 0.05
+
+    def __init__(self):
+        self.timestamps = []
+
+    def process_sample(self, **sample):
+        self.timestamps.append(sample.get('timestamp'))
+        yield {'inference_result': []}
+
+
+def _service():
+    service = CameraService(reduced_decode=False)
+    service.fall_detector = _RecordingDetector()
+    service.ready.set()
+    service.sessions = SessionRegistry(
+        lambda stream_id: DetectorSession(stream_id, _RecordingDetector()))
+    return service
+
+
+def _jpeg():
+    _, buffer = cv2.imencode('.jpg', np.zeros((48, 64, 3), np.uint8))
+    return buffer.tobytes()
+
+
+def test_detector_sees_the_admission_time():
+    """Admission and the detector's frame spacing use a single clock."""
+    service = _service()
+    service.process_frame(_jpeg(), stream_id='cam')
+    session = service.sessions.peek('cam')
+    assert session.fall_detector.timestamps == [session.last_accepted]
+
+
+def test_skipped_compact_results_follow_the_alert_latch():
+    service = _service()
+    service.process_frame(_jpeg(), stream_id='cam', result_format=FORMAT_BINARY)
+    session = service.sessions.peek('cam')
+
+    session.alert_latch_until = time.time() + 5
+    status, alert, _, _, _ = decode_result(
+        service.process_frame(_jpeg(), stream_id='cam',
+                              result_format=FORMAT_BINARY))
+    assert (status, alert) == ('FALL_DETECTED', True)
+
+    # the latch expired, replayed results drop back to NORMAL
+    session.alert_latch_until = time.time() - 1
+    status, alert, _, _, _ = decode_result(
+        service.process_frame(_jpeg(), stream_id='cam',
+                              result_format=FORMAT_BINARY))
+    assert (status, alert) == ('NORMAL', False)
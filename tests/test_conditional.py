@@ -0,0 +1,79 @@
+"""Test ETag revalidation of the polled history and settings endpoints."""
+import sys
+import os
+sys.path.append(os.path.abspath('.'))
+
+os.environ.setdefault('WARMUP_ON_BOOT', '0')
+
+import pytest
+import app
+from event_store import EventStore
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    notifier = app.camera_service.notifier
+    # keep the real history and settings files out of the tests
+    monkeypatch.setattr(notifier, 'events',
+                        EventStore(str(tmp_path / 'events.jsonl')))
+    monkeypatch.setattr(notifier, 'settings_file',
+                        str(tmp_path / 'settings.json'))
+    return app.app.test_client()
+
+
+def _revalidate(client, url, etag):
+    return client.get(url, headers={'If-None-Match': etag})
+
+
+def test_history_is_not_sent_again_until_it_changes(client):
+    events = app.camera_service.notifier.events
+    response = client.get('/api/history')
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+    assert response.headers['Cache-Control'] == 'no-cache'
+
+    response = _revalidate(client, '/api/history', etag)
+    assert response.status_code == 304
+    assert response.data == b''
+    assert response.headers['ETag'] == etag
+
+    events.append({'type': 'Fall Detected'})
+    response = _revalidate(client, '/api/history', etag)
+    assert response.status_code == 200
+    assert [e['type'] for e in response.get_json()] == ['Fall Detected']
+    assert response.headers['ETag'] != etag
+    etag = response.headers['ETag']
+
+    events.clear()
+    response = _revalidate(client, '/api/history', etag)
+    assert response.status_code == 200
+    assert response.get_json() == []
+    assert response.headers['ETag'] != etag
+
+
+def test_mismatched_etags_get_the_full_response(client):
+    etag = client.get('/api/history').headers['ETag']
+    for stale in ('"history-00000000-1-1"', '"settings' + etag[8:],
+                  '"something-else"'):
+        response = _revalidate(client, '/api/history', stale)
+        assert response.status_code == 200
+        assert response.get_json() == []
+
+
+def test_settings_etag_follows_settings_updates(client):
+    notifier = app.camera_service.notifier
+    response = client.get('/api/get_settings')
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+    assert _revalidate(client, '/api/get_settings', etag).status_code == 304
+
+    version = notifier.settings_version
+    response = client.post('/api/save_settings',
+                           json={'sms_config': {'telegram_chat_id': '42'}})
+    assert response.status_code == 200
+    assert notifier.settings_version > version
+
+    response = _revalidate(client, '/api/get_settings', etag)
+    assert response.status_code == 200
+    assert response.get_json()['sms_config']['telegram_chat_id'] == '42'
+    assert response.headers['ETag'] != etag
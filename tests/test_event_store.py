@@ -0,0 +1,120 @@
+"""Test the append-only fall event store."""
+import sys
+import os
+sys.path.append(os.path.abspath('.'))
+
+import json
+import threading
+from event_store import EventStore
+
+
+def _store(tmp_path, **kwargs):
+    return EventStore(str(tmp_path / 'events.jsonl'), **kwargs)
+
+
+def test_append_assigns_increasing_ids_and_query_is_newest_first(tmp_path):
+    store = _store(tmp_path)
+    ids = [store.append({'type': 'Fall Detected', 'n': i})['id']
+           for i in range(5)]
+    assert ids == sorted(set(ids))
+    assert [e['n'] for e in store.query()] == [4, 3, 2, 1, 0]
+    assert len(store) == 5
+
+
+def test_query_since_and_paging(tmp_path):
+    store = _store(tmp_path)
+    ids = [store.append({'n': i})['id'] for i in range(6)]
+    assert [e['n'] for e in store.query(since=ids[3])] == [5, 4]
+    assert store.query(since=ids[-1]) == []
+    assert [e['n'] for e in store.query(limit=2)] == [5, 4]
+    assert [e['n'] for e in store.query(limit=2, offset=2)] == [3, 2]
+    assert [e['n'] for e in store.query(offset=5)] == [0]
+
+
+def test_events_survive_a_reload(tmp_path):
+    store = _store(tmp_path)
+    for i in range(3):
+        store.append({'n': i})
+    reloaded = _store(tmp_path)
+    assert reloaded.query() == store.query()
+
+
+def test_appends_of_another_process_are_picked_up(tmp_path):
+    writer, reader = _store(tmp_path), _store(tmp_path)
+    writer.append({'n': 0})
+    assert [e['n'] for e in reader.query()] == [0]
+    reader.append({'n': 1})
+    writer.append({'n': 2})
+    assert [e['n'] for e in reader.query()] == [2, 1, 0]
+    assert writer.query() == reader.query()
+
+
+def test_file_is_compacted_to_max_events(tmp_path):
+    store = _store(tmp_path, max_events=3)
+    for i in range(10):
+        store.append({'n': i})
+    assert [e['n'] for e in store.query()] == [9, 8, 7]
+    with open(store.path) as f:
+        assert len(f.readlines()) < 6
+    # a second process follows the compaction
+    assert [e['n'] for e in _store(tmp_path, max_events=3).query()] == [9, 8, 7]
+
+
+def test_clear(tmp_path):
+    store, other = _store(tmp_path), _store(tmp_path)
+    store.append({'n': 0})
+    assert len(other) == 1
+    other.clear()
+    assert store.query() == []
+    store.append({'n': 1})
+    assert [e['n'] for e in other.query()] == [1]
+
+
+def test_legacy_events_are_imported_once(tmp_path):
+    legacy = tmp_path / 'events.json'
+    legacy.write_text(json.dumps([{'id': 2, 'n': 'new'},
+                                  {'id': 1, 'n': 'old'}]))
+    store = _store(tmp_path, legacy_path=str(legacy))
+    assert [e['n'] for e in store.query()] == ['new', 'old']
+    assert store.append({'n': 'next'})['id'] > 2
+    store.clear()
+    assert _store(tmp_path, legacy_path=str(legacy)).query() == []
+
+
+def test_concurrent_appends_are_all_kept(tmp_path):
+    store = _store(tmp_path)
+    threads = [threading.Thread(
+        target=lambda: [store.append({}) for _ in range(25)])
+        for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    ids = [e['id'] for e in store.query()]
+    assert len(ids) == len(set(ids)) == 100
+    assert [e['id'] for e in _store(tmp_path).query()] == ids
+
+
+def test_version_changes_only_with_the_history(tmp_path):
+    store, other = _store(tmp_path), _store(tmp_path)
+    version = store.version
+    store.query()
+    assert store.version == version
+    store.append({'n': 0})
+    assert store.version > version
+    # changes of another process count once the store looked at the file
+    version = store.version
+    other.append({'n': 1})
+    assert store.version == version
+    new_version, _, events = store.snapshot()
+    assert new_version > version
+    assert [e['n'] for e in events] == [1, 0]
+    version = new_version
+    other.clear()
+    assert store.snapshot()[0] > version
+
+
+def test_notifier_keeps_an_injected_empty_store(tmp_path):
+    from notifier import FCMNotifier
+    store = _store(tmp_path)
+    assert FCMNotifier(event_store=store).events is store
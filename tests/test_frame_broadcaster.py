@@ -0,0 +1,98 @@
+"""Test fan-out of the video feed to many viewers."""
+import sys
+import os
+sys.path.append(os.path.abspath('.'))
+
+import itertools
+import threading
+import time
+from frame_broadcaster import FrameBroadcaster
+
+
+class _CountingProducer:
+    """Frame source that counts how often the pipeline is started and run."""
+
+    def __init__(self, delay=0.002):
+        self.delay = delay
+        self.starts = 0
+        self.frames = 0
+
+    def __call__(self):
+        self.starts += 1
+        for i in itertools.count():
+            self.frames += 1
+            time.sleep(self.delay)
+            yield i
+
+
+def test_frames_are_produced_once_for_all_subscribers():
+    producer = _CountingProducer()
+    broadcaster = FrameBroadcaster(producer)
+    received = [[] for _ in range(4)]
+
+    def viewer(out):
+        for frame in broadcaster.subscribe(timeout=1):
+            out.append(frame)
+            if len(out) == 20:
+                break
+
+    threads = [threading.Thread(target=viewer, args=(out,))
+               for out in received]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert producer.starts == 1
+    for out in received:
+        assert len(out) == 20
+        assert out == sorted(set(out))
+    # all viewers together did not cost more frames than the longest one
+    assert producer.frames < 4 * 20
+
+
+def test_slow_subscriber_skips_to_latest():
+    producer = _CountingProducer(delay=0.001)
+    broadcaster = FrameBroadcaster(producer, ring_size=2)
+    frames = broadcaster.subscribe(timeout=1)
+    first = next(frames)
+    time.sleep(0.05)
+    second = next(frames)
+    frames.close()
+    assert second - first > 2
+
+
+def test_producer_stops_without_subscribers():
+    producer = _CountingProducer()
+    broadcaster = FrameBroadcaster(producer)
+    frames = broadcaster.subscribe(timeout=1)
+    next(frames)
+    frames.close()
+    deadline = time.monotonic() + 1
+    while broadcaster.running and time.monotonic() < deadline:
+        time.sleep(0.001)
+    assert not broadcaster.running
+    assert broadcaster.latest() is None
+
+    frames = broadcaster.subscribe(timeout=1)
+    next(frames)
+    frames.close()
+    assert producer.starts == 2
+
+
+def test_subscribers_end_when_the_producer_fails():
+    def failing_producer():
+        yield 0
+        time.sleep(0.05)
+        raise RuntimeError('camera gone')
+
+    broadcaster = FrameBroadcaster(failing_producer)
+    received = []
+    # no timeout, a viewer must not wait forever for the next frame
+    viewer = threading.Thread(
+        target=lambda: received.extend(broadcaster.subscribe()))
+    viewer.start()
+    viewer.join(timeout=2)
+    assert not viewer.is_alive()
+    assert received == [0]
+    assert not broadcaster.running
@@ -0,0 +1,46 @@
+"""Test decoding of uploaded frames."""
+import sys
+import os
+sys.path.append(os.path.abspath('.'))
+
+import cv2
+import numpy as np
+from frame_codec import jpeg_size, reduced_decode_factor, decode_frame
+
+
+def _jpeg(width, height):
+    img = np.zeros((height, width, 3), np.uint8)
+    cv2.rectangle(img, (width // 4, height // 4), (width // 2, height // 2),
+                  (255, 255, 255), -1)
+    _, buffer = cv2.imencode('.jpg', img)
+    return buffer.tobytes()
+
+
+def test_jpeg_size_reads_header():
+    assert jpeg_size(_jpeg(1920, 1080)) == (1920, 1080)
+    assert jpeg_size(_jpeg(481, 641)) == (481, 641)
+    _, png = cv2.imencode('.png', np.zeros((10, 10, 3), np.uint8))
+    assert jpeg_size(png.tobytes()) is None
+    assert jpeg_size(b'') is None
+
+
+def test_reduced_decode_factor():
+    assert reduced_decode_factor((1920, 1080), (257, 257)) == 4
+    assert reduced_decode_factor((3840, 2160), (257, 257)) == 8
+    assert reduced_decode_factor((640, 480), (257, 257)) == 2
+    assert reduced_decode_factor((320, 240), (257, 257)) == 1
+
+
+def test_decode_frame_reduced_keeps_original_size():
+    frame, frame_size, factor = decode_frame(_jpeg(1920, 1080), (257, 257))
+    assert factor == 4
+    assert frame.shape == (270, 480, 3)
+    assert frame_size == (1920, 1080)
+
+
+def test_decode_frame_full_resolution():
+    frame, frame_size, factor = decode_frame(_jpeg(640, 480))
+    assert factor == 1
+    assert frame.shape == (480, 640, 3)
+    assert frame_size == (640, 480)
+    assert decode_frame(b'not an image', (257, 257))[0] is None
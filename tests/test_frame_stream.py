@@ -0,0 +1,85 @@
+"""Test pipelined frame ingestion."""
+import sys
+import os
+sys.path.append(os.path.abspath('.'))
+
+import threading
+import time
+import pytest
+from frame_stream import RESULT_HEADER, FrameStream, pack_frame, parse_frames
+
+
+def test_parse_multiple_frames():
+    message = pack_frame(1, b'abc') + pack_frame(2, b'') + pack_frame(3, b'de')
+    assert list(parse_frames(message)) == [(1, b'abc'), (2, b''), (3, b'de')]
+
+
+def test_parse_truncated_frame():
+    with pytest.raises(ValueError):
+        list(parse_frames(pack_frame(1, b'abcdef')[:-1]))
+    with pytest.raises(ValueError):
+        list(parse_frames(b'\x01\x00'))
+
+
+def test_results_are_tagged_and_oldest_frames_dropped():
+    """A slow detector sees the newest frames, older waiting ones are dropped."""
+    release = threading.Event()
+    results = []
+    done = threading.Event()
+
+    def process(image_bytes):
+        release.wait()
+        return {"status": "NORMAL", "frame": image_bytes}
+
+    def send(result):
+        results.append(result)
+        if result['seq'] == 9:
+            done.set()
+
+    stream = FrameStream(process, send, max_pending=2)
+    stream.feed(pack_frame(0, b'f0'))
+    # let the worker pick up frame 0 before the burst arrives
+    while stream._pending:
+        time.sleep(0.001)
+    stream.feed(b''.join(pack_frame(i, b'f%d' % i) for i in range(1, 10)))
+    release.set()
+    assert done.wait(2)
+    stream.close()
+
+    assert [r['seq'] for r in results] == [0, 8, 9]
+    assert results[-1]['frame'] == b'f9'
+    assert results[-1]['dropped'] == 7
+    assert stream.received == 10
+
+
+def test_processing_errors_are_reported():
+    results = []
+    done = threading.Event()
+
+    def process(image_bytes):
+        raise RuntimeError('bad frame')
+
+    def send(result):
+        results.append(result)
+        done.set()
+
+    stream = FrameStream(process, send)
+    stream.feed(pack_frame(5, b'x'))
+    assert done.wait(2)
+    stream.close()
+    assert results == [{"error": "bad frame", "seq": 5, "dropped": 0}]
+
+
+def test_encoded_results_get_a_binary_tag():
+    results = []
+    done = threading.Event()
+
+    def send(result):
+        results.append(result)
+        done.set()
+
+    stream = FrameStream(lambda image_bytes: b'RESULT', send)
+    stream.feed(pack_frame(7, b'x'))
+    assert done.wait(2)
+    stream.close()
+    assert results == [RESULT_HEADER.pack(7, 0) + b'RESULT']
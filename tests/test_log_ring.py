@@ -0,0 +1,54 @@
+"""Test the system log ring and incremental polling."""
+import sys
+import os
+sys.path.append(os.path.abspath('.'))
+
+import threading
+import time
+from log_ring import LogRing
+
+
+def test_entries_get_increasing_seq_and_ring_is_bounded():
+    ring = LogRing(maxlen=3)
+    for i in range(5):
+        assert ring.append({'message': str(i)}) == i + 1
+    assert len(ring) == 3
+    assert [e['seq'] for e in ring.since()] == [3, 4, 5]
+    assert [e['message'] for e in ring.since()] == ['2', '3', '4']
+
+
+def test_since_returns_only_new_entries():
+    ring = LogRing()
+    for i in range(4):
+        ring.append({'message': str(i)})
+    assert [e['seq'] for e in ring.since(2)] == [3, 4]
+    assert ring.since(4) == []
+    # a cursor from before a restart gets everything
+    assert len(ring.since(99)) == 4
+
+
+def test_wait_returns_on_new_entry():
+    ring = LogRing()
+    ring.append({'message': 'a'})
+    timer = threading.Timer(0.05, ring.append, args=({'message': 'b'},))
+    timer.start()
+    start_time = time.monotonic()
+    entries = ring.wait(1, timeout=5)
+    assert [e['message'] for e in entries] == ['b']
+    assert time.monotonic() - start_time < 2
+    assert ring.wait(2, timeout=0.01) == []
+
+
+def test_concurrent_appends_keep_seq_order():
+    ring = LogRing(maxlen=1000)
+
+    def writer():
+        for _ in range(100):
+            ring.append({'message': 'x'})
+
+    threads = [threading.Thread(target=writer) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert [e['seq'] for e in ring.since()] == list(range(1, 801))
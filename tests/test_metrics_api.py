@@ -0,0 +1,29 @@
+"""Test the Prometheus /api/metrics endpoint."""
+import sys
+import os
+sys.path.append(os.path.abspath('.'))
+
+os.environ.setdefault('WARMUP_ON_BOOT', '0')
+
+import app
+from src.pipeline.metrics import STAGES, metrics
+
+
+def test_metrics_route_exposes_stage_histograms_and_counters():
+    # what one frame with a rotated retry records on its way through
+    for stage in STAGES:
+        with metrics.time(stage):
+            pass
+    metrics.inc('rotation_retries')
+
+    response = app.app.test_client().get('/api/metrics')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    assert 'version=0.0.4' in response.headers['Content-Type']
+    text = response.get_data(as_text=True)
+    assert '# TYPE orion_stage_seconds histogram' in text
+    for stage in STAGES:
+        assert f'orion_stage_seconds_bucket{{stage="{stage}",le="+Inf"}}' in text
+        assert f'orion_stage_seconds_count{{stage="{stage}"}}' in text
+    assert '# TYPE orion_rotation_retries_total counter' in text
+    assert 'orion_rotation_retries_total ' in text
@@ -0,0 +1,53 @@
+"""Test compact detection result encoding."""
+import sys
+import os
+sys.path.append(os.path.abspath('.'))
+
+import numpy as np
+import pytest
+from result_codec import (encode_result, decode_result, negotiate_format,
+                          RESULT_SIZE, FORMAT_BINARY, FORMAT_JSON,
+                          FORMAT_MSGPACK, msgpack)
+
+
+def test_binary_round_trip():
+    keypoints = np.array([[10, 20], [11, 80], [50, 21], [np.nan, np.nan]],
+                         np.float32)
+    data = encode_result('FALL_DETECTED', True, label='FALL', score=0.75,
+                         keypoints=keypoints)
+    assert len(data) == RESULT_SIZE
+    status, alert, label, score, decoded = decode_result(data)
+    assert status == 'FALL_DETECTED'
+    assert alert is True
+    assert label == 'FALL'
+    assert score == pytest.approx(0.75)
+    np.testing.assert_array_equal(decoded, keypoints)
+
+
+def test_binary_without_detection():
+    status, alert, label, score, keypoints = decode_result(
+        encode_result('AI_NOT_READY', False))
+    assert (status, alert, label, score) == ('AI_NOT_READY', False, None, 0)
+    assert np.isnan(keypoints).all()
+
+
+@pytest.mark.skipif(msgpack is None, reason='msgpack not installed')
+def test_msgpack_encoding():
+    keypoints = np.arange(8, dtype=np.float32).reshape(4, 2)
+    data = encode_result('NORMAL', False, label='NORMAL', score=0.5,
+                         keypoints=keypoints, result_format=FORMAT_MSGPACK)
+    status, alert, label, score, raw = msgpack.unpackb(data)
+    assert (status, alert, label, score) == (0, 0, 1, 0.5)
+    np.testing.assert_array_equal(
+        np.frombuffer(raw, '<f4').reshape(4, 2), keypoints)
+
+
+def test_negotiate_format():
+    assert negotiate_format() == FORMAT_JSON
+    assert negotiate_format('binary') == FORMAT_BINARY
+    assert negotiate_format('xml') == FORMAT_JSON
+    assert negotiate_format(accept='application/vnd.orion.result') == \
+        FORMAT_BINARY
+    assert negotiate_format('json', 'application/vnd.orion.result') == \
+        FORMAT_JSON
+    assert negotiate_format(accept='text/html,*/*') == FORMAT_JSON
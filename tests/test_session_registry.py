@@ -0,0 +1,101 @@
+"""Test per-stream detector session registry."""
+import sys
+import os
+sys.path.append(os.path.abspath('.'))
+
+import threading
+import time
+from session_registry import DetectorSession, SessionRegistry
+
+
+def _factory(stream_id):
+    return DetectorSession(stream_id, fall_detector=object())
+
+
+def test_sessions_are_isolated_per_stream():
+    """Each stream id gets its own session and latch."""
+    registry = SessionRegistry(_factory)
+    a = registry.get('room-a')
+    b = registry.get('room-b')
+    assert a is not b
+    assert registry.get('room-a') is a
+    a.alert_latch_until = time.time() + 5
+    assert a.is_latched()
+    assert not b.is_latched()
+
+
+def test_default_stream_id():
+    registry = SessionRegistry(_factory)
+    assert registry.get(None) is registry.get('default')
+
+
+def test_lru_eviction():
+    """Least recently used session is dropped past max_sessions."""
+    registry = SessionRegistry(_factory, max_sessions=2)
+    registry.get('a')
+    registry.get('b')
+    registry.get('a')
+    registry.get('c')
+    assert len(registry) == 2
+    assert 'a' in registry
+    assert 'b' not in registry
+    assert 'c' in registry
+
+
+def test_ttl_eviction():
+    """Idle sessions are evicted after ttl seconds."""
+    registry = SessionRegistry(_factory, ttl=0.01)
+    registry.get('a')
+    time.sleep(0.02)
+    registry.get('b')
+    assert 'a' not in registry
+    assert 'b' in registry
+
+
+def test_admission_turns_away_frames_that_come_too_soon():
+    session = _factory('cam')
+    assert session.admit(0.05, now=10.0)
+    assert not session.admit(0.05, now=10.02)
+    assert session.admit(0.05, now=10.06)
+
+
+def test_next_frame_interval_follows_processing_time():
+    session = _factory('cam')
+    assert session.next_frame_interval(0.05) == 0.05
+    session.record_processing_time(0.2)
+    assert session.next_frame_interval(0.05) == 0.2
+    session.record_processing_time(0.0)
+    assert 0.05 < session.next_frame_interval(0.05) < 0.2
+
+
+def test_slow_session_creation_does_not_block_other_streams():
+    """The factory runs outside the registry lock."""
+    release = threading.Event()
+
+    def factory(stream_id):
+        if stream_id == 'slow':
+            release.wait(5)
+        return _factory(stream_id)
+
+    registry = SessionRegistry(factory)
+    slow = threading.Thread(target=registry.get, args=('slow',))
+    slow.start()
+    start = time.monotonic()
+    registry.get('fast')
+    assert time.monotonic() - start < 1.0
+    release.set()
+    slow.join(5)
+    assert 'slow' in registry and 'fast' in registry
+
+
+def test_concurrent_creation_keeps_one_session():
+    registry = SessionRegistry(_factory)
+    found = []
+    threads = [threading.Thread(target=lambda: found.append(registry.get('a')))
+               for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(registry) == 1
+    assert all(s is registry.get('a') for s in found)
@@ -0,0 +1,47 @@
+"""Test incremental and long polling reads of /api/system_logs."""
+import sys
+import os
+sys.path.append(os.path.abspath('.'))
+
+os.environ.setdefault('WARMUP_ON_BOOT', '0')
+
+import threading
+import time
+import app
+
+
+def _messages(response):
+    assert response.status_code == 200
+    return [entry['message'] for entry in response.get_json()]
+
+
+def test_since_returns_only_newer_entries():
+    client = app.app.test_client()
+    app.add_system_log('before', 'info')
+    seq = app.system_logs.seq
+    app.add_system_log('after', 'info')
+    assert _messages(client.get(f'/api/system_logs?since={seq}')) == ['after']
+    assert _messages(
+        client.get(f'/api/system_logs?since={app.system_logs.seq}')) == []
+
+
+def test_wait_returns_when_an_entry_arrives():
+    client = app.app.test_client()
+    seq = app.system_logs.seq
+    timer = threading.Timer(0.1, app.add_system_log, args=('arrived', 'info'))
+    timer.start()
+    start = time.monotonic()
+    response = client.get(f'/api/system_logs?since={seq}&wait=3')
+    assert time.monotonic() - start < 2
+    assert _messages(response) == ['arrived']
+    timer.join()
+
+
+def test_wait_is_capped(monkeypatch):
+    monkeypatch.setattr(app, 'LOG_WAIT_MAX', 0.2)
+    client = app.app.test_client()
+    start = time.monotonic()
+    response = client.get(
+        f'/api/system_logs?since={app.system_logs.seq}&wait=60')
+    assert time.monotonic() - start < 2
+    assert _messages(response) == []
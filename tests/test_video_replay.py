@@ -0,0 +1,93 @@
+"""Test replay of recorded video files."""
+import sys
+import os
+sys.path.append(os.path.abspath('.'))
+
+import time
+import cv2
+import numpy as np
+import pytest
+from src.pipeline.metrics import metrics
+from video_replay import VideoReplaySource, replay
+
+
+def _write_video(path, frames=10, fps=20):
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*'MJPG'),
+                             fps, (64, 48))
+    for i in range(frames):
+        writer.write(np.full((48, 64, 3), i * 20, np.uint8))
+    writer.release()
+    return str(path)
+
+
+class _RecordingDetector:
+    """Stand-in FallDetector that records the timestamps it is fed."""
+
+    def __init__(self, min_time_between_frames=0.05):
+        self.min_time_between_frames = min_time_between_frames
+        self.timestamps = []
+        self._last = None
+
+    def process_sample(self, image, timestamp):
+        self.timestamps.append(timestamp)
+        if self._last is not None and \
+           timestamp - self._last < self.min_time_between_frames:
+            yield {'inference_result': []}
+            return
+        self._last = timestamp
+        metrics.inc('pose_searches')
+        label = 'FALL' if image.mean() > 150 else 'NORMAL'
+        yield {'inference_result': [{'label': label}]}
+
+
+def test_frames_carry_recorded_timestamps(tmp_path):
+    path = _write_video(tmp_path / 'clip.avi')
+    with VideoReplaySource(path) as source:
+        frames = list(source)
+    assert [f.index for f in frames] == list(range(10))
+    assert [round(f.position, 3) for f in frames] == \
+        [round(i * 0.05, 3) for i in range(10)]
+    gaps = np.diff([f.timestamp for f in frames])
+    assert np.allclose(gaps, 0.05)
+    assert source.video_fps == 20
+    assert source.fps > 0
+
+
+def test_realtime_replay_keeps_the_recorded_pace(tmp_path):
+    path = _write_video(tmp_path / 'clip.avi', frames=6, fps=20)
+    start_time = time.monotonic()
+    with VideoReplaySource(path, realtime=True) as source:
+        for frame in source:
+            assert time.monotonic() >= frame.timestamp - 0.005
+    # five gaps of 50 ms
+    assert time.monotonic() - start_time >= 0.24
+
+
+def test_read_mimics_video_capture(tmp_path):
+    path = _write_video(tmp_path / 'clip.avi', frames=3)
+    source = VideoReplaySource(path, rgb=True)
+    results = [source.read() for _ in range(4)]
+    assert [ok for ok, _ in results] == [True, True, True, False]
+    assert results[0][1].shape == (48, 64, 3)
+    assert not source.isOpened()
+    source.release()
+
+
+def test_unreadable_video_raises(tmp_path):
+    path = tmp_path / 'broken.mp4'
+    path.write_bytes(b'not a video')
+    with pytest.raises(IOError):
+        VideoReplaySource(str(path))
+
+
+def test_replay_applies_frame_spacing_and_reports_falls(tmp_path):
+    # 25 fps, every other frame is too soon for a 50 ms minimum
+    path = _write_video(tmp_path / 'clip.avi', frames=10, fps=25)
+    detector = _RecordingDetector()
+    report = replay(path, detector)
+    assert report['frames'] == 10
+    assert report['analysed'] == 5
+    assert report['video_fps'] == 25
+    # frame brightness is index * 20, frames 8 and up are falls
+    assert report['falls'] == [0.32]
+    assert np.allclose(np.diff(detector.timestamps), 0.04)
@@ -0,0 +1,60 @@
+"""Test background model warm-up and readiness gating."""
+import sys
+import os
+sys.path.append(os.path.abspath('.'))
+
+import threading
+import time
+from camera_service import CameraService
+
+
+def test_process_frame_does_not_wait_for_warmup():
+    service = CameraService()
+    release = threading.Event()
+
+    def slow_init():
+        release.wait(5)
+        raise RuntimeError('model missing')
+
+    service._init_detector = slow_init
+    start = time.monotonic()
+    result = service.process_frame(b'not decoded')
+    assert time.monotonic() - start < 0.5
+    assert result == {"status": "AI_NOT_READY"}
+    assert service.warmup_status["state"] == "warming"
+
+    # a second frame does not start a second warm-up
+    thread = service._warmup_thread
+    service.process_frame(b'not decoded')
+    assert service._warmup_thread is thread
+
+    release.set()
+    thread.join(5)
+    assert service.warmup_status["state"] == "failed"
+    assert not service.ready.is_set()
+
+
+def test_no_frame_interval_before_the_model_is_ready():
+    service = CameraService()
+    service.start_warmup = lambda: None
+    result, interval = service.process_frame_with_interval(b'not decoded')
+    assert result == {"status": "AI_NOT_READY"}
+    assert interval is None
+    assert len(service.sessions) == 0
+
+
+def test_after_fork_restarts_the_background_threads_of_a_loaded_model():
+    class _Restartable:
+        restarts = 0
+
+        def after_fork(self):
+            self.restarts += 1
+
+    service = CameraService()
+    service._pose_batcher = _Restartable()
+    service._detector_config = {'diagnostics': _Restartable()}
+    service.ready.set()
+    service.after_fork()
+    assert service._pose_batcher.restarts == 1
+    assert service._detector_config['diagnostics'].restarts == 1
+    assert service._warmup_thread is None
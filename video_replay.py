@@ -0,0 +1,200 @@
+"""Replay of recorded video files through the fall detection pipeline.
+
+A decoder thread reads the file with ``cv2.VideoCapture`` into a small
+bounded queue, so decoding overlaps with inference. Every frame carries
+the time it was captured at, which is handed to the detector instead of
+its arrival time: ``min_time_between_frames`` and
+``max_time_between_frames`` then see the same frame spacing as they would
+on the live camera, whether frames are replayed in real time or as fast
+as the pipeline can take them.
+"""
+import queue
+import threading
+import time
+from collections import namedtuple
+
+import cv2
+from src.pipeline.metrics import metrics
+
+# position: seconds into the video
+# timestamp: time.monotonic() seconds the frame stands for
+ReplayFrame = namedtuple('ReplayFrame', 'index position timestamp image')
+
+_END = object()
+
+
+class VideoReplaySource:
+    """Frames of a video file, decoded ahead on a background thread.
+
+    Iterate over the source for :class:`ReplayFrame` items, or use
+    ``read()``, which mimics ``cv2.VideoCapture.read`` so the source can
+    stand in for a live camera.
+
+    In real-time mode frames are released at the pace they were recorded.
+    Otherwise they are released as soon as they are decoded and the
+    decoder only waits when the queue is full, no frame is ever dropped.
+    """
+
+    def __init__(self, path, realtime=False, rgb=False, queue_size=8):
+        """
+        :Parameters:
+        ----------
+        path: str
+            Video file, any container and codec OpenCV can read.
+        realtime: bool
+            Release frames at their recorded pace instead of at once.
+        rgb: bool
+            Convert frames to RGB on the decoder thread. Frames are BGR,
+            like the ones of a cv2 camera, by default.
+        queue_size: int
+            Number of frames decoded ahead.
+        """
+        self.path = path
+        self.realtime = realtime
+        self.rgb = rgb
+        self._capture = cv2.VideoCapture(path)
+        if not self._capture.isOpened():
+            raise IOError(f'Cannot open video {path}')
+        self.video_fps = self._capture.get(cv2.CAP_PROP_FPS) or 0.0
+        self.frame_count = int(self._capture.get(cv2.CAP_PROP_FRAME_COUNT))
+        # monotonic time of position 0, set when the first frame is taken
+        self.started_at = None
+        self.timestamp = None
+        self.frames = 0
+        self._opened_at = time.monotonic()
+        self._finished_at = None
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._decode,
+                                        name=f'video-replay-{path}',
+                                        daemon=True)
+        self._thread.start()
+
+    def _position(self, index):
+        msec = self._capture.get(cv2.CAP_PROP_POS_MSEC)
+        if msec > 0 or index == 0:
+            return msec / 1000.0
+        # containers without timestamps
+        return index / self.video_fps if self.video_fps > 0 else index / 30.0
+
+    def _put(self, item):
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _decode(self):
+        index = 0
+        try:
+            while not self._stop.is_set():
+                success, frame = self._capture.read()
+                if not success:
+                    break
+                position = self._position(index)
+                if self.rgb:
+                    frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+                if not self._put((index, position, frame)):
+                    break
+                index += 1
+        finally:
+            self._capture.release()
+            self._put(_END)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        item = self._queue.get() if not self._stop.is_set() else _END
+        if item is _END:
+            self._stop.set()
+            if self._finished_at is None:
+                self._finished_at = time.monotonic()
+            raise StopIteration
+        index, position, image = item
+        now = time.monotonic()
+        if self.started_at is None:
+            self.started_at = now - position
+        timestamp = self.started_at + position
+        if self.realtime and timestamp > now:
+            time.sleep(timestamp - now)
+        self.frames += 1
+        self.timestamp = timestamp
+        return ReplayFrame(index, position, timestamp, image)
+
+    def read(self):
+        """(success, frame) like ``cv2.VideoCapture.read``."""
+        try:
+            return True, next(self).image
+        except StopIteration:
+            return False, None
+
+    def isOpened(self):
+        return not self._stop.is_set()
+
+    def release(self):
+        """Stop the decoder thread, frames not taken yet are discarded."""
+        self._stop.set()
+        if self._finished_at is None:
+            self._finished_at = time.monotonic()
+        self._thread.join(timeout=1.0)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+        return False
+
+    @property
+    def elapsed(self):
+        """Wall-clock seconds from opening the file to its last frame."""
+        return (self._finished_at or time.monotonic()) - self._opened_at
+
+    @property
+    def fps(self):
+        """Frames per second achieved by the consumer."""
+        elapsed = self.elapsed
+        return self.frames / elapsed if elapsed > 0 else 0.0
+
+
+def replay(path, fall_detector, realtime=False, on_sample=None):
+    """Feed a video file through a FallDetector.
+
+    :Parameters:
+    ----------
+    path: str
+        Video file.
+    fall_detector: FallDetector
+        A fresh detector, its pose history becomes the one of the video.
+    realtime: bool
+        Replay at the recorded pace instead of as fast as possible.
+    on_sample: callable
+        Optional ``on_sample(frame, processed_sample)`` called per frame.
+
+    Returns a report dict with the achieved frames/sec and the video
+    positions (seconds) of the frames labelled FALL.
+    """
+    falls = []
+    # frames that came too soon after the previous one are not searched
+    searches = metrics.counter('pose_searches')
+    with VideoReplaySource(path, realtime=realtime, rgb=True) as source:
+        for frame in source:
+            sample = next(fall_detector.process_sample(
+                image=frame.image, timestamp=frame.timestamp))
+            inference_result = (sample or {}).get('inference_result')
+            if any(r['label'] == 'FALL' for r in inference_result or []):
+                falls.append(round(frame.position, 3))
+            if on_sample is not None:
+                on_sample(frame, sample)
+    return {
+        'path': path,
+        'frames': source.frames,
+        'analysed': metrics.counter('pose_searches') - searches,
+        'elapsed_s': round(source.elapsed, 3),
+        'fps': round(source.fps, 2),
+        'video_fps': round(source.video_fps, 2),
+        'falls': falls,
+    }